@@ -18,7 +18,15 @@ from issuer.permissions import AuditedModelOwner, VerifiedEmailMatchesRecipientI
 from issuer.public_api import ImagePropertyDetailView
 from apispec_drf.decorators import apispec_list_operation, apispec_post_operation, apispec_get_operation, \
     apispec_delete_operation, apispec_put_operation, apispec_operation
+from mainsite.pagination import EncryptedCursorPagination
 from mainsite.permissions import AuthenticatedWithVerifiedEmail
+from mainsite.prefetch import prefetch_cached
+
+
+class BackpackAssertionPagination(EncryptedCursorPagination):
+    # most recently issued first. the recipient's assertions are found on the recipient_identifier index and sorted,
+    # recipient_identifier is too long to be part of a composite index with issued_on on mysql
+    ordering = ('-issued_on', '-pk')
 
 
 class BackpackAssertionList(BaseEntityListView):
@@ -32,13 +40,56 @@ class BackpackAssertionList(BaseEntityListView):
         'post': ['rw:backpack'],
     }
 
+    pagination_class = BackpackAssertionPagination
+
     def get_objects(self, request, **kwargs):
-        return filter(lambda a: (not a.revoked) and a.acceptance != BadgeInstance.ACCEPTANCE_REJECTED,
-                      self.request.user.cached_badgeinstances())
+        if request.version == 'v1':
+            return filter(lambda a: (not a.revoked) and a.acceptance != BadgeInstance.ACCEPTANCE_REJECTED,
+                          self.request.user.cached_badgeinstances())
+
+        queryset = BadgeInstance.objects.filter(
+            recipient_identifier__in=request.user.all_recipient_identifiers,
+            revoked=False
+        ).exclude(acceptance=BadgeInstance.ACCEPTANCE_REJECTED)
+
+        acceptance = request.query_params.get('acceptance', None)
+        if acceptance is not None:
+            queryset = queryset.filter(acceptance=acceptance)
+        return queryset
+
+    def get_paginator(self, request):
+        if request.version == 'v1':
+            # v1 lists the user's cached assertions, which aren't a queryset
+            return None
+        return super(BackpackAssertionList, self).get_paginator(request)
+
+    def prefetch_objects(self, objects):
+        return prefetch_cached(objects, 'cached_badgeclass', 'cached_issuer', 'cached_evidence', 'cached_extensions')
 
     @apispec_list_operation('Assertion',
         summary="Get a list of Assertions in authenticated user's backpack ",
-        tags=['Backpack']
+        tags=['Backpack'],
+        parameters=[
+            {
+                'in': 'query',
+                'name': "acceptance",
+                'type': "string",
+                'enum': ["Unaccepted", "Accepted"],
+                'description': 'Only list assertions with this acceptance'
+            },
+            {
+                'in': 'query',
+                'name': "cursor",
+                'type': "string",
+                'description': 'The nextCursor or previousCursor of a previous page'
+            },
+            {
+                'in': 'query',
+                'name': "paginate",
+                'type': "boolean",
+                'description': 'Set to false to list every assertion in one response'
+            },
+        ]
     )
     def get(self, request, **kwargs):
         return super(BackpackAssertionList, self).get(request, **kwargs)
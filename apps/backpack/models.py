@@ -16,6 +16,9 @@ from backpack.sharing import SharingManager
 from issuer.utils import CURRENT_OBI_VERSION, get_obi_context, add_obi_version_ifneeded
 from mainsite.managers import SlugOrJsonIdCacheModelManager
 from mainsite.models import BadgrApp
+from mainsite.prefetch import prefetch_cached
+from mainsite.publish import coalesce_publish, publish_batch
+from mainsite.response_cache import invalidate_rendered_responses
 from mainsite.utils import OriginSetting
 
 
@@ -32,9 +35,11 @@ class BackpackCollection(BaseAuditedModel, BaseVersionedEntity):
 
     cached = SlugOrJsonIdCacheModelManager(slug_kwarg_name='entity_id', slug_field_name='entity_id')
 
+    @coalesce_publish
     def publish(self):
         super(BackpackCollection, self).publish()
         self.publish_by('share_hash')
+        invalidate_rendered_responses(self)
         self.created_by.publish()
 
     def delete(self, *args, **kwargs):
@@ -88,7 +93,7 @@ class BackpackCollection(BaseAuditedModel, BaseVersionedEntity):
         """
         Update this collection's list of BackpackCollectionBadgeInstance from a list of BadgeInstance EntityRelatedFieldV2 serializer data
         """
-        with transaction.atomic():
+        with transaction.atomic(), publish_batch():
             existing_badges = {b.entity_id: b for b in self.badge_items}
             # add missing badges
             for badge_entity_id in value:
@@ -125,10 +130,12 @@ class BackpackCollection(BaseAuditedModel, BaseVersionedEntity):
                 ('lastName', self.cached_creator.last_name),
             ]))
         ])
+        badgeinstances = prefetch_cached(self.cached_badgeinstances(),
+                                         'cached_badgeclass', 'cached_issuer', 'cached_evidence', 'cached_extensions')
         json['badges'] = [b.get_json(obi_version=obi_version,
                                      expand_badgeclass=expand_badgeclass,
                                      expand_issuer=expand_issuer,
-                                     include_extra=include_extra) for b in self.cached_badgeinstances()]
+                                     include_extra=include_extra) for b in badgeinstances]
 
         return json
 
@@ -143,6 +150,7 @@ class BackpackCollectionBadgeInstance(cachemodel.CacheModel):
     badgeuser = models.ForeignKey('badgeuser.BadgeUser', null=True, default=None)
     badgeinstance = models.ForeignKey('issuer.BadgeInstance')
 
+    @coalesce_publish
     def publish(self):
         super(BackpackCollectionBadgeInstance, self).publish()
         self.collection.publish()
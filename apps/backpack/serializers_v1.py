@@ -14,6 +14,7 @@ from issuer.helpers import BadgeCheckHelper
 from issuer.models import BadgeInstance
 from issuer.serializers_v1 import EvidenceItemSerializer
 from mainsite.drf_fields import Base64FileField
+from mainsite.publish import publish_batch
 from mainsite.serializers import StripTagsCharField, MarkdownCharField
 from mainsite.utils import OriginSetting
 
@@ -220,6 +221,7 @@ class CollectionSerializerV1(serializers.Serializer):
             representation['share_url'] = ""
         return representation
 
+    @publish_batch()
     def create(self, validated_data):
         owner = validated_data.get('created_by', self.context.get('user', None))
         new_collection = BackpackCollection.objects.create(
@@ -239,6 +241,7 @@ class CollectionSerializerV1(serializers.Serializer):
 
         return new_collection
 
+    @publish_batch()
     def update(self, instance, validated_data):
         instance.name = validated_data.get('name', instance.name)
         instance.description = validated_data.get('description', instance.description)
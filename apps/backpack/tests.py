@@ -14,7 +14,7 @@ from openbadges_bakery import bake, unbake
 
 from badgeuser.models import CachedEmailAddress, BadgeUser
 from issuer.models import BadgeClass, Issuer, BadgeInstance
-from mainsite.tests.base import BadgrTestCase
+from mainsite.tests.base import BadgrTestCase, SetupIssuerHelper
 
 from backpack.models import BackpackCollection, BackpackCollectionBadgeInstance
 from backpack.serializers_v1 import (CollectionSerializerV1)
@@ -708,6 +708,41 @@ class TestBadgeUploads(BadgrTestCase):
         self.assertEqual(response.status_code, 201)
 
 
+class TestBackpackAssertionList(SetupIssuerHelper, BadgrTestCase):
+    def test_v2_backpack_list_paginated_by_issued_on(self):
+        test_issuer_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_issuer_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+
+        self.setup_user(email='backpack.owner@email.test', authenticate=True)
+        issued, _ = zip(*BadgeInstance.objects.bulk_issue(test_badgeclass, [
+            dict(recipient_identifier='backpack.owner@email.test', notify=False) for i in range(55)
+        ]))
+        # the same issued_on is disambiguated by pk
+        BadgeInstance.objects.filter(pk__in=[a.pk for a in issued[:10]]).update(
+            issued_on=dateutil.parser.parse('2017-01-01T00:00:00Z'))
+        BadgeInstance.objects.filter(pk=issued[10].pk).update(acceptance=BadgeInstance.ACCEPTANCE_REJECTED)
+        BadgeInstance.objects.filter(pk=issued[11].pk).update(revoked=True, revocation_reason='for testing')
+
+        expected = sorted(issued[12:], key=lambda a: a.issued_on, reverse=True) + list(reversed(issued[:10]))
+        response = self.client.get('/v2/backpack/assertions')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a['entityId'] for a in response.data['result']], [a.entity_id for a in expected[:50]])
+        self.assertEqual(response.data['result'][0]['badgeclass'], test_badgeclass.entity_id)
+        self.assertTrue(response.data['pagination']['hasNext'])
+
+        response = self.client.get('/v2/backpack/assertions', {'cursor': response.data['pagination']['nextCursor']})
+        self.assertEqual([a['entityId'] for a in response.data['result']], [a.entity_id for a in expected[50:]])
+        self.assertFalse(response.data['pagination']['hasNext'])
+
+        response = self.client.get('/v2/backpack/assertions', {'cursor': response.data['pagination']['previousCursor']})
+        self.assertEqual([a['entityId'] for a in response.data['result']], [a.entity_id for a in expected[:50]])
+        self.assertFalse(response.data['pagination']['hasPrevious'])
+
+        response = self.client.get('/v2/backpack/assertions', {'paginate': 'false'})
+        self.assertEqual(len(response.data['result']), 53)
+
+
 class TestCollections(BadgrTestCase):
     def setUp(self):
         super(TestCollections, self).setUp()
@@ -22,17 +22,21 @@ from backpack.models import BackpackCollection
 from entity.models import BaseVersionedEntity
 from issuer.models import Issuer, BadgeInstance
 from badgeuser.managers import CachedEmailAddressManager, BadgeUserManager
+from mainsite.managers import CacheModelManager
 from mainsite.models import ApplicationInfo
+from mainsite.publish import coalesce_publish
 
 
 class CachedEmailAddress(EmailAddress, cachemodel.CacheModel):
     objects = CachedEmailAddressManager()
+    cached = CacheModelManager()
 
     class Meta:
         proxy = True
         verbose_name = _("email address")
         verbose_name_plural = _("email addresses")
 
+    @coalesce_publish
     def publish(self):
         super(CachedEmailAddress, self).publish()
         self.publish_by('email')
@@ -133,6 +137,7 @@ class BadgeUser(BaseVersionedEntity, AbstractUser, cachemodel.CacheModel):
     badgrapp = models.ForeignKey('mainsite.BadgrApp', blank=True, null=True, default=None)
 
     objects = BadgeUserManager()
+    cached = CacheModelManager()
 
     class Meta:
         verbose_name = _('badge user')
@@ -151,6 +156,7 @@ class BadgeUser(BaseVersionedEntity, AbstractUser, cachemodel.CacheModel):
         """
         send_mail(subject, message, from_email, [self.primary_email], **kwargs)
 
+    @coalesce_publish
     def publish(self):
         super(BadgeUser, self).publish()
         self.publish_by('username')
@@ -1,13 +1,26 @@
 # encoding: utf-8
 from __future__ import unicode_literals
 
+import calendar
+import hashlib
+import json
+import logging
+
+import more_itertools
 from django.core.exceptions import FieldError
-from django.http import Http404
+from django.db.models import QuerySet
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.status import HTTP_200_OK, HTTP_404_NOT_FOUND, HTTP_201_CREATED, HTTP_204_NO_CONTENT
 from rest_framework.views import APIView
 
 import badgrlog
+from entity.serializers import BaseSerializerV2
+
+logger = logging.getLogger(__name__)
 
 
 class BaseEntityView(APIView):
@@ -45,10 +58,89 @@ class BaseEntityView(APIView):
 
 
 class BaseEntityListView(BaseEntityView):
+    # set to a paginator class, eg. EncryptedCursorPagination, to paginate the queryset from get_objects()
+    pagination_class = None
+
+    # v1 clients expect a plain list, so v1 responses are only paginated when requested with ?paginate=true
+    paginate_query_param = 'paginate'
+    paginate_v1_by_default = False
+
+    # unpaginated lists can be streamed, serializing stream_chunk_size objects at a time instead of rendering the whole
+    # response in memory. Views stream when requested with ?stream=true, or by default if stream_by_default is set.
+    stream_query_param = 'stream'
+    stream_by_default = False
+    stream_chunk_size = 100
 
     def get_objects(self, request, **kwargs):
         raise NotImplementedError
 
+    def prefetch_objects(self, objects):
+        """
+        Called with the objects about to be serialized (the current page when paginated), to load
+        their related objects in bulk.
+        """
+        return objects
+
+    def get_paginator(self, request):
+        if self.pagination_class is None:
+            return None
+
+        paginate = request.query_params.get(self.paginate_query_param, None)
+        if paginate is None:
+            paginate = request.version != 'v1' or self.paginate_v1_by_default
+        else:
+            paginate = paginate.lower() not in ('false', '0')
+
+        if paginate:
+            return self.pagination_class()
+
+    def should_stream(self, request):
+        stream = request.query_params.get(self.stream_query_param, None)
+        if stream is None:
+            return self.stream_by_default
+        return stream.lower() not in ('false', '0')
+
+    def get_streaming_response(self, request, objects, serializer_class, context):
+        """
+        Returns a StreamingHttpResponse that renders objects in chunks, within the response envelope of request.version.
+        Querysets are read in pk order with iter_queryset_chunks(), and each chunk is passed through prefetch_objects().
+
+        The status line has already been sent when an error interrupts the stream, so the error is logged and the
+        envelope closed; v2 envelopes end with their status, which then reports the failure.
+        """
+        child = serializer_class(many=True, context=context).child
+
+        if request.version == 'v1':
+            prefix, suffix, error_suffix = '[', ']', ']'
+        else:
+            def _status(success, description):
+                envelope = BaseSerializerV2.response_envelope(result=[], success=success, description=description)
+                return '],"status":{}}}'.format(_render_json(envelope['status']))
+            prefix = '{"result":['
+            suffix = _status(True, 'ok')
+            error_suffix = _status(False, 'An error occurred while streaming the response, the result is incomplete')
+
+        if isinstance(objects, QuerySet):
+            chunks = iter_queryset_chunks(objects, self.stream_chunk_size)
+        else:
+            chunks = more_itertools.chunked(objects, self.stream_chunk_size)
+
+        def stream():
+            yield prefix
+            separator = ''
+            try:
+                for chunk in chunks:
+                    for obj in self.prefetch_objects(chunk):
+                        yield separator + _render_json(child.to_representation(obj))
+                        separator = ','
+            except Exception:
+                logger.exception("Error streaming %s", request.path)
+                yield error_suffix
+            else:
+                yield suffix
+
+        return StreamingHttpResponse(stream(), content_type='application/json')
+
     def get(self, request, **kwargs):
         """
         GET a list of an entities the authenticated user is authorized for
@@ -56,7 +148,22 @@ class BaseEntityListView(BaseEntityView):
         objects = self.get_objects(request, **kwargs)
         context = self.get_context_data(**kwargs)
         serializer_class = self.get_serializer_class()
-        serializer = serializer_class(objects, many=True, context=context)
+
+        if self.should_stream(request):
+            # streamed lists are never paginated
+            return self.get_streaming_response(request, objects, serializer_class, context)
+
+        paginator = self.get_paginator(request)
+        if paginator is not None:
+            page = self.prefetch_objects(paginator.paginate_queryset(objects, request, view=self))
+            serializer = serializer_class(page, many=True, context=context)
+            if request.version == 'v1':
+                return paginator.get_paginated_response(serializer.data)
+            data = serializer.data
+            data['pagination'] = paginator.get_page_info()
+            return Response(data)
+
+        serializer = serializer_class(self.prefetch_objects(objects), many=True, context=context)
         return Response(serializer.data)
 
     def post(self, request, **kwargs):
@@ -73,6 +180,103 @@ class BaseEntityListView(BaseEntityView):
         return Response(serializer.data, status=HTTP_201_CREATED)
 
 
+def iter_queryset_chunks(queryset, chunk_size):
+    """
+    Yield lists of the objects in queryset in pk order. Each chunk is its own keyset query
+    (WHERE id > :last ORDER BY id LIMIT :chunk_size), so the whole result is never buffered by the database driver,
+    as QuerySet.iterator() does without server side cursors.
+    """
+    queryset = queryset.order_by('pk')
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        yield chunk
+        chunk = list(queryset.filter(pk__gt=chunk[-1].pk)[:chunk_size])
+
+
+def _render_json(data):
+    rendered = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+    if isinstance(rendered, unicode):
+        rendered = rendered.encode('utf-8')
+    return rendered
+
+
+class ConditionalGetMixin(object):
+    """
+    Answers GET requests carrying If-None-Match or If-Modified-Since with 304 Not Modified when the client's copy is
+    current, without rendering the response.
+
+    The ETag is a hash of get_etag_objects() and get_etag_parts(), which together should change whenever the response
+    would. Last-Modified is the latest updated_at of get_etag_objects(), unless use_last_modified() says that misses
+    changes the ETag covers.
+    """
+
+    def get_etag_objects(self, request, obj):
+        """
+        The versioned entities the response to request is rendered from.
+        """
+        return [obj]
+
+    def get_etag_parts(self, request, obj):
+        """
+        Anything else the response to request depends on, such as the api version or query parameters.
+        """
+        return []
+
+    def use_last_modified(self, request, obj):
+        """
+        Whether the latest updated_at of get_etag_objects() changes whenever the response does. Views whose response
+        depends on state that doesn't bump updated_at (eg. related object counts, or which objects are listed) return
+        False, so clients revalidating with If-Modified-Since alone don't get a stale 304.
+        """
+        return True
+
+    def get_validators(self, request, obj):
+        """
+        Returns (etag, last_modified) for the response to request, or (None, None) if it can't be revalidated.
+        """
+        parts = self.get_etag_parts(request, obj)
+        if parts is None:
+            return None, None
+        objects = self.get_etag_objects(request, obj)
+        parts = [o.get_etag_parts() for o in objects] + [parts]
+        etag = hashlib.sha1(_render_json(parts)).hexdigest()
+
+        last_modified = None
+        if self.use_last_modified(request, obj):
+            updated_at = [o.updated_at for o in objects if getattr(o, 'updated_at', None) is not None]
+            if updated_at and len(updated_at) == len(objects):
+                last_modified = calendar.timegm(max(updated_at).utctimetuple())
+        return etag, last_modified
+
+    def get_not_modified_response(self, request, obj, validators=None):
+        """
+        Returns a 304 response if the client already has the current response to request, otherwise None.
+        """
+        etag, last_modified = validators or self.get_validators(request, obj)
+        if etag is None:
+            return None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def conditional_response(self, request, obj, response, validators=None):
+        """
+        Add the ETag and Last-Modified of obj to a successful response to request.
+        """
+        if response.status_code == HTTP_200_OK:
+            etag, last_modified = validators or self.get_validators(request, obj)
+            if etag is not None:
+                self.set_validators(response, etag, last_modified)
+        return response
+
+
 class VersionedObjectMixin(object):
     entity_id_field_name = 'entity_id'
 
@@ -116,7 +320,15 @@ class VersionedObjectMixin(object):
         return self.entity_id_field_name
 
 
-class BaseEntityDetailView(BaseEntityView, VersionedObjectMixin):
+class BaseEntityDetailView(BaseEntityView, VersionedObjectMixin, ConditionalGetMixin):
+    # set on views whose serialized entity only changes when get_etag_objects() are saved, to answer conditional GETs
+    conditional_get = False
+
+    def get_etag_parts(self, request, obj):
+        if not self.conditional_get:
+            return None
+        user_id = request.user.pk if request.user.is_authenticated() else None
+        return [request.version, request.accepted_media_type, user_id, sorted(request.query_params.lists())]
 
     def get(self, request, **kwargs):
         """
@@ -126,10 +338,14 @@ class BaseEntityDetailView(BaseEntityView, VersionedObjectMixin):
         if not self.has_object_permissions(request, obj):
             return Response(status=HTTP_404_NOT_FOUND)
 
+        not_modified = self.get_not_modified_response(request, obj)
+        if not_modified is not None:
+            return not_modified
+
         context = self.get_context_data(**kwargs)
         serializer_class = self.get_serializer_class()
         serializer = serializer_class(obj, context=context)
-        return Response(serializer.data)
+        return self.conditional_response(request, obj, Response(serializer.data))
 
     def put(self, request, data=None, allow_partial=False, **kwargs):
         """
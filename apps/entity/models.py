@@ -4,6 +4,7 @@ from __future__ import unicode_literals
 import cachemodel
 from django.db import models
 
+from mainsite.publish import coalesce_publish
 from mainsite.utils import generate_entity_uri
 
 
@@ -18,6 +19,12 @@ class _AbstractVersionedEntity(cachemodel.CacheModel):
             return self.entity_class_name
         return self.__class__.__name__
 
+    def get_etag_parts(self):
+        """
+        Values that change whenever this entity is saved, for building the ETag of a response that includes it.
+        """
+        return [self.get_entity_class_name(), self.entity_id, self.entity_version]
+
     def save(self, *args, **kwargs):
         if self.entity_id is None:
             self.entity_id = generate_entity_uri()
@@ -25,6 +32,7 @@ class _AbstractVersionedEntity(cachemodel.CacheModel):
         self.entity_version += 1
         return super(_AbstractVersionedEntity, self).save(*args, **kwargs)
 
+    @coalesce_publish
     def publish(self):
         super(_AbstractVersionedEntity, self).publish()
         self.publish_by('entity_id')
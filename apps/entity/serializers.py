@@ -7,6 +7,8 @@ from rest_framework import serializers
 
 from rest_framework.exceptions import ValidationError as RestframeworkValidationError
 
+from mainsite.publish import publish_batch
+
 
 class EntityRelatedFieldV2(serializers.RelatedField):
     def __init__(self, *args, **kwargs):
@@ -100,12 +102,50 @@ class DetailSerializerV2(BaseSerializerV2):
     entityType = serializers.CharField(source='get_entity_class_name', max_length=254, read_only=True)
     entityId = serializers.CharField(source='entity_id', max_length=254, read_only=True)
 
+    # GET requests can choose which fields of the entities in a response are serialized, with ?fields=a,b or
+    # ?exclude=a,b. Other fields are never read from the instance, so the objects behind them aren't fetched.
+    sparse_fieldset_required = ('entityType', 'entityId')
+
     class Meta:
         list_serializer_class = ListSerializerV2
 
+    def get_fields(self):
+        fields = super(DetailSerializerV2, self).get_fields()
+
+        request = self.context.get('request', None)
+        if request is None or request.method not in ('GET', 'HEAD') or not self._is_response_entity():
+            return fields
+
+        query_params = getattr(request, 'query_params', request.GET)
+        self._sparse_fieldset = (_field_names(query_params.get('fields', None)),
+                                 _field_names(query_params.get('exclude', None)) or set())
+        for field_name in list(fields.keys()):
+            if not self.sparse_fieldset_allows(field_name):
+                del fields[field_name]
+        return fields
+
+    def sparse_fieldset_allows(self, field_name):
+        only, exclude = getattr(self, '_sparse_fieldset', (None, set()))
+        if field_name in self.sparse_fieldset_required:
+            return True
+        return (only is None or field_name in only) and field_name not in exclude
+
+    def _is_response_entity(self):
+        """
+        True for the entity a response is about, or each entity of a list response, but not for nested entities.
+        """
+        if isinstance(self.parent, serializers.ListSerializer):
+            return self.parent.parent is None
+        return self.parent is None
+
     def get_model_class(self):
         return getattr(self.Meta, 'model', None)
 
+    def save(self, **kwargs):
+        # related *_items setters save many objects, publish their shared parents once when done
+        with publish_batch():
+            return super(DetailSerializerV2, self).save(**kwargs)
+
     def create(self, validated_data):
         model_cls = self.get_model_class()
         if model_cls is not None:
@@ -123,6 +163,12 @@ class DetailSerializerV2(BaseSerializerV2):
         return instance
 
 
+def _field_names(value):
+    if value is None:
+        return None
+    return set(name.strip() for name in value.split(',') if name.strip())
+
+
 class V2ErrorSerializer(BaseSerializerV2):
     _field_errors = {}
     _validation_errors = []
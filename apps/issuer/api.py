@@ -1,10 +1,11 @@
 from collections import OrderedDict
 
 import datetime
+import json
 
 import dateutil.parser
-from django.db.models import Q
-from django.http import Http404
+from django.apps import apps
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from oauth2_provider.models import AccessToken
 from oauthlib.oauth2.rfc6749.tokens import random_token_generator
@@ -14,9 +15,12 @@ from rest_framework.response import Response
 from rest_framework.status import HTTP_404_NOT_FOUND, HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN
 
 import badgrlog
-from entity.api import BaseEntityListView, BaseEntityDetailView, VersionedObjectMixin, BaseEntityView
+from backpack.models import BackpackCollectionBadgeInstance
+from entity.api import BaseEntityListView, BaseEntityDetailView, VersionedObjectMixin, BaseEntityView, \
+    iter_queryset_chunks
 from entity.serializers import BaseSerializerV2, V2ErrorSerializer
-from issuer.models import Issuer, BadgeClass, BadgeInstance, IssuerStaff
+from issuer.models import Issuer, BadgeClass, BadgeInstance, BadgeInstanceChange, BadgeInstanceEvidence, \
+    BadgeInstanceExtension, IssuerStaff
 from issuer.permissions import (MayIssueBadgeClass, MayEditBadgeClass,
                                 IsEditor, IsStaff, ApprovedIssuersOnly, BadgrOAuthTokenHasScope,
                                 BadgrOAuthTokenHasEntityScope)
@@ -25,9 +29,12 @@ from issuer.serializers_v1 import (IssuerSerializerV1, BadgeClassSerializerV1,
 from issuer.serializers_v2 import IssuerSerializerV2, BadgeClassSerializerV2, BadgeInstanceSerializerV2, \
     IssuerAccessTokenSerializerV2
 from apispec_drf.decorators import apispec_get_operation, apispec_put_operation, \
-    apispec_delete_operation, apispec_list_operation, apispec_post_operation
-from mainsite.pagination import EncryptedCursorPagination
+    apispec_delete_operation, apispec_list_operation, apispec_post_operation, apispec_operation
+from mainsite.models import BadgrApp
+from mainsite.pagination import EncryptedCursorPagination, SignedCursorPagination
 from mainsite.permissions import AuthenticatedWithVerifiedEmail
+from mainsite.prefetch import prefetch_cached
+from mainsite.renderers import CSVDictRenderer
 from mainsite.serializers import CursorPaginatedListSerializer
 
 logger = badgrlog.BadgrLogger()
@@ -69,6 +76,24 @@ class IssuerDetail(BaseEntityDetailView):
     v2_serializer_class = IssuerSerializerV2
     permission_classes = (AuthenticatedWithVerifiedEmail, IsEditor, BadgrOAuthTokenHasEntityScope)
     valid_scopes = ["rw:issuer", "rw:issuer:*"]
+    conditional_get = True
+
+    def get_etag_objects(self, request, obj):
+        # staff are listed with their user profiles
+        return [obj] + [staff.cached_user for staff in obj.cached_issuerstaff()]
+
+    def get_etag_parts(self, request, obj):
+        if request.version == 'v1':
+            # IssuerSerializerV1 reports related object counts, which aren't versioned and are too costly to check
+            return None
+        parts = super(IssuerDetail, self).get_etag_parts(request, obj)
+        if parts is not None:
+            parts.append([(staff.user_id, staff.role) for staff in obj.cached_issuerstaff()])
+        return parts
+
+    def use_last_modified(self, request, obj):
+        # changes to staff don't bump the issuer's updated_at
+        return False
 
     @apispec_get_operation('Issuer',
         summary="Get a single Issuer",
@@ -171,6 +196,17 @@ class BadgeClassDetail(BaseEntityDetailView):
     v2_serializer_class = BadgeClassSerializerV2
 
     valid_scopes = ["rw:issuer", "rw:issuer:*"]
+    conditional_get = True
+
+    def get_etag_parts(self, request, obj):
+        parts = super(BadgeClassDetail, self).get_etag_parts(request, obj)
+        if parts is not None and request.version == 'v1':
+            parts.append(obj.recipient_count())
+        return parts
+
+    def use_last_modified(self, request, obj):
+        # issuing doesn't bump the badgeclass's updated_at
+        return request.version != 'v1'
 
     @apispec_get_operation('BadgeClass',
         summary='Get a single BadgeClass',
@@ -258,11 +294,42 @@ class BatchAssertionsIssue(VersionedObjectMixin, BaseEntityView):
                                            field_errors=serializer._errors,
                                            validation_errors=[])
             return Response(serializer.data, status=status.HTTP_400_BAD_REQUEST)
-        new_instances = serializer.save(created_by=request.user)
+
+        results = BadgeInstance.objects.bulk_issue(
+            badgeclass,
+            [serializer.child.get_issue_kwargs(validated_data) for validated_data in serializer.validated_data],
+            created_by=request.user,
+            badgr_app=BadgrApp.objects.get_current(request)
+        )
+        new_instances = [new_instance for new_instance, error in results if new_instance is not None]
         for new_instance in new_instances:
             self.log_create(new_instance)
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        result_serializer = serializer_class(new_instances, many=True, context=context)
+        if len(new_instances) == len(results):
+            return Response(result_serializer.data, status=status.HTTP_201_CREATED)
+
+        # report success or failure for each submitted assertion, in the order they were submitted
+        representations = iter(result_serializer.data['result'] if request.version == 'v2' else result_serializer.data)
+        result = []
+        field_errors = []
+        for new_instance, error in results:
+            if new_instance is not None:
+                result.append(next(representations))
+                field_errors.append({})
+            else:
+                result.append(None)
+                field_errors.append({'non_field_errors': [error]})
+
+        response_status = status.HTTP_201_CREATED if new_instances else status.HTTP_400_BAD_REQUEST
+        if request.version == 'v1':
+            return Response([r if r is not None else e for r, e in zip(result, field_errors)], status=response_status)
+        return Response(BaseSerializerV2.response_envelope(
+            result=result,
+            success=False,
+            description="{} of {} assertions could not be issued".format(len(results) - len(new_instances), len(results)),
+            field_errors=field_errors
+        ), status=response_status)
 
 
 class BatchAssertionsRevoke(VersionedObjectMixin, BaseEntityView):
@@ -276,39 +343,56 @@ class BatchAssertionsRevoke(VersionedObjectMixin, BaseEntityView):
         context['badgeclass'] = self.get_object(self.request, **kwargs)
         return context
 
-    def _process_revoke(self, request, revocation):
-        response = {
-            "revoked": False,
-        }
+    def _may_revoke(self, request, issuer):
+        return request.user.has_perm('issuer.is_editor', issuer) and self.has_object_permissions(request, issuer)
 
-        entity_id = revocation.get("entityId", None)
-        revocation_reason = revocation.get("revocationReason", None)
+    def _process_revocations(self, request, revocations):
+        entity_ids = [r.get("entityId") for r in revocations if r.get("entityId", None) is not None]
+        assertions = {a.entity_id: a for a in BadgeInstance.objects.filter(entity_id__in=entity_ids)}
 
-        if entity_id is None:
-            return dict(response, reason="entityId is required")
+        # check permissions once per issuer rather than once per assertion
+        may_revoke = {issuer.pk: self._may_revoke(request, issuer)
+                      for issuer in Issuer.objects.filter(pk__in=set(a.issuer_id for a in assertions.values()))}
 
-        response["entityId"] = entity_id
+        results = []
+        pending = {}
+        for revocation in revocations:
+            response = {
+                "revoked": False,
+            }
+            results.append(response)
 
-        if revocation_reason is None:
-            return dict(response, reason="revocationReason is required")
+            entity_id = revocation.get("entityId", None)
+            revocation_reason = revocation.get("revocationReason", None)
 
-        response["revocationReason"] = revocation_reason
+            if entity_id is None:
+                response["reason"] = "entityId is required"
+                continue
 
-        try:
-            assertion = self.get_object(request, entity_id=entity_id)
-        except Http404:
-            return dict(response, reason="permission denied or object not found")
+            response["entityId"] = entity_id
 
-        if not self.has_object_permissions(request, assertion):
-            dict(response, reason="permission denied or object not found")
+            if not revocation_reason:
+                response["reason"] = "revocationReason is required"
+                continue
 
+            response["revocationReason"] = revocation_reason
 
-        try:
-            assertion.revoke(revocation_reason)
-        except Exception as e:
-            return dict(response, reason=e.message)
+            assertion = assertions.get(entity_id, None)
+            if assertion is None or not may_revoke.get(assertion.issuer_id, False):
+                response["reason"] = "permission denied or object not found"
+            elif assertion.revoked or assertion.pk in pending:
+                response["reason"] = "Assertion is already revoked"
+            else:
+                pending[assertion.pk] = (assertion, revocation_reason, response)
+
+        revoked_pks = set(BadgeInstance.objects.bulk_revoke([(a, reason) for a, reason, r in pending.values()]))
+        for pk, (assertion, revocation_reason, response) in pending.items():
+            if pk in revoked_pks:
+                response["revoked"] = True
+            else:
+                response["reason"] = "Assertion is already revoked"
 
-        return dict(response, revoked=True)
+        return results
 
     @apispec_post_operation('Assertion',
         summary='Revoke multiple Assertions',
@@ -326,17 +410,106 @@ class BatchAssertionsRevoke(VersionedObjectMixin, BaseEntityView):
         ]
     )
     def post(self, request, **kwargs):
-        result = [
-            self._process_revoke(request, revocation)
-            for revocation in self.request.data
-        ]
+        result = self._process_revocations(request, self.request.data)
 
         response_data = BaseSerializerV2.response_envelope(result=result, success=True, description="revoked badges")
 
         return Response(status=HTTP_200_OK, data=response_data)
 
 
-class BadgeInstanceList(VersionedObjectMixin, BaseEntityListView):
+class AssertionListFilterMixin(object):
+    """
+    Filters a list of assertions in the database by the query params documented in assertion_list_parameters.
+    """
+    pagination_class = EncryptedCursorPagination
+
+    def filter_assertions(self, request, queryset):
+        revoked = request.query_params.get('revoked', 'false').lower()
+        if revoked != 'any':
+            queryset = queryset.filter(revoked=revoked in ('true', '1'))
+
+        if 'recipient' in request.query_params:
+            recipient_id = request.query_params.get('recipient').lower()
+            queryset = queryset.filter(recipient_identifier=recipient_id)
+
+        for param, lookup in (('issuedOnAfter', 'issued_on__gte'), ('issuedOnBefore', 'issued_on__lt')):
+            if param in request.query_params:
+                try:
+                    issued_on = dateutil.parser.parse(request.query_params.get(param))
+                except (ValueError, OverflowError):
+                    raise ValidationError({param: ["must be iso8601 format"]})
+                if timezone.is_naive(issued_on):
+                    issued_on = timezone.make_aware(issued_on, timezone.utc)
+                queryset = queryset.filter(**{lookup: issued_on})
+
+        return queryset
+
+
+assertion_filter_parameters = [
+    {
+        'in': 'query',
+        'name': "recipient",
+        'type': "string",
+        'description': 'A recipient identifier to filter by'
+    },
+    {
+        'in': 'query',
+        'name': "revoked",
+        'type': "string",
+        'enum': ["false", "true", "any"],
+        'description': 'List unrevoked (default), revoked or all assertions'
+    },
+    {
+        'in': 'query',
+        'name': "issuedOnAfter",
+        'type': "string",
+        'format': "date-time",
+        'description': 'Only list assertions issued on or after this ISO8601 date'
+    },
+    {
+        'in': 'query',
+        'name': "issuedOnBefore",
+        'type': "string",
+        'format': "date-time",
+        'description': 'Only list assertions issued before this ISO8601 date'
+    },
+]
+
+assertion_list_parameters = assertion_filter_parameters + [
+    {
+        'in': 'query',
+        'name': "cursor",
+        'type': "string",
+        'description': 'The nextCursor or previousCursor of a previous page'
+    },
+    {
+        'in': 'query',
+        'name': "paginate",
+        'type': "boolean",
+        'description': 'Set to false to list every assertion in one response. v1 lists are only paginated if true'
+    },
+    {
+        'in': 'query',
+        'name': "stream",
+        'type': "boolean",
+        'description': 'Set to true to stream every assertion in one response as it is serialized, for exports'
+    },
+    {
+        'in': 'query',
+        'name': "fields",
+        'type': "string",
+        'description': 'Comma separated list of the only fields to include in each assertion (v2), eg. recipient,issuedOn'
+    },
+    {
+        'in': 'query',
+        'name': "exclude",
+        'type': "string",
+        'description': 'Comma separated list of fields to leave out of each assertion (v2), eg. evidence,extensions'
+    },
+]
+
+
+class BadgeInstanceList(AssertionListFilterMixin, VersionedObjectMixin, BaseEntityListView):
     """
     GET a list of assertions for a single badgeclass
     POST to issue a new assertion
@@ -350,14 +523,10 @@ class BadgeInstanceList(VersionedObjectMixin, BaseEntityListView):
 
     def get_objects(self, request, **kwargs):
         badgeclass = self.get_object(request, **kwargs)
-        assertions = [a for a in badgeclass.cached_badgeinstances() if not a.revoked]
-
-        # filter badgeclasses by recipient if present in query_params
-        if 'recipient' in request.query_params:
-            recipient_id = request.query_params.get('recipient').lower()
-            assertions = filter(lambda a: a.recipient_identifier == recipient_id, assertions)
+        return self.filter_assertions(request, badgeclass.badgeinstances.all())
 
-        return assertions
+    def prefetch_objects(self, objects):
+        return prefetch_cached(objects, 'cached_badgeclass', 'cached_issuer', 'cached_evidence', 'cached_extensions')
 
     def get_context_data(self, **kwargs):
         context = super(BadgeInstanceList, self).get_context_data(**kwargs)
@@ -367,14 +536,7 @@ class BadgeInstanceList(VersionedObjectMixin, BaseEntityListView):
     @apispec_list_operation('Assertion',
         summary="Get a list of Assertions for a single BadgeClass",
         tags=['Assertions', 'BadgeClasses'],
-        parameters=[
-            {
-                'in': 'query',
-                'name': "recipient",
-                'type': "string",
-                'description': 'A recipient identifier to filter by'
-            }
-        ]
+        parameters=assertion_list_parameters
     )
     def get(self, request, **kwargs):
         # verify the user has permission to the badgeclass
@@ -397,7 +559,7 @@ class BadgeInstanceList(VersionedObjectMixin, BaseEntityListView):
         return super(BadgeInstanceList, self).post(request, **kwargs)
 
 
-class IssuerBadgeInstanceList(VersionedObjectMixin, BaseEntityListView):
+class IssuerBadgeInstanceList(AssertionListFilterMixin, VersionedObjectMixin, BaseEntityListView):
     """
     Retrieve all assertions within one issuer
     """
@@ -410,26 +572,15 @@ class IssuerBadgeInstanceList(VersionedObjectMixin, BaseEntityListView):
 
     def get_objects(self, request, **kwargs):
         issuer = self.get_object(request, **kwargs)
-        assertions = [a for a in issuer.cached_badgeinstances() if not a.revoked]
+        return self.filter_assertions(request, issuer.get_badgeinstances())
 
-        # filter badgeclasses by recipient if present in query_params
-        if 'recipient' in request.query_params:
-            recipient_id = request.query_params.get('recipient').lower()
-            assertions = filter(lambda a: a.recipient_identifier == recipient_id, assertions)
-
-        return assertions
+    def prefetch_objects(self, objects):
+        return prefetch_cached(objects, 'cached_badgeclass', 'cached_issuer', 'cached_evidence', 'cached_extensions')
 
     @apispec_list_operation('Assertion',
         summary='Get a list of Assertions for a single Issuer',
         tags=['Assertions', 'Issuers'],
-        parameters=[
-            {
-                'in': 'query',
-                'name': "recipient",
-                'type': "string",
-                'description': 'A recipient identifier to filter by'
-            }
-        ]
+        parameters=assertion_list_parameters
     )
     def get(self, request, **kwargs):
         return super(IssuerBadgeInstanceList, self).get(request, **kwargs)
@@ -443,6 +594,98 @@ class IssuerBadgeInstanceList(VersionedObjectMixin, BaseEntityListView):
         return super(IssuerBadgeInstanceList, self).post(request, **kwargs)
 
 
+class AssertionCsvExportMixin(AssertionListFilterMixin):
+    """
+    Streams a csv of a queryset of assertions, reading them from the database a chunk at a time so memory use
+    doesn't grow with the number of assertions.
+    """
+    csv_fieldnames = ['entityId', 'badgeclass', 'badgeclassName', 'recipient', 'recipientType', 'issuedOn', 'expires',
+                      'revoked', 'revocationReason', 'narrative', 'evidence', 'extensions']
+    export_chunk_size = 500
+
+    def get_rowdicts(self, queryset):
+        for chunk in iter_queryset_chunks(queryset, self.export_chunk_size):
+            prefetch_cached(chunk, 'cached_badgeclass', 'cached_issuer')
+            pks = [assertion.pk for assertion in chunk]
+            evidence = {}
+            for item in BadgeInstanceEvidence.objects.filter(badgeinstance_id__in=pks).order_by('pk'):
+                evidence.setdefault(item.badgeinstance_id, []).append(item)
+            extensions = {}
+            for item in BadgeInstanceExtension.objects.filter(badgeinstance_id__in=pks).order_by('pk'):
+                extensions.setdefault(item.badgeinstance_id, []).append(item)
+
+            for assertion in chunk:
+                yield self.get_rowdict(assertion, evidence.get(assertion.pk, []), extensions.get(assertion.pk, []))
+
+    def get_rowdict(self, assertion, evidence, extensions):
+        badgeclass = assertion.cached_badgeclass
+        return {
+            'entityId': assertion.entity_id,
+            'badgeclass': badgeclass.entity_id,
+            'badgeclassName': badgeclass.name,
+            'recipient': assertion.recipient_identifier,
+            'recipientType': assertion.recipient_type,
+            'issuedOn': assertion.issued_on.isoformat(),
+            'expires': assertion.expires_at.isoformat() if assertion.expires_at else None,
+            'revoked': assertion.revoked,
+            'revocationReason': assertion.revocation_reason,
+            'narrative': assertion.narrative,
+            'evidence': json.dumps([
+                OrderedDict((k, v) for k, v in (('url', e.evidence_url), ('narrative', e.narrative)) if v)
+                for e in evidence
+            ]) if evidence else None,
+            'extensions': json.dumps(OrderedDict(
+                (e.name, json.loads(e.original_json) if e.original_json else None) for e in extensions
+            )) if extensions else None,
+        }
+
+    def get_csv_response(self, queryset, filename):
+        rows = CSVDictRenderer().render_rows(self.csv_fieldnames, self.get_rowdicts(queryset))
+        response = StreamingHttpResponse(rows, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+        return response
+
+
+class BadgeClassAssertionsExport(AssertionCsvExportMixin, VersionedObjectMixin, BaseEntityView):
+    """
+    Export the assertions of a single badgeclass as csv
+    """
+    model = BadgeClass  # used by get_object()
+    permission_classes = (AuthenticatedWithVerifiedEmail, MayIssueBadgeClass, BadgrOAuthTokenHasEntityScope)
+    valid_scopes = ["rw:issuer", "rw:issuer:*"]
+
+    @apispec_operation(
+        summary="Export the Assertions of a single BadgeClass as csv",
+        tags=['Assertions', 'BadgeClasses'],
+        produces=['text/csv'],
+        parameters=assertion_filter_parameters
+    )
+    def get(self, request, **kwargs):
+        badgeclass = self.get_object(request, **kwargs)
+        queryset = self.filter_assertions(request, badgeclass.badgeinstances.all())
+        return self.get_csv_response(queryset, '{}-assertions.csv'.format(badgeclass.entity_id))
+
+
+class IssuerAssertionsExport(AssertionCsvExportMixin, VersionedObjectMixin, BaseEntityView):
+    """
+    Export the assertions of every badgeclass of an issuer as csv
+    """
+    model = Issuer  # used by get_object()
+    permission_classes = (AuthenticatedWithVerifiedEmail, IsStaff, BadgrOAuthTokenHasEntityScope)
+    valid_scopes = ["rw:issuer", "rw:issuer:*"]
+
+    @apispec_operation(
+        summary="Export the Assertions of a single Issuer as csv",
+        tags=['Assertions', 'Issuers'],
+        produces=['text/csv'],
+        parameters=assertion_filter_parameters
+    )
+    def get(self, request, **kwargs):
+        issuer = self.get_object(request, **kwargs)
+        queryset = self.filter_assertions(request, issuer.get_badgeinstances())
+        return self.get_csv_response(queryset, '{}-assertions.csv'.format(issuer.entity_id))
+
+
 class BadgeInstanceDetail(BaseEntityDetailView):
     """
     Endpoints for (GET)ting a single assertion or revoking a badge (DELETE)
@@ -452,6 +695,13 @@ class BadgeInstanceDetail(BaseEntityDetailView):
     v1_serializer_class = BadgeInstanceSerializerV1
     v2_serializer_class = BadgeInstanceSerializerV2
     valid_scopes = ["rw:issuer", "rw:issuer:*"]
+    conditional_get = True
+
+    def get_etag_parts(self, request, obj):
+        if request.version == 'v1' and apps.is_installed('badgebook'):
+            # BadgeInstanceSerializerV1 includes the badgebook award
+            return None
+        return super(BadgeInstanceDetail, self).get_etag_parts(request, obj)
 
     @apispec_get_operation('Assertion',
         summary="Get a single Assertion",
@@ -552,16 +802,55 @@ class IssuerTokensList(BaseEntityListView):
         return Response(serializer.data)
 
 
+class AssertionChangePagination(SignedCursorPagination):
+    """
+    Pages through the assertion change log as a feed. nextCursor is reported on the last page too,
+    for clients to poll for changes logged after it.
+
+    Cursors only hold a change log sequence, so they are signed rather than encrypted, and each poll is one query.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = super(AssertionChangePagination, self).paginate_queryset(queryset, request, view=view)
+        cursor = request.query_params.get(self.cursor_query_param, None)
+        if not page and cursor is not None:
+            # nothing new, poll from the same place next time
+            self.next_cursor = cursor
+            self.next_link = request.build_absolute_uri()
+        return page
+
+    def get_page_info(self):
+        info = super(AssertionChangePagination, self).get_page_info()
+        info['nextResults'] = self.next_link
+        info['nextCursor'] = self.next_cursor
+        return info
+
+
 class PaginatedAssertionsSinceSerializer(CursorPaginatedListSerializer):
+    """
+    Pages through a queryset of BadgeInstanceChanges, representing the current state of each assertion that changed
+    in the page, and the entityIds of those that have since been deleted.
+    """
     child = BadgeInstanceSerializerV2()
+    pagination_class = AssertionChangePagination
 
     def __init__(self, *args, **kwargs):
         self.timestamp = timezone.now()  # take timestamp now before SQL query is run in super.__init__
         super(PaginatedAssertionsSinceSerializer, self).__init__(*args, **kwargs)
 
     def to_representation(self, data):
-        representation = super(PaginatedAssertionsSinceSerializer, self).to_representation(data)
+        # report each assertion once, in the order of its most recent change in the page
+        changes = OrderedDict()
+        for change in data:
+            changes.pop(change.badgeinstance_id, None)
+            changes[change.badgeinstance_id] = change
+        badgeinstances = BadgeInstance.objects.in_bulk(changes.keys())
+        assertions = prefetch_cached((badgeinstances[pk] for pk in changes.keys() if pk in badgeinstances),
+                                     'cached_badgeclass', 'cached_issuer', 'cached_evidence', 'cached_extensions')
+
+        representation = super(PaginatedAssertionsSinceSerializer, self).to_representation(assertions)
         representation['timestamp'] = self.timestamp.isoformat()
+        representation['deleted'] = [change.entity_id for pk, change in changes.items() if pk not in badgeinstances]
         return representation
 
 
@@ -575,29 +864,27 @@ class AssertionsChangedSince(BaseEntityView):
         if request.auth:
             return request.auth.application.user
 
+    def get_shared_badgeinstance_ids(self, request):
+        """
+        Returns a values() queryset of the pks of assertions in the backpack collections of the users who have
+        authorized the application. badgeuser isn't set on assertions added to a collection through v2, so the
+        collections are matched on their owner.
+        """
+        user_ids = request.auth.application.accesstoken_set.values('user_id')
+        return BackpackCollectionBadgeInstance.objects.filter(
+            collection__created_by_id__in=user_ids).values('badgeinstance_id')
+
     def get_queryset(self, request, since=None):
         user = self.get_user(request)
         issuer_ids = [i.id for i in user.cached_issuers()]
 
-        authorized_badgeusers = request.auth.application.accesstoken_set.all()
-        user_ids = [u.id for u in authorized_badgeusers]
-
-        # select badgeinstance.* where
-        #   (
-        #     badgeinstance.issuer_id in (:issuer_ids)
-        #     OR
-        #     backpackcollectionbadgeinstance.badgeuser_id in (:user_ids)
-        #   )
-        #   AND
-        #   badgeinstance.updated_at >= since
-
-        expr = Q(issuer_id__in=issuer_ids) | Q(backpackcollectionbadgeinstance__badgeuser_id__in=user_ids)
-
-        if since is not None:
-            expr &= Q(updated_at__gt=since)
-
-        qs = BadgeInstance.objects.filter(expr)
-        return qs
+        # changes to assertions made by the user's issuers, or shared in the collections of users who authorized the
+        # application. the change log is paged through by sequence, so each poll is a range scan of its
+        # (issuer_id, id) and (badgeinstance_id, id) indexes
+        return BadgeInstanceChange.objects.changes_for(
+            issuer_ids=issuer_ids,
+            badgeinstance_ids=self.get_shared_badgeinstance_ids(request),
+            since=since)
 
     def get(self, request, **kwargs):
         since = request.GET.get('since', None)
@@ -0,0 +1,180 @@
+# encoding: utf-8
+from __future__ import unicode_literals
+
+import json
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from xml.dom.minidom import parseString, Document
+from xml.parsers.expat import ExpatError
+
+import png
+from django.conf import settings
+from openbadges_bakery import bake, check_image_type
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_CHUNK_HEADER = b'openbadges\x00\x00\x00\x00\x00'
+SVG_PLACEHOLDER_TAG = 'badgr-bake-placeholder'
+
+# raised baking into a badgeclass image that can't be read or parsed
+BAKE_ERRORS = (IOError, png.Error, ExpatError)
+
+
+class BakeTemplate(object):
+    """
+    A badgeclass image that has been parsed once and split at the point where openbadges_bakery would
+    insert the assertion, so baking an assertion is a concatenation of prefix + assertion + suffix.
+    """
+    def __init__(self, image_type, prefix, suffix):
+        self.image_type = image_type
+        self.prefix = prefix
+        self.suffix = suffix
+
+    @classmethod
+    def from_file(cls, image_file):
+        image_type = check_image_type(image_file)
+        image_file.seek(0)
+        if image_type == 'PNG':
+            return cls._from_png(image_file)
+        elif image_type == 'SVG':
+            return cls._from_svg(image_file)
+
+    @classmethod
+    def _from_png(cls, image_file):
+        chunks = png.Reader(file=image_file).chunks()
+
+        prefix = BytesIO()
+        prefix.write(PNG_SIGNATURE)
+        png.write_chunk(prefix, *next(chunks))
+
+        suffix = BytesIO()
+        for chunk in chunks:
+            # drop any previously baked assertion, as png_bakery.baked_chunks does
+            if not chunk[1].startswith(b'openbadges\x00'):
+                png.write_chunk(suffix, *chunk)
+
+        return cls('PNG', prefix.getvalue(), suffix.getvalue())
+
+    @classmethod
+    def _from_svg(cls, image_file):
+        svg_doc = parseString(image_file.read())
+        svg_body = svg_doc.getElementsByTagName('svg')[0]
+        svg_body.setAttribute('xmlns:openbadges', "http://openbadges.org")
+        svg_body.insertBefore(svg_doc.createElement(SVG_PLACEHOLDER_TAG), svg_body.firstChild)
+
+        parts = svg_doc.toxml('utf-8').split('<{}/>'.format(SVG_PLACEHOLDER_TAG).encode('utf-8'))
+        if len(parts) != 2:
+            return None
+        return cls('SVG', parts[0], parts[1])
+
+    def bake(self, assertion_json_string, output_file):
+        if self.image_type == 'PNG':
+            if not isinstance(assertion_json_string, bytes):
+                assertion_json_string = assertion_json_string.encode('utf-8')
+            assertion = BytesIO()
+            png.write_chunk(assertion, 'iTXt', PNG_CHUNK_HEADER + assertion_json_string)
+            assertion = assertion.getvalue()
+        else:
+            assertion = _svg_assertion_node(assertion_json_string).toxml('utf-8')
+
+        output_file.write(self.prefix)
+        output_file.write(assertion)
+        output_file.write(self.suffix)
+        output_file.seek(0)
+        return output_file
+
+
+def _svg_assertion_node(assertion_string):
+    """
+    Build the <openbadges:assertion> element that openbadges_bakery's svg_bakery inserts: the assertion json in a
+    CDATA section with its verify url as an attribute, or a bare verify attribute when assertion_string is a url.
+    """
+    doc = Document()
+    node = doc.createElement('openbadges:assertion')
+    try:
+        assertion = json.loads(assertion_string)
+    except ValueError:
+        assertion = None
+
+    if assertion:
+        verify_url = assertion.get('verify', {}).get('url')
+        if verify_url:
+            node.setAttribute('verify', verify_url)
+        node.appendChild(doc.createCDATASection(assertion_string))
+    else:
+        node.setAttribute('verify', assertion_string)
+    return node
+
+
+class BakeTemplateCache(object):
+    """
+    In-process LRU of BakeTemplates keyed by badgeclass image version.
+    Only the newest version of each badgeclass is kept, so changing BadgeClass.image evicts the old template.
+    """
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._templates = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'BADGR_BAKE_TEMPLATE_CACHE_SIZE', 128)
+
+    @staticmethod
+    def version_key(badgeclass):
+        return (badgeclass.pk, badgeclass.image.name, badgeclass.entity_version)
+
+    def get(self, badgeclass):
+        key = self.version_key(badgeclass)
+        with self._lock:
+            template = self._templates.pop(key, None)
+            if template is not None:
+                self._templates[key] = template
+                return template
+
+        with badgeclass.image.storage.open(badgeclass.image.name, 'rb') as image_file:
+            template = BakeTemplate.from_file(image_file)
+        if template is None:
+            return None
+
+        with self._lock:
+            self._evict(badgeclass.pk)
+            self._templates[key] = template
+            self._versions[badgeclass.pk] = key
+            while len(self._templates) > self.max_size:
+                old_key, old_template = self._templates.popitem(last=False)
+                if self._versions.get(old_key[0]) == old_key:
+                    del self._versions[old_key[0]]
+        return template
+
+    def evict(self, badgeclass_pk):
+        with self._lock:
+            self._evict(badgeclass_pk)
+
+    def _evict(self, badgeclass_pk):
+        key = self._versions.pop(badgeclass_pk, None)
+        if key is not None:
+            self._templates.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+            self._versions.clear()
+
+
+bake_templates = BakeTemplateCache()
+
+
+def bake_badgeclass_image(badgeclass, assertion_json_string, output_file):
+    """
+    Bake assertion_json_string into badgeclass's image using a cached BakeTemplate,
+    falling back to openbadges_bakery for images that can't be templated.
+    """
+    template = bake_templates.get(badgeclass)
+    if template is not None:
+        return template.bake(assertion_json_string, output_file)
+    return bake(image_file=badgeclass.image.file, assertion_json_string=assertion_json_string, output_file=output_file)
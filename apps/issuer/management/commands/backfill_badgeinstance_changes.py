@@ -0,0 +1,39 @@
+# encoding: utf-8
+from __future__ import unicode_literals
+
+from django.core.management import BaseCommand
+
+from entity.api import iter_queryset_chunks
+from issuer.models import BadgeInstance, BadgeInstanceChange
+
+
+class Command(BaseCommand):
+    help = "Log a change for each assertion that isn't in the assertion change log yet, so the assertions/changed " \
+           "feed reports assertions issued before the log existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity', 1))
+        chunk_size = options['chunk_size']
+
+        logged = 0
+        queryset = BadgeInstance.objects.only(
+            'pk', 'entity_id', 'issuer_id', 'recipient_identifier', 'revoked', 'updated_at')
+        for chunk in iter_queryset_chunks(queryset, chunk_size):
+            existing = set(BadgeInstanceChange.objects.filter(
+                badgeinstance_id__in=[b.pk for b in chunk]).values_list('badgeinstance_id', flat=True))
+            changes = [BadgeInstanceChange(
+                badgeinstance_id=b.pk,
+                entity_id=b.entity_id,
+                issuer_id=b.issuer_id,
+                recipient_identifier=b.recipient_identifier,
+                action=BadgeInstanceChange.ACTION_REVOKED if b.revoked else BadgeInstanceChange.ACTION_UPDATED,
+                created_at=b.updated_at
+            ) for b in chunk if b.pk not in existing]
+            BadgeInstanceChange.objects.bulk_create(changes)
+            logged += len(changes)
+
+        if self.verbosity > 0:
+            self.stdout.write("Logged {} assertions".format(logged))
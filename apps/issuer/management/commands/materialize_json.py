@@ -0,0 +1,55 @@
+# encoding: utf-8
+from __future__ import unicode_literals
+
+import more_itertools
+from django.core.management import BaseCommand
+
+from issuer.models import Issuer, BadgeClass, BadgeInstance
+from mainsite.publish import publish_batch
+
+
+class Command(BaseCommand):
+    help = "Store get_json() in the materialized_json_* columns of issuers, badgeclasses and assertions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', default=False,
+                            help="Only report the materialized json that is missing or doesn't match get_json()")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity', 1))
+        self.verify = options['verify']
+        self.chunk_size = options['chunk_size']
+        self.materialize_jsons(Issuer)
+        self.materialize_jsons(BadgeClass)
+        self.materialize_jsons(BadgeInstance)
+
+    def materialize_jsons(self, model_cls):
+        missing = 0
+        mismatch = 0
+        correct = 0
+        for chunk in more_itertools.chunked(model_cls.objects.order_by('pk').iterator(), self.chunk_size):
+            with publish_batch():
+                for obj in chunk:
+                    fields = obj.build_materialized_json()
+                    stale = [k for k, v in fields.items() if getattr(obj, k) != v]
+                    if not stale:
+                        correct += 1
+                        continue
+
+                    if any(getattr(obj, k) is None for k in stale):
+                        missing += 1
+                    else:
+                        mismatch += 1
+                        if self.verbosity > 1:
+                            self.stdout.write("  Materialized json doesn't match! pk={} {}\n".format(obj.pk, ', '.join(sorted(stale))))
+
+                    if not self.verify:
+                        obj.materialize_json(force=True)
+                        # replace the cached copies, which don't have the new json
+                        obj.publish()
+
+        if self.verbosity > 0:
+            self.stdout.write("Found {} {}s. {} correct. {} missing. {} mismatch{}".format(
+                missing+mismatch+correct, model_cls.__name__, correct, missing, mismatch,
+                '' if self.verify else ". Materialized {}".format(missing+mismatch)))
@@ -2,14 +2,28 @@
 from __future__ import unicode_literals
 
 import json
+import logging
+from itertools import chain
 
+from django.apps import apps
 from django.conf import settings
 import dateutil.parser
+from cachemodel import CACHE_FOREVER_TIMEOUT
+from cachemodel.utils import generate_cache_key
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.files.storage import DefaultStorage
 from django.db import models, transaction
+from django.utils import timezone
 
+from mainsite.publish import publish_batch
 from mainsite.utils import fetch_remote_file_to_storage, list_of
-from pathway.tasks import award_badges_for_pathway_completion
+from pathway.tasks import award_badges_for_pathway_completion, schedule_badgeclass_pathway_completions
+
+logger = logging.getLogger(__name__)
+
+BULK_ISSUE_ERROR = "The assertion could not be issued"
+BULK_ISSUE_BAKE_ERROR = "The badgeclass image could not be baked"
 
 
 class IssuerManager(models.Manager):
@@ -180,7 +194,8 @@ class BadgeInstanceManager(models.Manager):
             **kwargs
         )
 
-        with transaction.atomic():
+        # evidence and extensions each republish the new assertion and its badgeclass, coalesce them
+        with transaction.atomic(), publish_batch():
             new_instance.save()
 
             if evidence is not None:
@@ -204,7 +219,10 @@ class BadgeInstanceManager(models.Manager):
             award_badges_for_pathway_completion.delay(badgeinstance_pk=new_instance.pk)
 
         if notify:
-            new_instance.notify_earner(badgr_app=badgr_app)
+            from issuer.tasks import notify_earners_of_badgeinstances
+            badgr_app_pk = badgr_app.pk if badgr_app is not None else None
+            transaction.on_commit(lambda: notify_earners_of_badgeinstances.delay(
+                badgeinstance_pks=[new_instance.pk], badgr_app_pk=badgr_app_pk))
 
         if badgeclass.recipient_count() == 1 and (
                 not getattr(settings, 'BADGERANK_NOTIFY_ON_BADGECLASS_CREATE', True) and
@@ -214,3 +232,339 @@ class BadgeInstanceManager(models.Manager):
 
         return new_instance
 
+    def bulk_issue(self,
+        badgeclass,
+        assertions,
+        created_by=None,
+        check_completions=True,
+        badgr_app=None,
+        batch_size=None
+    ):
+        """
+        Award a badgeclass to many recipients, inserting assertions, evidence and extensions in batches.
+
+        Each batch is committed in its own transaction, and the badgeclass/issuer caches are published once
+        after the last batch rather than once per assertion. Deferred image baking, pathway completion checks
+        and earner notifications are dispatched to celery after all batches have been committed.
+
+        :type badgeclass: BadgeClass
+        :param assertions: list of dicts of kwargs as accepted by create(), eg. recipient_identifier, evidence,
+            extensions, notify, allow_uppercase, narrative, issued_on, expires_at, ...
+        :type created_by: BadgeUser
+        :type check_completions: bool
+        :param batch_size: number of assertions to insert per batch, defaults to settings.BADGR_BULK_ISSUE_BATCH_SIZE
+        :return: list of (BadgeInstance, None) or (None, error message) tuples in the same order as assertions
+        """
+        if batch_size is None:
+            batch_size = getattr(settings, 'BADGR_BULK_ISSUE_BATCH_SIZE', 100)
+
+        results = []
+        with publish_batch():
+            for offset in range(0, len(assertions), batch_size):
+                results.extend(self._bulk_issue_batch(badgeclass, assertions[offset:offset+batch_size], created_by=created_by))
+
+        issued = [(new_instance, assertions[idx].get('notify', False))
+                  for idx, (new_instance, error) in enumerate(results) if new_instance is not None]
+        if not issued:
+            return results
+
+        unbaked_pks = [new_instance.pk for new_instance, notify in issued if not new_instance.image]
+        if unbaked_pks:
+            from issuer.tasks import bake_badgeinstance_image
+
+            def _bake_unbaked():
+                for pk in unbaked_pks:
+                    bake_badgeinstance_image.delay(badgeinstance_pk=pk)
+            transaction.on_commit(_bake_unbaked)
+
+        if check_completions:
+            # one evaluation per recipient and pathway, however many of their assertions were in the batch
+            schedule_badgeclass_pathway_completions(
+                badgeclass, [new_instance.recipient_identifier for new_instance, notify in issued])
+
+        notify_pks = [new_instance.pk for new_instance, notify in issued if notify]
+        if notify_pks:
+            from issuer.tasks import notify_earners_of_badgeinstances
+            badgr_app_pk = badgr_app.pk if badgr_app is not None else None
+            transaction.on_commit(lambda: notify_earners_of_badgeinstances.delay(
+                badgeinstance_pks=notify_pks, badgr_app_pk=badgr_app_pk))
+
+        if badgeclass.recipient_count() == len(issued) and (
+                not getattr(settings, 'BADGERANK_NOTIFY_ON_BADGECLASS_CREATE', True) and
+                getattr(settings, 'BADGERANK_NOTIFY_ON_FIRST_ASSERTION', True)):
+            from issuer.tasks import notify_badgerank_of_badgeclass
+            notify_badgerank_of_badgeclass.delay(badgeclass_pk=badgeclass.pk)
+
+        return results
+
+    def _bulk_issue_batch(self, badgeclass, assertions, created_by=None):
+        from issuer.baking import BAKE_ERRORS
+        from issuer.models import BadgeInstanceEvidence, BadgeInstanceExtension
+
+        issuer = badgeclass.cached_issuer
+        results = [None] * len(assertions)
+        pending = []
+
+        for idx, kwargs in enumerate(assertions):
+            kwargs = dict(kwargs)
+            evidence = kwargs.pop('evidence', None)
+            extensions = kwargs.pop('extensions', None)
+            allow_uppercase = kwargs.pop('allow_uppercase', False)
+            kwargs.pop('notify', None)
+            recipient_identifier = kwargs.pop('recipient_identifier')
+
+            new_instance = self.model(
+                recipient_identifier=recipient_identifier if allow_uppercase else recipient_identifier.lower(),
+                badgeclass=badgeclass,
+                issuer=issuer,
+                created_by=created_by,
+                **kwargs
+            )
+            try:
+                new_instance.prepare_new()
+            except ValidationError as e:
+                results[idx] = (None, ' '.join(e.messages))
+                continue
+            except BAKE_ERRORS:
+                logger.warning("Error baking bulk issued assertion of badgeclass %s", badgeclass.pk, exc_info=True)
+                results[idx] = (None, BULK_ISSUE_BAKE_ERROR)
+                continue
+            except Exception:
+                logger.exception("Error preparing bulk issued assertion of badgeclass %s", badgeclass.pk)
+                results[idx] = (None, BULK_ISSUE_ERROR)
+                continue
+            new_instance.entity_version += 1
+            if new_instance.revoked is False:
+                new_instance.revocation_reason = None
+
+            new_evidence = []
+            for evidence_obj in (evidence or []):
+                new_evidence.append(BadgeInstanceEvidence(
+                    evidence_url=evidence_obj.get('evidence_url'),
+                    narrative=evidence_obj.get('narrative') or None))
+            new_extensions = [BadgeInstanceExtension(name=name, original_json=json.dumps(ext))
+                              for name, ext in (extensions or {}).items()]
+            pending.append((idx, new_instance, new_evidence, new_extensions))
+
+        if not pending:
+            return results
+
+        try:
+            self._insert_pending(pending)
+        except Exception:
+            if len(pending) == 1:
+                logger.exception("Error inserting bulk issued assertion of badgeclass %s", badgeclass.pk)
+                failed, pending = pending, []
+            else:
+                # retry one at a time, so only the rows that can't be inserted are reported
+                logger.warning("Error inserting bulk issued assertions of badgeclass %s, retrying one at a time",
+                               badgeclass.pk, exc_info=True)
+                failed, inserted = [], []
+                for item in pending:
+                    try:
+                        self._insert_pending([item])
+                    except Exception:
+                        logger.exception("Error inserting bulk issued assertion of badgeclass %s", badgeclass.pk)
+                        failed.append(item)
+                    else:
+                        inserted.append(item)
+                pending = inserted
+            for idx, new_instance, new_evidence, new_extensions in failed:
+                new_instance.image.delete(save=False)
+                results[idx] = (None, BULK_ISSUE_ERROR)
+            if not pending:
+                return results
+
+        self._publish_assertions([item[1] for item in pending])
+        badgeclass.publish()
+
+        for idx, new_instance, new_evidence, new_extensions in pending:
+            results[idx] = (new_instance, None)
+        return results
+
+    def _insert_pending(self, pending):
+        """
+        Insert the (idx, BadgeInstance, evidence, extensions) tuples of pending in one transaction.
+        """
+        from issuer.models import BadgeInstanceChange, BadgeInstanceEvidence, BadgeInstanceExtension
+
+        try:
+            with transaction.atomic():
+                self.bulk_create([item[1] for item in pending])
+
+                # bulk_create doesn't populate primary keys on all backends, look them up by entity_id
+                pks = dict(self.filter(
+                    entity_id__in=[item[1].entity_id for item in pending]
+                ).values_list('entity_id', 'pk'))
+                for idx, new_instance, new_evidence, new_extensions in pending:
+                    new_instance.pk = pks[new_instance.entity_id]
+                    for item in chain(new_evidence, new_extensions):
+                        item.badgeinstance = new_instance
+
+                BadgeInstanceEvidence.objects.bulk_create(list(chain.from_iterable(e for i, n, e, x in pending)))
+                BadgeInstanceExtension.objects.bulk_create(list(chain.from_iterable(x for i, n, e, x in pending)))
+                BadgeInstanceChange.objects.record([item[1] for item in pending],
+                                                   BadgeInstanceChange.ACTION_CREATED)
+        except Exception:
+            # the inserts were rolled back, so they can be retried
+            for idx, new_instance, new_evidence, new_extensions in pending:
+                new_instance.pk = None
+            raise
+
+    def bulk_revoke(self, revocations):
+        """
+        Revoke many assertions with one UPDATE per distinct revocation reason.
+
+        Caches are refreshed once per assertion, badgeclass, recipient and collection instead of running the
+        full publish cascade for every assertion, and the assertion images are deleted from storage by celery.
+
+        :param revocations: list of (BadgeInstance, revocation_reason) tuples
+        :return: list of pks of the assertions that were revoked
+        """
+        from issuer.models import BadgeInstanceChange
+
+        pks_by_reason = {}
+        badgeinstances_by_pk = {}
+        stale_keys = []
+        image_names = []
+        for badgeinstance, revocation_reason in revocations:
+            if badgeinstance.revoked:
+                continue
+            pks_by_reason.setdefault(revocation_reason, []).append(badgeinstance.pk)
+            badgeinstances_by_pk[badgeinstance.pk] = badgeinstance
+            stale_keys.append(badgeinstance.publish_key('entity_id', 'revoked'))
+            if badgeinstance.image:
+                image_names.append(badgeinstance.image.name)
+
+        revoked_pks = []
+        with transaction.atomic():
+            for revocation_reason, pks in pks_by_reason.items():
+                # revoked=False guards against assertions revoked since they were loaded
+                queryset = self.select_for_update().filter(pk__in=pks, revoked=False)
+                pks = list(queryset.values_list('pk', flat=True))
+                self.filter(pk__in=pks).update(
+                    revoked=True,
+                    revocation_reason=revocation_reason,
+                    image='',
+                    entity_version=models.F('entity_version') + 1,
+                    updated_at=timezone.now()
+                )
+                revoked_pks.extend(pks)
+            BadgeInstanceChange.objects.record([badgeinstances_by_pk[pk] for pk in revoked_pks],
+                                               BadgeInstanceChange.ACTION_REVOKED)
+
+        if not revoked_pks:
+            return revoked_pks
+
+        if image_names:
+            from issuer.tasks import delete_stored_files
+            delete_stored_files.delay(image_names)
+
+        revoked = list(self.filter(pk__in=revoked_pks))
+        cache.delete_many(stale_keys)
+
+        from issuer.models import BadgeClass
+        from backpack.models import BackpackCollection
+        with publish_batch():
+            self._publish_assertions(revoked)
+            badgeclasses = list(BadgeClass.objects.filter(pk__in=set(b.badgeclass_id for b in revoked)))
+            for badgeclass in badgeclasses:
+                badgeclass.publish()
+            for collection in BackpackCollection.objects.filter(assertions__in=revoked_pks).distinct():
+                collection.publish()
+
+        for badgeclass in badgeclasses:
+            schedule_badgeclass_pathway_completions(
+                badgeclass, [b.recipient_identifier for b in revoked if b.badgeclass_id == badgeclass.pk])
+
+        # remove BadgeObjectiveAwards from badgebook if needed
+        if apps.is_installed('badgebook'):
+            try:
+                from badgebook.models import BadgeObjectiveAward
+                for award in BadgeObjectiveAward.objects.filter(badge_instance_id__in=revoked_pks):
+                    award.delete()
+            except ImportError:
+                pass
+
+        return revoked_pks
+
+    def _publish_assertions(self, instances):
+        """
+        Cache assertions that were written in bulk without running the per-instance publish cascade.
+        Evidence and extensions are fetched with one query each to prime their cached_methods, and each
+        distinct recipient is published once.
+        """
+        from issuer.models import BadgeInstanceEvidence, BadgeInstanceExtension
+
+        instances_by_pk = {instance.pk: instance for instance in instances}
+        related = {
+            'cached_evidence': BadgeInstanceEvidence.objects.filter(badgeinstance_id__in=instances_by_pk.keys()),
+            'cached_extensions': BadgeInstanceExtension.objects.filter(badgeinstance_id__in=instances_by_pk.keys()),
+        }
+
+        class_name = self.model.__name__
+        entries = {}
+        for method_name, queryset in related.items():
+            items_by_pk = {pk: [] for pk in instances_by_pk.keys()}
+            for item in queryset.order_by('pk'):
+                items_by_pk[item.badgeinstance_id].append(item)
+            for pk, items in items_by_pk.items():
+                entries[generate_cache_key([class_name, method_name, pk])] = items
+        cache.set_many(entries, CACHE_FOREVER_TIMEOUT)
+
+        entries = {}
+        recipients = {}
+        for instance in instances:
+            # reads the evidence and extensions cached above
+            instance.materialize_json()
+            for fields in (('pk',), ('entity_id',), ('entity_id', 'revoked')):
+                entries[instance.publish_key(*fields)] = instance
+            recipients.setdefault(instance.recipient_identifier, instance)
+        cache.set_many(entries, CACHE_FOREVER_TIMEOUT)
+
+        # publish each distinct recipient once
+        for instance in recipients.values():
+            recipient_profile = instance.cached_recipient_profile
+            if recipient_profile:
+                recipient_profile.publish()
+            recipient_user = instance.recipient_user
+            if recipient_user:
+                recipient_user.publish()
+
+
+class BadgeInstanceChangeManager(models.Manager):
+    """
+    Appends to and reads from the assertion change log.
+    """
+
+    def record(self, badgeinstances, action):
+        """
+        Append a change of action to the log for each of badgeinstances, in one INSERT.
+        """
+        self.bulk_create([self.model(
+            badgeinstance_id=badgeinstance.pk,
+            entity_id=badgeinstance.entity_id,
+            issuer_id=badgeinstance.issuer_id,
+            recipient_identifier=badgeinstance.recipient_identifier,
+            action=action
+        ) for badgeinstance in badgeinstances])
+
+    def first_sequence_since(self, since):
+        """
+        Returns the sequence of the first change logged after the datetime since, or None if there is none yet.
+        """
+        return self.filter(created_at__gt=since).order_by('pk').values_list('pk', flat=True).first()
+
+    def changes_for(self, issuer_ids=(), badgeinstance_ids=(), since=None):
+        """
+        Returns a queryset of the changes to assertions issued by issuer_ids or to the assertions badgeinstance_ids
+        (a list or a values() queryset of pks), optionally only those logged after the datetime since. Paginate it by pk.
+        """
+        queryset = self.filter(
+            models.Q(issuer_id__in=list(issuer_ids)) | models.Q(badgeinstance_id__in=badgeinstance_ids))
+        if since is not None:
+            sequence = self.first_sequence_since(since)
+            if sequence is None:
+                return queryset.none()
+            queryset = queryset.filter(pk__gte=sequence)
+        return queryset
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 05:43
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issuer', '0043_badgeinstance_index_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeInstanceChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('badgeinstance_id', models.IntegerField()),
+                ('entity_id', models.CharField(max_length=254)),
+                ('issuer_id', models.IntegerField()),
+                ('recipient_identifier', models.CharField(max_length=1024)),
+                ('action', models.CharField(choices=[('created', 'created'), ('updated', 'updated'), ('revoked', 'revoked'), ('deleted', 'deleted')], max_length=16)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='badgeinstancechange',
+            index_together=set([('issuer_id', 'id'), ('badgeinstance_id', 'id')]),
+        ),
+    ]
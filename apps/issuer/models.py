@@ -5,7 +5,6 @@ import datetime
 import re
 import uuid
 from collections import OrderedDict
-from itertools import chain
 
 import cachemodel
 import os
@@ -22,17 +21,21 @@ from django.db.models import ProtectedError
 from json import loads as json_loads
 from json import dumps as json_dumps
 from jsonfield import JSONField
-from openbadges_bakery import bake
 from django.utils import timezone
 
 from entity.models import BaseVersionedEntity
-from issuer.managers import BadgeInstanceManager, IssuerManager, BadgeClassManager, BadgeInstanceEvidenceManager
+from issuer.baking import bake_badgeclass_image
+from issuer.managers import BadgeInstanceManager, IssuerManager, BadgeClassManager, BadgeInstanceEvidenceManager, \
+    BadgeInstanceChangeManager
 from mainsite.managers import SlugOrJsonIdCacheModelManager
 from mainsite.mixins import ResizeUploadedImage, ScrubUploadedSvgImage
 from mainsite.models import (BadgrApp, EmailBlacklist)
+from mainsite.prefetch import PrefetchCachedMixin, get_prefetched, prefetched
+from mainsite.publish import after_publish, coalesce_publish, publish_batch, refresh_pending
+from mainsite.response_cache import invalidate_rendered_responses
 from mainsite.utils import OriginSetting, generate_entity_uri
 from .utils import generate_sha256_hashstring, CURRENT_OBI_VERSION, get_obi_context, add_obi_version_ifneeded, \
-    UNVERSIONED_BAKED_VERSION
+    UNVERSIONED_BAKED_VERSION, OBI_VERSION_CONTEXT_IRIS
 
 AUTH_USER_MODEL = getattr(settings, 'AUTH_USER_MODEL', 'auth.User')
 
@@ -75,12 +78,57 @@ class BaseOpenBadgeObjectModel(OriginalJsonMixin, cachemodel.CacheModel):
     source = models.CharField(max_length=254, default='local')
     source_url = models.CharField(max_length=254, blank=True, null=True, default=None)
 
+    # get_json() for each OBI version, stored when it is published with settings.BADGR_MATERIALIZE_JSON
+    materialized_json_1_1 = models.TextField(blank=True, null=True, default=None)
+    materialized_json_2_0 = models.TextField(blank=True, null=True, default=None)
+
     class Meta:
         abstract = True
 
+    def publish(self):
+        super(BaseOpenBadgeObjectModel, self).publish()
+        if self.materialize_json():
+            # the copy cached by pk was published before the json was materialized
+            self.publish_by('pk')
+
+    def get_materialized_json(self, obi_version):
+        """
+        The json get_json(obi_version) returned when this object was last published, or None if it isn't materialized.
+        """
+        if getattr(settings, 'BADGR_MATERIALIZE_JSON', False):
+            materialized = getattr(self, 'materialized_json_{}'.format(obi_version), None)
+            if materialized:
+                return json_loads(materialized, object_pairs_hook=OrderedDict)
+
+    def build_materialized_json(self):
+        """
+        Returns a dict of materialized_json_* field name -> the json get_json() renders for that OBI version.
+        """
+        fields = {}
+        for obi_version in OBI_VERSION_CONTEXT_IRIS.keys():
+            field_name = 'materialized_json_{}'.format(obi_version)
+            if hasattr(self, field_name):
+                fields[field_name] = json_dumps(self.get_json(obi_version=obi_version, use_materialized=False))
+        return fields
+
+    def materialize_json(self, force=False):
+        """
+        Store get_json() for each OBI version, if settings.BADGR_MATERIALIZE_JSON or force.
+        Only the changed materialized_json_* columns are updated, returns True if there were any.
+        """
+        if self.pk is None or not (force or getattr(settings, 'BADGR_MATERIALIZE_JSON', False)):
+            return False
+        changed = {k: v for k, v in self.build_materialized_json().items() if getattr(self, k) != v}
+        if changed:
+            self.__class__.objects.filter(pk=self.pk).update(**changed)
+            for field_name, value in changed.items():
+                setattr(self, field_name, value)
+        return bool(changed)
+
     def get_extensions_manager(self):
         raise NotImplementedError()
 
+    @prefetched
     @cachemodel.cached_method(auto_publish=True)
     def cached_extensions(self):
         return self.get_extensions_manager().all()
@@ -95,7 +143,7 @@ class BaseOpenBadgeObjectModel(OriginalJsonMixin, cachemodel.CacheModel):
             value = {}
         touched_idx = []
 
-        with transaction.atomic():
+        with transaction.atomic(), publish_batch():
             if not self.pk and value:
                 self.save()
 
@@ -153,8 +201,10 @@ class Issuer(ResizeUploadedImage,
     objects = IssuerManager()
     cached = SlugOrJsonIdCacheModelManager(slug_kwarg_name='entity_id', slug_field_name='entity_id')
 
+    @coalesce_publish
     def publish(self, *args, **kwargs):
         super(Issuer, self).publish(*args, **kwargs)
+        invalidate_rendered_responses(self)
         for member in self.cached_issuerstaff():
             member.cached_user.publish()
 
@@ -230,7 +280,7 @@ class Issuer(ResizeUploadedImage,
         existing_staff_idx = {s.cached_user: s for s in self.staff_items}
         new_staff_idx = {s['cached_user']: s for s in value}
 
-        with transaction.atomic():
+        with transaction.atomic(), publish_batch():
             # add missing staff records
             for staff_data in value:
                 if staff_data['cached_user'] not in existing_staff_idx:
@@ -263,7 +313,22 @@ class Issuer(ResizeUploadedImage,
         return self.badgeclasses.all()
 
     def cached_badgeinstances(self):
-        return chain(*[bc.cached_badgeinstances() for bc in self.cached_badgeclasses()])
+        return self.get_badgeinstances()
+
+    def get_badgeinstances(self, revoked=None, recipient_identifier=None):
+        """
+        A queryset of the assertions of every badgeclass of this issuer, filtered on issuer_id in one query.
+        Not cached, as an issuer may have far too many assertions to publish on every issue.
+
+        :param revoked: only revoked assertions if True, only unrevoked if False
+        :param recipient_identifier: only assertions awarded to this recipient
+        """
+        queryset = BadgeInstance.objects.filter(issuer=self)
+        if revoked is not None:
+            queryset = queryset.filter(revoked=revoked)
+        if recipient_identifier is not None:
+            queryset = queryset.filter(recipient_identifier=recipient_identifier)
+        return queryset
 
     @cachemodel.cached_method(auto_publish=True)
     def cached_pathways(self):
@@ -281,8 +346,12 @@ class Issuer(ResizeUploadedImage,
     def image_preview(self):
         return self.image
 
-    def get_json(self, obi_version=CURRENT_OBI_VERSION, include_extra=True, use_canonical_id=False):
+    def get_json(self, obi_version=CURRENT_OBI_VERSION, include_extra=True, use_canonical_id=False, use_materialized=True):
         obi_version, context_iri = get_obi_context(obi_version)
+        if use_materialized and include_extra and not use_canonical_id:
+            materialized = self.get_materialized_json(obi_version)
+            if materialized is not None:
+                return materialized
 
         json = OrderedDict({'@context': context_iri})
         json.update(OrderedDict(
@@ -347,6 +416,7 @@ class IssuerStaff(cachemodel.CacheModel):
     class Meta:
         unique_together = ('issuer', 'user')
 
+    @coalesce_publish
     def publish(self):
         super(IssuerStaff, self).publish()
         self.issuer.publish()
@@ -397,8 +467,10 @@ class BadgeClass(ResizeUploadedImage,
     class Meta:
         verbose_name_plural = "Badge classes"
 
+    @coalesce_publish
     def publish(self):
         super(BadgeClass, self).publish()
+        invalidate_rendered_responses(self)
         self.issuer.publish()
 
     def delete(self, *args, **kwargs):
@@ -418,6 +490,30 @@ class BadgeClass(ResizeUploadedImage,
     def get_absolute_url(self):
         return reverse('badgeclass_json', kwargs={'entity_id': self.entity_id})
 
+    def get_earner_notification_context(self, badgr_app):
+        """
+        The part of an earner notification's email context that is the same for every assertion of this badgeclass.
+        """
+        issuer = self.issuer
+        if issuer.image:
+            issuer_image_url = issuer.public_url + '/image'
+        else:
+            issuer_image_url = None
+
+        email_context = {
+            'badge_name': self.name,
+            'badge_description': self.description,
+            'issuer_name': re.sub(r'[^\w\s]+', '', issuer.name, 0, re.I),
+            'issuer_url': issuer.url,
+            'issuer_detail': issuer.public_url,
+            'issuer_image_url': issuer_image_url,
+            'site_name': badgr_app.name,
+            'site_url': badgr_app.signup_redirect,
+        }
+        if badgr_app.cors == 'badgr.io':
+            email_context['promote_mobile'] = True
+        return email_context
+
     @property
     def public_url(self):
         return OriginSetting.HTTP+self.get_absolute_url()
@@ -487,7 +583,7 @@ class BadgeClass(ResizeUploadedImage,
         existing_idx = {_obj_identity(a): a for a in self.alignment_items}
         new_idx = {_identity(a): a for a in value}
 
-        with transaction.atomic():
+        with transaction.atomic(), publish_batch():
             # HACKY, but force a save to self otherwise we can't create related objects here
             if not self.pk:
                 self.save()
@@ -517,7 +613,7 @@ class BadgeClass(ResizeUploadedImage,
         existing_idx = [t.name for t in self.tag_items]
         new_idx = value
 
-        with transaction.atomic():
+        with transaction.atomic(), publish_batch():
             if not self.pk:
                 self.save()
 
@@ -550,8 +646,13 @@ class BadgeClass(ResizeUploadedImage,
             **kwargs
         )
 
-    def get_json(self, obi_version=CURRENT_OBI_VERSION, include_extra=True, use_canonical_id=False):
+    def get_json(self, obi_version=CURRENT_OBI_VERSION, include_extra=True, use_canonical_id=False, use_materialized=True):
         obi_version, context_iri = get_obi_context(obi_version)
+        if use_materialized and include_extra and not use_canonical_id:
+            materialized = self.get_materialized_json(obi_version)
+            if materialized is not None:
+                return materialized
+
         json = OrderedDict({'@context': context_iri})
         json.update(OrderedDict(
             type='BadgeClass',
@@ -614,7 +715,8 @@ class BadgeClass(ResizeUploadedImage,
         return self.cached_issuer.cached_badgrapp
 
 
-class BadgeInstance(BaseAuditedModel,
+class BadgeInstance(PrefetchCachedMixin,
+                    BaseAuditedModel,
                     BaseVersionedEntity,
                     BaseOpenBadgeObjectModel):
     entity_class_name = 'Assertion'
@@ -624,6 +726,14 @@ class BadgeInstance(BaseAuditedModel,
     badgeclass = models.ForeignKey(BadgeClass, blank=False, null=False, on_delete=models.CASCADE, related_name='badgeinstances')
     issuer = models.ForeignKey(Issuer, blank=False, null=False)
 
+    # loaded in bulk by mainsite.prefetch.prefetch_cached()
+    cached_relations = {
+        'cached_badgeclass': 'badgeclass',
+        'cached_issuer': 'issuer',
+        'cached_evidence': 'badgeinstanceevidence',
+        'cached_extensions': 'badgeinstanceextension',
+    }
+
     RECIPIENT_TYPE_EMAIL = 'email'
     RECIPIENT_TYPE_ID = 'openBadgeId'
     RECIPIENT_TYPE_TELEPHONE = 'telephone'
@@ -668,6 +778,14 @@ class BadgeInstance(BaseAuditedModel,
     objects = BadgeInstanceManager()
     cached = SlugOrJsonIdCacheModelManager(slug_kwarg_name='entity_id', slug_field_name='entity_id')
 
+    class Meta:
+        # recipient_identifier is too long to be part of a composite key on mysql (3072 bytes in utf8), lookups by
+        # recipient use its own index
+        index_together = (
+            ('issuer', 'revoked'),
+            ('badgeclass', 'revoked'),
+        )
+
     @property
     def extended_json(self):
         extended_json = self.json
@@ -682,6 +800,10 @@ class BadgeInstance(BaseAuditedModel,
         else:
             return getattr(settings, 'HTTP_ORIGIN') + default_storage.url(self.image.name)
 
+    def get_etag_parts(self):
+        # images baked by save_baked_image() don't bump entity_version
+        return super(BadgeInstance, self).get_etag_parts() + [self.image.name or '']
+
     @property
     def share_url(self):
         return self.public_url
@@ -689,11 +811,11 @@ class BadgeInstance(BaseAuditedModel,
 
     @property
     def cached_issuer(self):
-        return Issuer.cached.get(pk=self.issuer_id)
+        return get_prefetched(self, 'cached_issuer') or Issuer.cached.get(pk=self.issuer_id)
 
     @property
     def cached_badgeclass(self):
-        return BadgeClass.cached.get(pk=self.badgeclass_id)
+        return get_prefetched(self, 'cached_badgeclass') or BadgeClass.cached.get(pk=self.badgeclass_id)
 
     def get_absolute_url(self):
         return reverse('badgeinstance_json', kwargs={'entity_id': self.entity_id})
@@ -721,40 +843,91 @@ class BadgeInstance(BaseAuditedModel,
         return self.issuer.owners
 
     def save(self, *args, **kwargs):
-        if self.pk is None:
-            self.salt = uuid.uuid4().hex
-            self.created_at = datetime.datetime.now()
+        change_action = kwargs.pop('change_action', None)
+        is_new = self.pk is None
+        if is_new:
+            self.prepare_new()
 
-            # do this now instead of in AbstractVersionedEntity.save() so we can use it for image name
-            if self.entity_id is None:
-                self.entity_id = generate_entity_uri()
+        if self.revoked is False:
+            self.revocation_reason = None
 
-            if not self.image:
-                badgeclass_name, ext = os.path.splitext(self.badgeclass.image.file.name)
-                new_image = StringIO.StringIO()
-                bake(image_file=self.cached_badgeclass.image.file,
-                     assertion_json_string=json_dumps(self.get_json(obi_version=UNVERSIONED_BAKED_VERSION), indent=2),
-                     output_file=new_image)
-                self.image.save(name='assertion-{id}{ext}'.format(id=self.entity_id, ext=ext),
-                                content=ContentFile(new_image.read()),
-                                save=False)
+        with transaction.atomic():
+            super(BadgeInstance, self).save(*args, **kwargs)
+            if change_action is None:
+                change_action = BadgeInstanceChange.ACTION_CREATED if is_new else BadgeInstanceChange.ACTION_UPDATED
+            BadgeInstanceChange.objects.record([self], change_action)
 
-            try:
-                from badgeuser.models import CachedEmailAddress
-                existing_email = CachedEmailAddress.cached.get(email=self.recipient_identifier)
-                if self.recipient_identifier != existing_email.email and \
-                        self.recipient_identifier not in [e.email for e in existing_email.cached_variants()]:
-                    existing_email.add_variant(self.recipient_identifier)
-            except CachedEmailAddress.DoesNotExist:
-                pass
+        if is_new and not self.image:
+            from issuer.tasks import bake_badgeinstance_image
+            transaction.on_commit(lambda: bake_badgeinstance_image.delay(badgeinstance_pk=self.pk))
 
-        if self.revoked is False:
-            self.revocation_reason = None
+    def bake_image(self):
+        """
+        Bake this assertion's json into its badgeclass image and store it in self.image (without saving the model)
+        """
+        badgeclass_name, ext = os.path.splitext(self.cached_badgeclass.image.name)
+        new_image = StringIO.StringIO()
+        bake_badgeclass_image(self.cached_badgeclass,
+                              assertion_json_string=json_dumps(self.get_json(obi_version=UNVERSIONED_BAKED_VERSION), indent=2),
+                              output_file=new_image)
+        self.image.save(name='assertion-{id}{ext}'.format(id=self.entity_id, ext=ext),
+                        content=ContentFile(new_image.read()),
+                        save=False)
+
+    def save_baked_image(self):
+        """
+        Bake the image of an assertion that was saved without one.
+        Only the image and updated_at columns are updated, so entity_version is unchanged and related objects are not
+        republished. updated_at is bumped so the Last-Modified of conditional GETs covers the new image.
+        """
+        if self.image:
+            return
+        self.bake_image()
+        updated_at = timezone.now()
+        updated = BadgeInstance.objects.filter(pk=self.pk, image='').update(image=self.image.name, updated_at=updated_at)
+        if updated:
+            self.updated_at = updated_at
+        else:
+            # another worker got here first, use their image
+            self.image.delete(save=False)
+            self.image, self.updated_at = BadgeInstance.objects.filter(pk=self.pk).values_list(
+                'image', 'updated_at').first() or (None, self.updated_at)
+        self.publish_by('pk')
+        self.publish_by('entity_id')
+        self.publish_by('entity_id', 'revoked')
+        refresh_pending(self)
+
+    def prepare_new(self):
+        """
+        Populate salt, entity_id and baked image for an assertion that has not been inserted yet.
+        Called from save(), and by BadgeInstanceManager.bulk_issue() which inserts without save().
 
-        super(BadgeInstance, self).save(*args, **kwargs)
+        With settings.BADGR_DEFER_ASSERTION_BAKING the image is left empty, to be baked by
+        issuer.tasks.bake_badgeinstance_image once the assertion has been committed.
+        """
+        self.salt = uuid.uuid4().hex
+        self.created_at = datetime.datetime.now()
+
+        # do this now instead of in AbstractVersionedEntity.save() so we can use it for image name
+        if self.entity_id is None:
+            self.entity_id = generate_entity_uri()
+
+        if not self.image and not getattr(settings, 'BADGR_DEFER_ASSERTION_BAKING', False):
+            self.bake_image()
+
+        try:
+            from badgeuser.models import CachedEmailAddress
+            existing_email = CachedEmailAddress.cached.get(email=self.recipient_identifier)
+            if self.recipient_identifier != existing_email.email and \
+                    self.recipient_identifier not in [e.email for e in existing_email.cached_variants()]:
+                existing_email.add_variant(self.recipient_identifier)
+        except CachedEmailAddress.DoesNotExist:
+            pass
 
+    @coalesce_publish
     def publish(self):
         super(BadgeInstance, self).publish()
+        invalidate_rendered_responses(self)
         self.badgeclass.publish()
         if self.cached_recipient_profile:
             self.cached_recipient_profile.publish()
@@ -770,7 +943,9 @@ class BadgeInstance(BaseAuditedModel,
     def delete(self, *args, **kwargs):
         badgeclass = self.badgeclass
         recipient_profile = self.cached_recipient_profile
-        super(BadgeInstance, self).delete(*args, **kwargs)
+        with transaction.atomic():
+            BadgeInstanceChange.objects.record([self], BadgeInstanceChange.ACTION_DELETED)
+            super(BadgeInstance, self).delete(*args, **kwargs)
         badgeclass.publish()
         if recipient_profile:
             recipient_profile.publish()
@@ -778,6 +953,9 @@ class BadgeInstance(BaseAuditedModel,
             self.recipient_user.publish()
         self.publish_delete('entity_id', 'revoked')
 
+        from pathway.tasks import schedule_badgeclass_pathway_completions
+        after_publish(lambda: schedule_badgeclass_pathway_completions(badgeclass, [self.recipient_identifier]))
+
     def revoke(self, revocation_reason):
         if self.revoked:
             raise ValidationError("Assertion is already revoked")
@@ -788,7 +966,11 @@ class BadgeInstance(BaseAuditedModel,
         self.revoked = True
         self.revocation_reason = revocation_reason
         self.image.delete()
-        self.save()
+        self.save(change_action=BadgeInstanceChange.ACTION_REVOKED)
+
+        from pathway.tasks import schedule_badgeclass_pathway_completions
+        after_publish(lambda: schedule_badgeclass_pathway_completions(
+            self.cached_badgeclass, [self.recipient_identifier]))
 
         # remove BadgeObjectiveAwards from badgebook if needed
         if apps.is_installed('badgebook'):
@@ -811,6 +993,8 @@ class BadgeInstance(BaseAuditedModel,
 
         TODO: consider making this an option on initial save and having a foreign key to
         the notification model instance (which would link through to the OpenBadge)
+
+        To notify many earners use issuer.tasks.notify_earners_of_badgeinstances instead.
         """
         if self.recipient_type != BadgeInstance.RECIPIENT_TYPE_EMAIL:
             return
@@ -827,45 +1011,42 @@ class BadgeInstance(BaseAuditedModel,
         if badgr_app is None:
             badgr_app = BadgrApp.objects.get_current(None)
 
-        try:
-            if self.issuer.image:
-                issuer_image_url = self.issuer.public_url + '/image'
-            else:
-                issuer_image_url = None
-
-            email_context = {
-                'badge_name': self.badgeclass.name,
-                'badge_id': self.entity_id,
-                'badge_description': self.badgeclass.description,
-                'issuer_name': re.sub(r'[^\w\s]+', '', self.issuer.name, 0, re.I),
-                'issuer_url': self.issuer.url,
-                'issuer_detail': self.issuer.public_url,
-                'issuer_image_url': issuer_image_url,
-                'badge_instance_url': self.public_url,
-                'image_url': self.public_url + '/image',
-                'download_url': self.public_url + "?action=download",
-                'unsubscribe_url': getattr(settings, 'HTTP_ORIGIN') + EmailBlacklist.generate_email_signature(
-                    self.recipient_identifier),
-                'site_name': badgr_app.name,
-                'site_url': badgr_app.signup_redirect,
-            }
-            if badgr_app.cors == 'badgr.io':
-                email_context['promote_mobile'] = True
-        except KeyError as e:
-            # A property isn't stored right in json
-            raise e
+        template_name, email_context = self.get_earner_notification(badgr_app)
+        adapter = get_adapter()
+        adapter.send_mail(template_name, self.recipient_identifier, context=email_context)
 
-        template_name = 'issuer/email/notify_earner'
-        try:
+    def get_earner_notification(self, badgr_app, badgeclass_context=None, is_account_holder=None):
+        """
+        Returns the (template_name, email_context) of the email notification to the badge earner.
+
+        :param badgeclass_context: the result of BadgeClass.get_earner_notification_context(), which can be
+            shared by notifications for assertions of the same badgeclass
+        :param is_account_holder: whether the recipient has a verified email address, looked up if None
+        """
+        if badgeclass_context is None:
+            badgeclass_context = self.badgeclass.get_earner_notification_context(badgr_app)
+
+        email_context = dict(badgeclass_context)
+        email_context.update({
+            'badge_id': self.entity_id,
+            'badge_instance_url': self.public_url,
+            'image_url': self.public_url + '/image',
+            'download_url': self.public_url + "?action=download",
+            'unsubscribe_url': getattr(settings, 'HTTP_ORIGIN') + EmailBlacklist.generate_email_signature(
+                self.recipient_identifier),
+        })
+
+        if is_account_holder is None:
             from badgeuser.models import CachedEmailAddress
-            CachedEmailAddress.objects.get(email=self.recipient_identifier, verified=True)
+            is_account_holder = CachedEmailAddress.objects.filter(
+                email=self.recipient_identifier, verified=True).exists()
+
+        template_name = 'issuer/email/notify_earner'
+        if is_account_holder:
             template_name = 'issuer/email/notify_account_holder'
             email_context['site_url'] = badgr_app.email_confirmation_redirect
-        except CachedEmailAddress.DoesNotExist:
-            pass
 
-        adapter = get_adapter()
-        adapter.send_mail(template_name, self.recipient_identifier, context=email_context)
+        return template_name, email_context
 
     def get_extensions_manager(self):
         return self.badgeinstanceextension_set
@@ -891,9 +1072,19 @@ class BadgeInstance(BaseAuditedModel,
             pass
         return None
 
-    def get_json(self, obi_version=CURRENT_OBI_VERSION, expand_badgeclass=False, expand_issuer=False, include_extra=True, use_canonical_id=False):
+    def get_json(self, obi_version=CURRENT_OBI_VERSION, expand_badgeclass=False, expand_issuer=False, include_extra=True, use_canonical_id=False, use_materialized=True):
         obi_version, context_iri = get_obi_context(obi_version)
 
+        json = None
+        if use_materialized and include_extra and not use_canonical_id:
+            json = self.get_materialized_json(obi_version)
+        if json is not None:
+            if expand_badgeclass and not self.revoked:
+                json['badge'] = self.cached_badgeclass.get_json(obi_version=obi_version, include_extra=include_extra)
+                if expand_issuer:
+                    json['badge']['issuer'] = self.cached_issuer.get_json(obi_version=obi_version, include_extra=include_extra)
+            return json
+
         json = OrderedDict([
             ('@context', context_iri),
             ('type', 'Assertion'),
@@ -990,6 +1181,7 @@ class BadgeInstance(BaseAuditedModel,
     def get_filtered_json(self, excluded_fields=('@context', 'id', 'type', 'uid', 'recipient', 'badge', 'issuedOn', 'image', 'evidence', 'narrative', 'revoked', 'revocationReason', 'verify', 'verification')):
         return super(BadgeInstance, self).get_filtered_json(excluded_fields=excluded_fields)
 
+    @prefetched
     @cachemodel.cached_method(auto_publish=True)
     def cached_evidence(self):
         return self.badgeinstanceevidence_set.all()
@@ -1030,6 +1222,8 @@ class BadgeInstance(BaseAuditedModel,
     def get_baked_image_url(self, obi_version=CURRENT_OBI_VERSION):
         if obi_version == UNVERSIONED_BAKED_VERSION:
             # requested version is the one referenced in assertion.image
+            if not self.image:
+                self.save_baked_image()
             return self.image.url
 
         try:
@@ -1044,11 +1238,11 @@ class BadgeInstance(BaseAuditedModel,
                 expand_badgeclass=True,
                 include_extra=True
             )
-            badgeclass_name, ext = os.path.splitext(self.badgeclass.image.file.name)
+            badgeclass_name, ext = os.path.splitext(self.cached_badgeclass.image.name)
             new_image = StringIO.StringIO()
-            bake(image_file=self.cached_badgeclass.image.file,
-                 assertion_json_string=json_dumps(json_to_bake, indent=2),
-                 output_file=new_image)
+            bake_badgeclass_image(self.cached_badgeclass,
+                                  assertion_json_string=json_dumps(json_to_bake, indent=2),
+                                  output_file=new_image)
             baked_image.image.save(
                 name='assertion-{id}-{version}{ext}'.format(id=self.entity_id, ext=ext, version=obi_version),
                 content=ContentFile(new_image.read()),
@@ -1066,11 +1260,46 @@ def _baked_badge_instance_filename_generator(instance, filename):
     )
 
 
+class BadgeInstanceChange(models.Model):
+    """
+    Append-only log of changes to assertions. The pk is the sequence clients page through
+    the assertions/changed feed by, so every poll is a range scan of an index ending in id.
+
+    Rows are not tied to the assertion by foreign key, as they must outlive it when it is deleted.
+    """
+    ACTION_CREATED = 'created'
+    ACTION_UPDATED = 'updated'
+    ACTION_REVOKED = 'revoked'
+    ACTION_DELETED = 'deleted'
+    ACTION_CHOICES = (
+        (ACTION_CREATED, 'created'),
+        (ACTION_UPDATED, 'updated'),
+        (ACTION_REVOKED, 'revoked'),
+        (ACTION_DELETED, 'deleted'),
+    )
+
+    badgeinstance_id = models.IntegerField()
+    entity_id = models.CharField(max_length=254)
+    issuer_id = models.IntegerField()
+    recipient_identifier = models.CharField(max_length=1024)
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = BadgeInstanceChangeManager()
+
+    class Meta:
+        index_together = (
+            ('issuer_id', 'id'),
+            ('badgeinstance_id', 'id'),
+        )
+
+
 class BadgeInstanceBakedImage(cachemodel.CacheModel):
     badgeinstance = models.ForeignKey('issuer.BadgeInstance')
     obi_version = models.CharField(max_length=254)
     image = models.FileField(upload_to=_baked_badge_instance_filename_generator, blank=True)
 
+    @coalesce_publish
     def publish(self):
         self.publish_by('badgeinstance', 'obi_version')
         return super(BadgeInstanceBakedImage, self).publish()
@@ -1087,6 +1316,7 @@ class BadgeInstanceEvidence(OriginalJsonMixin, cachemodel.CacheModel):
 
     objects = BadgeInstanceEvidenceManager()
 
+    @coalesce_publish
     def publish(self):
         super(BadgeInstanceEvidence, self).publish()
         self.badgeinstance.publish()
@@ -1119,6 +1349,7 @@ class BadgeClassAlignment(OriginalJsonMixin, cachemodel.CacheModel):
     target_framework = models.TextField(blank=True, null=True, default=None)
     target_code = models.TextField(blank=True, null=True, default=None)
 
+    @coalesce_publish
     def publish(self):
         super(BadgeClassAlignment, self).publish()
         self.badgeclass.publish()
@@ -1152,6 +1383,7 @@ class BadgeClassTag(cachemodel.CacheModel):
     def __unicode__(self):
         return self.name
 
+    @coalesce_publish
     def publish(self):
         super(BadgeClassTag, self).publish()
         self.badgeclass.publish()
@@ -1164,6 +1396,7 @@ class BadgeClassTag(cachemodel.CacheModel):
 class IssuerExtension(BaseOpenBadgeExtension):
     issuer = models.ForeignKey('issuer.Issuer')
 
+    @coalesce_publish
     def publish(self):
         super(IssuerExtension, self).publish()
         self.issuer.publish()
@@ -1176,6 +1409,7 @@ class IssuerExtension(BaseOpenBadgeExtension):
 class BadgeClassExtension(BaseOpenBadgeExtension):
     badgeclass = models.ForeignKey('issuer.BadgeClass')
 
+    @coalesce_publish
     def publish(self):
         super(BadgeClassExtension, self).publish()
         self.badgeclass.publish()
@@ -1188,6 +1422,7 @@ class BadgeClassExtension(BaseOpenBadgeExtension):
 class BadgeInstanceExtension(BaseOpenBadgeExtension):
     badgeinstance = models.ForeignKey('issuer.BadgeInstance')
 
+    @coalesce_publish
     def publish(self):
         super(BadgeInstanceExtension, self).publish()
         self.badgeinstance.publish()
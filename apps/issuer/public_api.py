@@ -7,11 +7,12 @@ from PIL import Image
 from django.conf import settings
 from django.core.files.storage import DefaultStorage
 from django.core.urlresolvers import resolve, reverse, Resolver404, NoReverseMatch
-from django.http import Http404, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.shortcuts import redirect, render_to_response
 from django.views.generic import RedirectView
 from rest_framework import status, permissions
 from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST
 from rest_framework.views import APIView
@@ -19,8 +20,9 @@ from rest_framework.views import APIView
 import badgrlog
 import utils
 from backpack.models import BackpackCollection
-from entity.api import VersionedObjectMixin
+from entity.api import VersionedObjectMixin, ConditionalGetMixin
 from mainsite.models import BadgrApp
+from mainsite.response_cache import get_rendered_response, set_rendered_response
 from mainsite.utils import OriginSetting
 from .models import Issuer, BadgeClass, BadgeInstance
 
@@ -58,7 +60,7 @@ class SlugToEntityIdRedirectMixin(object):
             raise Http404
 
 
-class JSONComponentView(VersionedObjectMixin, APIView, SlugToEntityIdRedirectMixin):
+class JSONComponentView(VersionedObjectMixin, ConditionalGetMixin, APIView, SlugToEntityIdRedirectMixin):
     """
     Abstract Component Class
     """
@@ -67,6 +69,12 @@ class JSONComponentView(VersionedObjectMixin, APIView, SlugToEntityIdRedirectMix
     html_renderer_class = None
     template_name = 'public/bot_openbadge.html'
 
+    # the ?expand= values get_json() understands
+    expand_options = ()
+
+    # store rendered json responses with mainsite.response_cache
+    cache_rendered_responses = True
+
     def log(self, obj):
         pass
 
@@ -92,8 +100,42 @@ class JSONComponentView(VersionedObjectMixin, APIView, SlugToEntityIdRedirectMix
         if self.is_requesting_html():
             return HttpResponseRedirect(redirect_to=self.get_badgrapp_redirect())
 
+        validators = self.get_validators(request, self.current_object)
+        not_modified = self.get_not_modified_response(request, self.current_object, validators)
+        if not_modified is not None:
+            return not_modified
+
+        etag, last_modified = validators
+        use_cache = self.cache_rendered_responses and etag is not None and isinstance(request.accepted_renderer, JSONRenderer)
+        if use_cache:
+            rendered = get_rendered_response(self.current_object, self.get_rendered_variant(request), etag)
+            if rendered is not None:
+                content_type, content = rendered
+                return self.set_validators(HttpResponse(content, content_type=content_type), etag, last_modified)
+
         json = self.get_json(request=request)
-        return Response(json)
+        response = self.conditional_response(request, self.current_object, Response(json), validators)
+        if use_cache:
+            response.add_post_render_callback(lambda r: self.store_rendered_response(request, r, etag))
+        return response
+
+    def get_expands(self, request):
+        return sorted(set(request.GET.getlist('expand', [])) & set(self.expand_options))
+
+    def get_etag_parts(self, request, obj):
+        return [self._get_request_obi_version(request), self.get_expands(request), request.accepted_media_type]
+
+    def get_rendered_variant(self, request):
+        """
+        Identifies the rendering of current_object that request asks for, among the others stored for it.
+        """
+        obi_version, context_iri = utils.get_obi_context(self._get_request_obi_version(request))
+        return self.__class__.__name__, obi_version, tuple(self.get_expands(request)), request.accepted_media_type
+
+    def store_rendered_response(self, request, response, etag):
+        if response.status_code == status.HTTP_200_OK:
+            set_rendered_response(self.current_object, self.get_rendered_variant(request), etag,
+                                  response['Content-Type'], response.content)
 
     def is_bot(self):
         bot_useragents = getattr(settings, 'BADGR_PUBLIC_BOT_USERAGENTS', ['LinkedInBot'])
@@ -153,6 +195,9 @@ class ImagePropertyDetailView(APIView, SlugToEntityIdRedirectMixin):
             self.log(current_object)
             return current_object
 
+    def get_image(self, current_object):
+        return getattr(current_object, self.prop)
+
     def get(self, request, **kwargs):
 
         entity_id = kwargs.get('entity_id')
@@ -162,7 +207,7 @@ class ImagePropertyDetailView(APIView, SlugToEntityIdRedirectMixin):
         elif current_object is None:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
-        image_prop = getattr(current_object, self.prop)
+        image_prop = self.get_image(current_object)
         if not bool(image_prop):
             return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -231,6 +276,13 @@ class IssuerBadgesJson(JSONComponentView):
     def log(self, obj):
         logger.event(badgrlog.IssuerBadgesRetrievedEvent(obj, self.request))
 
+    def get_etag_objects(self, request, obj):
+        return [obj] + list(obj.cached_badgeclasses())
+
+    def use_last_modified(self, request, obj):
+        # deleting a badgeclass doesn't bump the issuer's updated_at
+        return False
+
     def get_json(self, request):
         obi_version=self._get_request_obi_version(request)
 
@@ -248,6 +300,7 @@ class IssuerImage(ImagePropertyDetailView):
 class BadgeClassJson(JSONComponentView):
     permission_classes = (permissions.AllowAny,)
     model = BadgeClass
+    expand_options = ('issuer',)
 
     def log(self, obj):
         logger.event(badgrlog.BadgeClassRetrievedEvent(obj, self.request))
@@ -262,6 +315,11 @@ class BadgeClassJson(JSONComponentView):
 
         return json
 
+    def get_etag_objects(self, request, obj):
+        if 'issuer' in request.GET.getlist('expand', []):
+            return [obj, obj.cached_issuer]
+        return [obj]
+
     def get_context_data(self, **kwargs):
         image_url = "{}{}?type=png".format(
             OriginSetting.HTTP,
@@ -301,6 +359,7 @@ class BadgeClassCriteria(RedirectView, SlugToEntityIdRedirectMixin):
 class BadgeInstanceJson(JSONComponentView):
     permission_classes = (permissions.AllowAny,)
     model = BadgeInstance
+    expand_options = ('badge', 'badge.issuer')
 
     def get_json(self, request):
         expands = request.GET.getlist('expand', [])
@@ -312,6 +371,9 @@ class BadgeInstanceJson(JSONComponentView):
 
         return json
 
+    def get_etag_objects(self, request, obj):
+        return [obj] + _expanded_badge_objects(obj, request.GET.getlist('expand', []), prefix='')
+
     def get_context_data(self, **kwargs):
         image_url = "{}{}?type=png".format(
             OriginSetting.HTTP,
@@ -338,11 +400,21 @@ class BadgeInstanceImage(ImagePropertyDetailView):
             return None
         return obj
 
+    def get_image(self, current_object):
+        if not current_object.image:
+            # baking was deferred and hasn't finished yet
+            if getattr(settings, 'BADGR_BAKE_ON_DEMAND', True):
+                current_object.save_baked_image()
+            else:
+                return current_object.cached_badgeclass.image
+        return current_object.image
+
 
 class BackpackCollectionJson(JSONComponentView):
     permission_classes = (permissions.AllowAny,)
     model = BackpackCollection
     entity_id_field_name = 'share_hash'
+    expand_options = ('badges.badge', 'badges.badge.issuer')
 
     def get_json(self, request):
         expands = request.GET.getlist('expand', [])
@@ -356,6 +428,36 @@ class BackpackCollectionJson(JSONComponentView):
         )
         return json
 
+    def get_etag_objects(self, request, obj):
+        expands = request.GET.getlist('expand', [])
+        objects = [obj, obj.cached_creator]
+        for badgeinstance in obj.cached_badgeinstances():
+            objects.append(badgeinstance)
+            objects.extend(_expanded_badge_objects(badgeinstance, expands, prefix='badges.'))
+        return objects
+
+    def get_etag_parts(self, request, obj):
+        if not obj.published:
+            # get_json() will 404
+            return None
+        return super(BackpackCollectionJson, self).get_etag_parts(request, obj)
+
+    def use_last_modified(self, request, obj):
+        # adding or removing badges doesn't bump the collection's updated_at
+        return False
+
+
+def _expanded_badge_objects(badgeinstance, expands, prefix):
+    """
+    The badgeclass and issuer of badgeinstance that are expanded into its json by the given expand parameters.
+    """
+    objects = []
+    if prefix + 'badge' in expands:
+        objects.append(badgeinstance.cached_badgeclass)
+        if prefix + 'badge.issuer' in expands:
+            objects.append(badgeinstance.cached_issuer)
+    return objects
+
 
 class BakedBadgeInstanceImage(VersionedObjectMixin, APIView, SlugToEntityIdRedirectMixin):
     permission_classes = (permissions.AllowAny,)
@@ -11,6 +11,7 @@ import utils
 from badgeuser.serializers_v1 import BadgeUserProfileSerializerV1, BadgeUserIdentifierFieldV1
 from mainsite.drf_fields import ValidImageField
 from mainsite.models import BadgrApp
+from mainsite.publish import publish_batch
 from mainsite.serializers import HumanReadableBooleanField, StripTagsCharField, MarkdownCharField, \
     OriginalJsonSerializerMixin
 from mainsite.utils import OriginSetting
@@ -174,6 +175,7 @@ class BadgeClassSerializerV1(OriginalJsonSerializerMixin, serializers.Serializer
         else:
             return None
 
+    @publish_batch()
     def update(self, instance, validated_data):
 
         new_name = validated_data.get('name')
@@ -333,10 +335,9 @@ class BadgeInstanceSerializerV1(OriginalJsonSerializerMixin, serializers.Seriali
 
         return representation
 
-    def create(self, validated_data):
+    def get_issue_kwargs(self, validated_data):
         """
-        Requires self.context to include request (with authenticated request.user)
-        and badgeclass: issuer.models.BadgeClass.
+        Map validated_data onto the kwargs accepted by BadgeInstanceManager.create() and bulk_issue()
         """
         evidence_items = []
 
@@ -350,15 +351,26 @@ class BadgeInstanceSerializerV1(OriginalJsonSerializerMixin, serializers.Seriali
         if submitted_items:
             evidence_items.extend(submitted_items)
 
-        return self.context.get('badgeclass').issue(
-            recipient_id=validated_data.get('recipient_identifier'),
+        return dict(
+            recipient_identifier=validated_data.get('recipient_identifier'),
             narrative=validated_data.get('narrative'),
             evidence=evidence_items,
             notify=validated_data.get('create_notification'),
-            created_by=self.context.get('request').user,
             allow_uppercase=validated_data.get('allow_uppercase'),
             recipient_type=validated_data.get('recipient_type', BadgeInstance.RECIPIENT_TYPE_EMAIL),
-            badgr_app=BadgrApp.objects.get_current(self.context.get('request')),
             expires_at=validated_data.get('expires_at', None),
             extensions=validated_data.get('extension_items', None)
         )
+
+    def create(self, validated_data):
+        """
+        Requires self.context to include request (with authenticated request.user)
+        and badgeclass: issuer.models.BadgeClass.
+        """
+        issue_kwargs = self.get_issue_kwargs(validated_data)
+        return self.context.get('badgeclass').issue(
+            recipient_id=issue_kwargs.pop('recipient_identifier'),
+            created_by=self.context.get('request').user,
+            badgr_app=BadgrApp.objects.get_current(self.context.get('request')),
+            **issue_kwargs
+        )
@@ -477,6 +477,17 @@ class BadgeInstanceSerializerV2(DetailSerializerV2, OriginalJsonSerializerMixin)
         # BadgeInstances are not updatable
         return instance
 
+    def get_issue_kwargs(self, validated_data):
+        """
+        Map validated_data onto the kwargs accepted by BadgeInstanceManager.create() and bulk_issue()
+        """
+        issue_kwargs = dict(validated_data)
+        issue_kwargs.pop('badgeclass', None)
+        issue_kwargs.pop('issuer', None)
+        if 'extension_items' in issue_kwargs:
+            issue_kwargs['extensions'] = issue_kwargs.pop('extension_items')
+        return issue_kwargs
+
     def validate(self, data):
         if 'cached_badgeclass' in data and 'badgeclass_jsonld_id' in data:
             raise serializers.ValidationError(
@@ -485,15 +496,20 @@ class BadgeInstanceSerializerV2(DetailSerializerV2, OriginalJsonSerializerMixin)
         if 'cached_badgeclass' in data:
             # included badgeclass in request
             data['badgeclass'] = data.pop('cached_badgeclass')
+        elif 'badgeclass_jsonld_id' in data:
+            data['badgeclass'] = data.pop('badgeclass_jsonld_id')
         elif 'badgeclass' in self.context:
             # badgeclass was passed in context
             data['badgeclass'] = self.context.get('badgeclass')
-        elif 'badgeclass_jsonld_id' in data:
-            data['badgeclass'] = data.pop('badgeclass_jsonld_id')
         else:
             # badgeclass is required on create
             raise serializers.ValidationError({"badgeclass": ["This field is required"]})
 
+        # assertions issued through a badgeclass url (including each assertion of a batch) may only name that badgeclass
+        expected_badgeclass = self.context.get('badgeclass')
+        if expected_badgeclass and data['badgeclass'] != expected_badgeclass:
+            raise serializers.ValidationError({"badgeclass": ["Does not match the badgeclass being issued."]})
+
         expected_issuer = self.context.get('kwargs', {}).get('issuer')
         if expected_issuer and data['badgeclass'].issuer != expected_issuer:
             raise serializers.ValidationError({"badgeclass": ["Could not find matching badgeclass for this issuer."]})
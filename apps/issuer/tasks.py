@@ -1,9 +1,14 @@
 # encoding: utf-8
 from __future__ import unicode_literals
 
+import socket
+from smtplib import SMTPException, SMTPRecipientsRefused, SMTPSenderRefused, SMTPDataError
+
 import requests
 from celery.utils.log import get_task_logger
 from django.conf import settings
+from django.core.files.storage import DefaultStorage
+from django.core.mail import get_connection
 from requests import ConnectionError
 
 import badgrlog
@@ -43,3 +48,145 @@ def notify_badgerank_of_badgeclass(self, badgeclass_pk):
         'success': True
     }
 
+
+
+@app.task(bind=True)
+def notify_earners_of_badgeinstances(self, badgeinstance_pks, badgr_app_pk=None):
+    """
+    Queue earner notifications in chunks of settings.BADGR_NOTIFY_EARNERS_CHUNK_SIZE,
+    each chunk is sent by send_earner_notifications over a single SMTP connection.
+    """
+    chunk_size = getattr(settings, 'BADGR_NOTIFY_EARNERS_CHUNK_SIZE', 100)
+    chunks = [badgeinstance_pks[offset:offset+chunk_size] for offset in range(0, len(badgeinstance_pks), chunk_size)]
+    for chunk in chunks:
+        send_earner_notifications.delay(badgeinstance_pks=chunk, badgr_app_pk=badgr_app_pk)
+
+    return {
+        'success': True,
+        'chunks': len(chunks)
+    }
+
+
+@app.task(bind=True, max_retries=5)
+def send_earner_notifications(self, badgeinstance_pks, badgr_app_pk=None):
+    """
+    Notify the earners of badgeinstance_pks over one SMTP connection.
+    If the connection fails, the task is retried for the notifications that haven't been sent yet.
+    """
+    from allauth.account.adapter import get_adapter
+    from badgeuser.models import CachedEmailAddress
+    from issuer.models import BadgeInstance
+    from mainsite.models import BadgrApp, EmailBlacklist
+
+    badgr_app = None
+    if badgr_app_pk is not None:
+        try:
+            badgr_app = BadgrApp.cached.get(pk=badgr_app_pk)
+        except BadgrApp.DoesNotExist:
+            pass
+    if badgr_app is None:
+        badgr_app = BadgrApp.objects.get_current(None)
+
+    badgeinstances = list(BadgeInstance.objects.filter(
+        pk__in=badgeinstance_pks,
+        recipient_type=BadgeInstance.RECIPIENT_TYPE_EMAIL
+    ).select_related('badgeclass', 'badgeclass__issuer'))
+    recipients = set(b.recipient_identifier for b in badgeinstances)
+    blacklisted = set(EmailBlacklist.objects.filter(email__in=recipients).values_list('email', flat=True))
+    account_holders = set(CachedEmailAddress.objects.filter(
+        email__in=recipients, verified=True).values_list('email', flat=True))
+
+    adapter = get_adapter()
+    badgeclass_contexts = {}
+    messages = []
+    found_pks = set(b.pk for b in badgeinstances)
+    skipped = [pk for pk in badgeinstance_pks if pk not in found_pks]
+    failed = []
+    for badgeinstance in badgeinstances:
+        if badgeinstance.recipient_identifier in blacklisted:
+            skipped.append(badgeinstance.pk)
+            continue
+        if badgeinstance.badgeclass_id not in badgeclass_contexts:
+            badgeclass_contexts[badgeinstance.badgeclass_id] = \
+                badgeinstance.badgeclass.get_earner_notification_context(badgr_app)
+        try:
+            template_name, email_context = badgeinstance.get_earner_notification(
+                badgr_app,
+                badgeclass_context=badgeclass_contexts[badgeinstance.badgeclass_id],
+                is_account_holder=badgeinstance.recipient_identifier in account_holders)
+            messages.append((badgeinstance.pk, adapter.build_mail(
+                template_name, badgeinstance.recipient_identifier, email_context)))
+        except Exception as e:
+            logger.error("Unable to render notification for BadgeInstance {}: {}".format(badgeinstance.pk, e))
+            failed.append(badgeinstance.pk)
+
+    sent = []
+    if messages:
+        connection = get_connection()
+        try:
+            connection.open()
+            for pk, message in messages:
+                message.connection = connection
+                try:
+                    message.send()
+                except (SMTPRecipientsRefused, SMTPSenderRefused, SMTPDataError) as e:
+                    logger.error("Unable to notify earner of BadgeInstance {}: {}".format(pk, e))
+                    failed.append(pk)
+                else:
+                    sent.append(pk)
+        except (SMTPException, socket.error) as e:
+            unsent = [pk for pk, message in messages if pk not in sent and pk not in failed]
+            logger.warning("Retrying {} earner notifications: {}".format(len(unsent), e))
+            raise self.retry(args=(), kwargs=dict(badgeinstance_pks=unsent, badgr_app_pk=badgr_app_pk),
+                             exc=e, countdown=2 ** self.request.retries * 60)
+        finally:
+            connection.close()
+
+    return {
+        'success': len(failed) == 0,
+        'sent': sent,
+        'skipped': skipped,
+        'failed': failed
+    }
+
+
+@app.task(bind=True)
+def bake_badgeinstance_image(self, badgeinstance_pk):
+    from issuer.models import BadgeInstance
+
+    try:
+        badgeinstance = BadgeInstance.objects.get(pk=badgeinstance_pk)
+    except BadgeInstance.DoesNotExist:
+        return {
+            'success': False,
+            'error': "Unknown badgeinstance pk={}".format(badgeinstance_pk)
+        }
+
+    if badgeinstance.revoked or badgeinstance.image:
+        return {
+            'success': True,
+            'message': "skipping since badgeinstance is revoked or already baked"
+        }
+
+    badgeinstance.save_baked_image()
+    return {
+        'success': True
+    }
+
+
+@app.task(bind=True)
+def delete_stored_files(self, names):
+    storage = DefaultStorage()
+    deleted = []
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.error("Unable to delete stored file {}: {}".format(name, e))
+        else:
+            deleted.append(name)
+
+    return {
+        'success': len(deleted) == len(names),
+        'deleted': deleted
+    }
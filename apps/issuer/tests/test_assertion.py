@@ -1,19 +1,29 @@
 # encoding: utf-8
 from __future__ import unicode_literals
 
+import StringIO
+import datetime
+import io
 import json
 
 import dateutil.parser
 import png
+from backports import csv
 from django.apps import apps
 from django.core import mail
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.utils import timezone
+from oauth2_provider.models import AccessToken
 
 from mainsite.tests import BadgrTestCase, SetupIssuerHelper
 from openbadges_bakery import unbake
 
-from issuer.models import BadgeInstance, IssuerStaff
+from backpack.models import BackpackCollection, BackpackCollectionBadgeInstance
+from issuer.api import BadgeClassAssertionsExport, BadgeInstanceList
+from issuer.models import BadgeInstance, BadgeInstanceChange, BadgeInstanceEvidence, IssuerStaff
+from issuer.tasks import send_earner_notifications
+from mainsite.models import EmailBlacklist
 from mainsite.utils import OriginSetting
 
 
@@ -360,6 +370,27 @@ class AssertionTests(SetupIssuerHelper, BadgrTestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(len(mail.outbox), 1)
 
+    def test_earner_notifications_sent_in_chunks(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        EmailBlacklist.objects.create(email='blacklisted@email.test')
+
+        recipients = ['first@email.test', 'second@email.test', 'third@email.test', 'blacklisted@email.test']
+        with self.settings(BADGR_NOTIFY_EARNERS_CHUNK_SIZE=2):
+            results = BadgeInstance.objects.bulk_issue(test_badgeclass, [
+                dict(recipient_identifier=r, notify=True) for r in recipients
+            ])
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(recipients[:3]))
+
+        badgeinstance_pks = [new_instance.pk for new_instance, error in results]
+        mail.outbox = []
+        status = send_earner_notifications.delay(badgeinstance_pks=badgeinstance_pks).get()
+        self.assertTrue(status['success'])
+        self.assertEqual(sorted(status['sent']), sorted(badgeinstance_pks[:3]))
+        self.assertEqual(status['skipped'], badgeinstance_pks[3:])
+        self.assertEqual(len(mail.outbox), 3)
+
     def test_authenticated_owner_list_assertions(self):
         test_user = self.setup_user(authenticate=True)
         test_issuer = self.setup_issuer(owner=test_user)
@@ -400,6 +431,129 @@ class AssertionTests(SetupIssuerHelper, BadgrTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 1)
 
+    def test_assertion_lists_filtered_and_paginated(self):
+        test_user = self.setup_user(authenticate=True)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        assertions = [assertion for assertion, error in BadgeInstance.objects.bulk_issue(test_badgeclass, [
+            dict(recipient_identifier='recipient{}@email.test'.format(i), notify=False) for i in range(60)
+        ])]
+        BadgeInstance.objects.filter(pk=assertions[0].pk).update(revoked=True, revocation_reason='for testing')
+        BadgeInstance.objects.filter(pk=assertions[1].pk).update(issued_on=dateutil.parser.parse('2016-01-01T00:00:00Z'))
+
+        url = '/v2/badgeclasses/{badge}/assertions'.format(badge=test_badgeclass.entity_id)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['result']), 50)
+        self.assertTrue(response.data['pagination']['hasNext'])
+
+        response = self.client.get(url, {'cursor': response.data['pagination']['nextCursor']})
+        self.assertEqual(len(response.data['result']), 9)
+        self.assertFalse(response.data['pagination']['hasNext'])
+        self.assertTrue(response.data['pagination']['hasPrevious'])
+
+        response = self.client.get(url, {'revoked': 'true'})
+        self.assertEqual([a['entityId'] for a in response.data['result']], [assertions[0].entity_id])
+
+        response = self.client.get(url, {'issuedOnBefore': '2017-01-01', 'paginate': 'false'})
+        self.assertEqual([a['entityId'] for a in response.data['result']], [assertions[1].entity_id])
+        self.assertNotIn('pagination', response.data)
+
+        response = self.client.get(url, {'issuedOnAfter': 'not a date'})
+        self.assertEqual(response.status_code, 400)
+
+        # v1 lists stay unpaginated unless asked
+        url = '/v1/issuer/issuers/{issuer}/assertions'.format(issuer=test_issuer.entity_id)
+        response = self.client.get(url, {'revoked': 'any'})
+        self.assertEqual(len(response.data), 60)
+        response = self.client.get(url, {'paginate': 'true', 'recipient': 'recipient5@email.test'})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertFalse(response.data['hasNext'])
+
+    def test_assertion_lists_streamed(self):
+        test_user = self.setup_user(authenticate=True)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        BadgeInstance.objects.bulk_issue(test_badgeclass, [
+            dict(recipient_identifier='recipient{}@email.test'.format(i), notify=False) for i in range(7)
+        ])
+
+        # serialize in several chunks
+        BadgeInstanceList.stream_chunk_size = 3
+        self.addCleanup(delattr, BadgeInstanceList, 'stream_chunk_size')
+
+        for url in ('/v2/badgeclasses/{badge}/assertions', '/v1/issuer/issuers/{issuer}/badges/{badge}/assertions'):
+            url = url.format(issuer=test_issuer.entity_id, badge=test_badgeclass.entity_id)
+            expected = self.client.get(url, {'paginate': 'false'})
+
+            response = self.client.get(url, {'stream': 'true'})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            streamed = json.loads(b''.join(response.streaming_content))
+            self.assertEqual(streamed, json.loads(expected.content))
+            self.assertEqual(len(streamed if url.startswith('/v1') else streamed['result']), 7)
+
+        # an error part way through is logged, and reported in the status closing the envelope
+        original_prefetch_objects = BadgeInstanceList.__dict__['prefetch_objects']
+        chunks = []
+
+        def prefetch_objects(view, objects):
+            chunks.append(objects)
+            if len(chunks) > 1:
+                raise ValueError("Unable to prefetch")
+            return original_prefetch_objects(view, objects)
+        BadgeInstanceList.prefetch_objects = prefetch_objects
+        self.addCleanup(setattr, BadgeInstanceList, 'prefetch_objects', original_prefetch_objects)
+
+        response = self.client.get('/v2/badgeclasses/{}/assertions'.format(test_badgeclass.entity_id), {'stream': 'true'})
+        streamed = json.loads(b''.join(response.streaming_content))
+        self.assertFalse(streamed['status']['success'])
+        self.assertEqual(len(streamed['result']), 3)
+
+    def test_assertions_exported_as_csv(self):
+        test_user = self.setup_user(authenticate=True)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        other_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        results = BadgeInstance.objects.bulk_issue(test_badgeclass, [
+            dict(recipient_identifier='recipient{}@email.test'.format(i), notify=False) for i in range(4)
+        ] + [dict(
+            recipient_identifier='evidenced@email.test',
+            notify=False,
+            evidence=[dict(evidence_url='http://example.com/evidence', narrative='did it')],
+            extensions={'extensions:ExampleExtension': {'exampleProperty': 'value'}}
+        )])
+        assertions = [assertion for assertion, error in results]
+        BadgeInstance.objects.bulk_issue(other_badgeclass, [dict(recipient_identifier='other@email.test', notify=False)])
+        BadgeInstance.objects.filter(pk=assertions[0].pk).update(revoked=True, revocation_reason='for testing')
+
+        # read the assertions in several chunks
+        BadgeClassAssertionsExport.export_chunk_size = 2
+        self.addCleanup(delattr, BadgeClassAssertionsExport, 'export_chunk_size')
+
+        response = self.client.get('/v2/badgeclasses/{}/assertions/export'.format(test_badgeclass.entity_id))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual([r['recipient'] for r in rows], [a.recipient_identifier for a in assertions[1:]])
+        self.assertEqual(rows[0]['badgeclass'], test_badgeclass.entity_id)
+        self.assertEqual(rows[0]['issuedOn'], assertions[1].issued_on.isoformat())
+        self.assertEqual(rows[0]['evidence'], '')
+        self.assertEqual(json.loads(rows[-1]['evidence']), [{'url': 'http://example.com/evidence', 'narrative': 'did it'}])
+        self.assertEqual(json.loads(rows[-1]['extensions']), {'extensions:ExampleExtension': {'exampleProperty': 'value'}})
+
+        response = self.client.get('/v2/issuers/{}/assertions/export'.format(test_issuer.entity_id), {'revoked': 'any'})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([r['revoked'] for r in rows if r['entityId'] == assertions[0].entity_id], ['True'])
+        self.assertEqual(rows[-1]['badgeclass'], other_badgeclass.entity_id)
+
+        other_issuer = self.setup_issuer(owner=self.setup_user(authenticate=False))
+        response = self.client.get('/v2/issuers/{}/assertions/export'.format(other_issuer.entity_id))
+        self.assertEqual(response.status_code, 404)
+
     def test_can_revoke_assertion(self):
         test_user = self.setup_user(authenticate=True)
         test_issuer = self.setup_issuer(owner=test_user)
@@ -423,6 +577,50 @@ class AssertionTests(SetupIssuerHelper, BadgrTestCase):
             revoked=True
         ), assertion_obo)
 
+    def test_batch_revoke_assertions(self):
+        test_user = self.setup_user(authenticate=True)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        assertions = [test_badgeclass.issue(recipient_id='recipient{}@email.test'.format(i)) for i in range(0, 3)]
+        assertions[2].revoke('already revoked')
+
+        other_user = self.setup_user(authenticate=False)
+        other_issuer = self.setup_issuer(owner=other_user)
+        other_badgeclass = self.setup_badgeclass(issuer=other_issuer)
+        other_assertion = other_badgeclass.issue(recipient_id='recipient0@email.test')
+
+        self.assertEqual(test_badgeclass.recipient_count(), 2)
+        image_name = assertions[0].image.name
+
+        revocation_reason = 'Earner kind of sucked, after all.'
+        response = self.client.post('/v2/assertions/revoke', [
+            {'entityId': assertions[0].entity_id, 'revocationReason': revocation_reason},
+            {'entityId': assertions[1].entity_id, 'revocationReason': revocation_reason},
+            {'entityId': assertions[2].entity_id, 'revocationReason': revocation_reason},
+            {'entityId': other_assertion.entity_id, 'revocationReason': revocation_reason},
+            {'entityId': assertions[0].entity_id},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+
+        result = response.data.get('result')
+        self.assertEqual([r['revoked'] for r in result], [True, True, False, False, False])
+        self.assertEqual(result[2]['reason'], "Assertion is already revoked")
+        self.assertEqual(result[3]['reason'], "permission denied or object not found")
+        self.assertEqual(result[4]['reason'], "revocationReason is required")
+
+        self.assertEqual(test_badgeclass.recipient_count(), 0)
+        self.assertFalse(BadgeInstance.objects.get(pk=other_assertion.pk).revoked)
+        self.assertFalse(assertions[0].image.storage.exists(image_name))
+
+        for assertion in assertions[:2]:
+            self.assertFalse(BadgeInstance.cached.get(entity_id=assertion.entity_id).image)
+            response = self.client.get('/public/assertions/{assertion}.json'.format(assertion=assertion.entity_id))
+            self.assertEqual(response.status_code, 200)
+            self.assertDictContainsSubset(dict(
+                revocationReason=revocation_reason,
+                revoked=True
+            ), json.loads(response.content))
+
     def test_cannot_revoke_assertion_if_missing_reason(self):
         test_user = self.setup_user(authenticate=True)
         test_issuer = self.setup_issuer(owner=test_user)
@@ -587,12 +785,138 @@ class AssertionTests(SetupIssuerHelper, BadgrTestCase):
             self.assertEqual(evidence[i].get('id'), expected[i].get('url'))
             self.assertEqual(evidence[i].get('narrative', None), expected[i].get('narrative', None))
 
+    def test_batch_assertions_issued_in_batches(self):
+        test_user = self.setup_user(authenticate=True)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        original_recipient_count = test_badgeclass.recipient_count()
+
+        batch_assertion_props = {
+            'assertions': [{
+                "recipient": {
+                    "identity": "batch{}@example.com".format(i),
+                    "type": "email",
+                },
+                "evidence": [{"url": "http://example.com/evidence/{}".format(i)}],
+            } for i in range(0, 5)]
+        }
+        with self.settings(BADGR_BULK_ISSUE_BATCH_SIZE=2):
+            response = self.client.post('/v2/badgeclasses/{badge}/issue'.format(
+                badge=test_badgeclass.entity_id
+            ), batch_assertion_props, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        returned_assertions = response.data.get('result')
+        self.assertEqual(len(returned_assertions), 5)
+        for i, returned in enumerate(returned_assertions):
+            self.assertEqual(returned['recipient']['plaintextIdentity'], "batch{}@example.com".format(i))
+            self.assertEqual(returned['evidence'][0]['url'], "http://example.com/evidence/{}".format(i))
+
+            instance = BadgeInstance.objects.get(entity_id=returned['entityId'])
+            self.assertEqual(instance.badgeinstanceevidence_set.count(), 1)
+            self.assertTrue(instance.image)
+
+        self.assertEqual(test_badgeclass.recipient_count(), original_recipient_count + 5)
+
+        response = self.client.get('/v2/badgeclasses/{badge}/assertions'.format(badge=test_badgeclass.entity_id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data.get('result')), original_recipient_count + 5)
+
+    def test_batch_assertions_reject_other_badgeclass(self):
+        test_user = self.setup_user(authenticate=True)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        other_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+
+        batch_assertion_props = {
+            'assertions': [{
+                "recipient": {"identity": "first@example.com", "type": "email"},
+                "badgeclass": test_badgeclass.entity_id,
+            }, {
+                "recipient": {"identity": "second@example.com", "type": "email"},
+                "badgeclass": other_badgeclass.entity_id,
+            }]
+        }
+        response = self.client.post('/v2/badgeclasses/{badge}/issue'.format(
+            badge=test_badgeclass.entity_id
+        ), batch_assertion_props, format='json')
+        self.assertEqual(response.status_code, 400)
+        field_errors = response.data['fieldErrors']
+        self.assertEqual(field_errors[0], {})
+        self.assertIn('badgeclass', field_errors[1])
+        self.assertEqual(BadgeInstance.objects.filter(issuer=test_issuer).count(), 0)
+
+    def test_bulk_issue_reports_per_row_failures(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        existing = test_badgeclass.issue(recipient_id='existing@example.com')
+
+        extensions = {'extensions:ExampleExtension': {'exampleProperty': 'example'}}
+        results = BadgeInstance.objects.bulk_issue(test_badgeclass, [
+            dict(recipient_identifier='first@example.com', extensions=extensions),
+            dict(recipient_identifier='second@example.com', issued_on='not a date'),
+            # fails the batch insert, the other rows are retried one at a time
+            dict(recipient_identifier='thïrd@example.com', entity_id=existing.entity_id),
+            dict(recipient_identifier='fourth@example.com'),
+        ], created_by=test_user)
+
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[0][0].recipient_identifier, 'first@example.com')
+        self.assertEqual(BadgeInstance.cached.get(pk=results[0][0].pk).extension_items, extensions)
+        self.assertEqual(results[1], (None, "The assertion could not be issued"))
+        self.assertEqual(results[2], (None, "The assertion could not be issued"))
+        self.assertEqual(results[3][0].recipient_identifier, 'fourth@example.com')
+        self.assertEqual(BadgeInstance.objects.filter(badgeclass=test_badgeclass).count(), 3)
+        self.assertEqual(BadgeInstanceChange.objects.filter(action=BadgeInstanceChange.ACTION_CREATED).count(), 3)
+
     def assertListOfDictsContainsSubset(self, expected, actual):
         for i in range(0, len(expected)):
             a = expected[i]
             b = actual[i]
             self.assertDictContainsSubset(a, b)
 
+    def test_materialized_json(self):
+        test_user = self.setup_user(authenticate=True)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+
+        with self.settings(BADGR_MATERIALIZE_JSON=True):
+            assertion = test_badgeclass.issue(recipient_id='new.recipient@email.test',
+                                              evidence=[{'evidence_url': 'http://example.com/evidence/1'}])
+            assertion = BadgeInstance.cached.get(entity_id=assertion.entity_id)
+            for obi_version in ('1_1', '2_0'):
+                self.assertEqual(json.loads(getattr(assertion, 'materialized_json_{}'.format(obi_version))),
+                                 json.loads(json.dumps(assertion.get_json(obi_version=obi_version, use_materialized=False))))
+
+            cached_evidence = BadgeInstance.__dict__['cached_evidence']
+
+            def _fail(*args, **kwargs):
+                raise AssertionError("materialized json should not be rebuilt")
+            BadgeInstance.cached_evidence = _fail
+            try:
+                self.assertEqual(len(assertion.get_json()['evidence']), 1)
+                expanded = assertion.get_json(expand_badgeclass=True, expand_issuer=True)
+                self.assertEqual(expanded['badge']['issuer']['name'], test_issuer.name)
+            finally:
+                BadgeInstance.cached_evidence = cached_evidence
+
+            # publishing new evidence rematerializes the assertion
+            BadgeInstanceEvidence.objects.create(badgeinstance=assertion, evidence_url='http://example.com/evidence/2')
+            assertion = BadgeInstance.cached.get(entity_id=assertion.entity_id)
+            self.assertEqual(len(assertion.get_json()['evidence']), 2)
+
+        BadgeInstance.objects.filter(pk=assertion.pk).update(materialized_json_2_0=None)
+        out = StringIO.StringIO()
+        call_command('materialize_json', verify=True, stdout=out)
+        self.assertIn('Found 1 BadgeInstances. 0 correct. 1 missing. 0 mismatch', out.getvalue())
+        self.assertIsNone(BadgeInstance.objects.get(pk=assertion.pk).materialized_json_2_0)
+
+        call_command('materialize_json', stdout=StringIO.StringIO())
+        assertion = BadgeInstance.objects.get(pk=assertion.pk)
+        self.assertEqual(json.loads(assertion.materialized_json_2_0),
+                         json.loads(json.dumps(assertion.get_json(use_materialized=False))))
+
 
 class V2ApiAssertionTests(SetupIssuerHelper, BadgrTestCase):
     def test_v2_issue_by_badgeclassOpenBadgeId(self):
@@ -651,3 +975,101 @@ class V2ApiAssertionTests(SetupIssuerHelper, BadgrTestCase):
         response = self.client.post('/v2/badgeclasses/{badgeclass}/assertions'.format(
             badgeclass=other_badgeclass.entity_id), new_assertion_props, format='json')
         self.assertEqual(response.status_code, 404)
+
+    def test_assertions_changed_since_served_from_change_log(self):
+        test_user = self.setup_user(authenticate=False, token_scope='r:assertions')
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        application = AccessToken.objects.get(user=test_user).application
+
+        # an earner who authorized the application, awarded a badge by someone else's issuer
+        earner = self.setup_user(email='earner@example.com', authenticate=False)
+        AccessToken.objects.create(user=earner, application=application, scope='r:backpack', token='earner',
+                                   expires=timezone.now() + datetime.timedelta(hours=1))
+        other_badgeclass = self.setup_badgeclass(issuer=self.setup_issuer(owner=self.setup_user(authenticate=False)))
+        earned = other_badgeclass.issue(recipient_id='earner@example.com')
+        collection = BackpackCollection.objects.create(created_by=earner, name='Shared')
+        BackpackCollectionBadgeInstance.objects.create(collection=collection, badgeinstance=earned)
+        # not in one of the earner's collections, so not shared with the application
+        other_badgeclass.issue(recipient_id='earner@example.com')
+        other_badgeclass.issue(recipient_id='stranger@example.com')
+
+        first = test_badgeclass.issue(recipient_id='first@example.com')
+        second = test_badgeclass.issue(recipient_id='second@example.com')
+        second.recipient_identifier = 'second.updated@example.com'
+        second.save()
+
+        response = self.client.get('/v2/assertions/changed')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a['entityId'] for a in response.data['result']],
+                         [earned.entity_id, first.entity_id, second.entity_id])
+        self.assertEqual(response.data['deleted'], [])
+        cursor = response.data['pagination']['nextCursor']
+        self.assertIsNotNone(cursor)
+
+        # nothing has changed since, poll again from the same cursor
+        response = self.client.get('/v2/assertions/changed', {'cursor': cursor})
+        self.assertEqual(response.data['result'], [])
+        self.assertEqual(response.data['pagination']['nextCursor'], cursor)
+
+        first.revoke('for testing')
+        second_entity_id = second.entity_id
+        second.delete()
+
+        with self.assertNumQueries(2):
+            changes = list(BadgeInstanceChange.objects.changes_for(
+                issuer_ids=[test_issuer.pk], badgeinstance_ids=[earned.pk],
+                since=first.updated_at).order_by('pk'))
+        self.assertEqual([(c.entity_id, c.action) for c in changes], [
+            (first.entity_id, BadgeInstanceChange.ACTION_REVOKED),
+            (second_entity_id, BadgeInstanceChange.ACTION_DELETED)])
+
+        response = self.client.get('/v2/assertions/changed', {'cursor': cursor})
+        self.assertEqual([(a['entityId'], a['revoked']) for a in response.data['result']], [(first.entity_id, True)])
+        self.assertEqual(response.data['deleted'], [second_entity_id])
+
+        response = self.client.get('/v2/assertions/changed', {'since': timezone.now().isoformat()})
+        self.assertEqual(response.data['result'], [])
+
+    def test_backfill_badgeinstance_changes(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        logged = test_badgeclass.issue(recipient_id='logged@example.com')
+        unlogged = test_badgeclass.issue(recipient_id='unlogged@example.com')
+        unlogged.revoke('for testing')
+        # as if issued before the change log existed
+        BadgeInstanceChange.objects.filter(badgeinstance_id=unlogged.pk).delete()
+
+        out = StringIO.StringIO()
+        call_command('backfill_badgeinstance_changes', chunk_size=1, stdout=out)
+        self.assertIn("Logged 1 assertions", out.getvalue())
+        change = BadgeInstanceChange.objects.get(badgeinstance_id=unlogged.pk)
+        self.assertEqual(change.action, BadgeInstanceChange.ACTION_REVOKED)
+        self.assertEqual(change.recipient_identifier, 'unlogged@example.com')
+        self.assertEqual(BadgeInstanceChange.objects.filter(badgeinstance_id=logged.pk).count(), 1)
+
+    def test_v2_sparse_fieldsets(self):
+        test_user = self.setup_user(authenticate=True)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        test_assertion = test_badgeclass.issue(recipient_id='new.recipient@email.test')
+
+        # fields that aren't serialized are never read
+        def fail(instance):
+            raise AssertionError("extension_items should not have been read")
+        extension_items = BadgeInstance.extension_items
+        BadgeInstance.extension_items = property(fail)
+        self.addCleanup(setattr, BadgeInstance, 'extension_items', extension_items)
+
+        url = '/v2/badgeclasses/{}/assertions'.format(test_badgeclass.entity_id)
+        response = self.client.get(url, {'fields': 'recipient,issuedOn'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['result'][0].keys()), {'entityType', 'entityId', 'recipient', 'issuedOn'})
+        self.assertEqual(response.data['result'][0]['recipient']['plaintextIdentity'], 'new.recipient@email.test')
+
+        response = self.client.get('/v2/assertions/{}'.format(test_assertion.entity_id), {'exclude': 'extensions,evidence'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('evidence', response.data['result'][0])
+        self.assertNotIn('extensions', response.data['result'][0])
+        self.assertIn('badgeclass', response.data['result'][0])
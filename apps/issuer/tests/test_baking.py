@@ -0,0 +1,75 @@
+# encoding: utf-8
+from __future__ import unicode_literals
+
+import json
+import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from openbadges_bakery import bake, unbake
+
+from issuer.baking import BakeTemplate, BakeTemplateCache, bake_templates
+from mainsite.tests import BadgrTestCase, SetupIssuerHelper
+
+
+class BakeTemplateTests(SetupIssuerHelper, BadgrTestCase):
+    assertion_json = json.dumps({
+        'uid': 'abc123',
+        'verify': {'type': 'hosted', 'url': 'http://example.com/public/assertions/abc123?v=1_1'}
+    }, indent=2)
+
+    def _assert_template_matches_bakery(self, image_path, assertion_string=None):
+        if assertion_string is None:
+            assertion_string = self.assertion_json
+        expected = StringIO.StringIO()
+        with open(image_path, 'rb') as image_file:
+            bake(image_file=image_file, assertion_json_string=assertion_string, output_file=expected)
+
+        with open(image_path, 'rb') as image_file:
+            template = BakeTemplate.from_file(image_file)
+        actual = template.bake(assertion_string, StringIO.StringIO())
+
+        self.assertEqual(actual.getvalue(), expected.getvalue())
+        return actual
+
+    def test_png_template_matches_bakery(self):
+        actual = self._assert_template_matches_bakery(self.get_test_image_path())
+        self.assertEqual(json.loads(unbake(actual)), json.loads(self.assertion_json))
+
+    def test_svg_template_matches_bakery(self):
+        actual = self._assert_template_matches_bakery(self.get_test_svg_image_path())
+        self.assertEqual(json.loads(unbake(actual)), json.loads(self.assertion_json))
+
+        # the svg assertion node is built locally, pin it to the bakery's for the other kinds of assertion strings
+        self._assert_template_matches_bakery(self.get_test_svg_image_path(), json.dumps({'uid': 'abc123'}))
+        self._assert_template_matches_bakery(self.get_test_svg_image_path(),
+                                             'http://example.com/public/assertions/abc123')
+
+    def test_template_cache_follows_badgeclass_image(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+
+        cache = BakeTemplateCache(max_size=2)
+        template = cache.get(test_badgeclass)
+        self.assertEqual(template.image_type, 'PNG')
+        self.assertIs(cache.get(test_badgeclass), template)
+
+        with open(self.get_test_svg_image_path(), 'rb') as svg_file:
+            test_badgeclass.image = SimpleUploadedFile('test_badgeclass.svg', svg_file.read(), 'image/svg+xml')
+        test_badgeclass.save()
+
+        new_template = cache.get(test_badgeclass)
+        self.assertEqual(new_template.image_type, 'SVG')
+        self.assertEqual(len(cache._templates), 1)
+
+    def test_issued_assertion_uses_template(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        bake_templates.clear()
+
+        assertion = test_badgeclass.issue(recipient_id='new.recipient@email.test')
+        self.assertEqual(len(bake_templates._templates), 1)
+
+        baked_json = json.loads(unbake(assertion.image))
+        self.assertEqual(baked_json.get('uid'), assertion.entity_id)
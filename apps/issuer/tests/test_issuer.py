@@ -4,11 +4,13 @@ from __future__ import unicode_literals
 import os.path
 
 import os
+import unittest
 from django.contrib.auth import get_user_model
 from django.core.files.images import get_image_dimensions
+from django.db import connection
 
 from badgeuser.models import CachedEmailAddress
-from issuer.models import Issuer, BadgeClass
+from issuer.models import Issuer, BadgeClass, BadgeInstance
 from mainsite.tests.base import BadgrTestCase, SetupIssuerHelper
 
 
@@ -300,3 +302,89 @@ class IssuerTests(SetupIssuerHelper, BadgrTestCase):
         response = self.client.delete('/v1/issuer/issuers/{slug}'.format(slug=test_issuer.entity_id), {})
         self.assertEqual(response.status_code, 400)
 
+    def _query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # the test tables are tiny, make the planner show the index it would use on a large one
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(explain + sql, params)
+            return ' '.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+    def _index_on(self, table, columns):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        for name, constraint in constraints.items():
+            if constraint['index'] and constraint['columns'] == columns:
+                return name
+
+    def test_issuer_badgeinstances_in_one_query(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        for badgeclass in self.setup_badgeclasses(how_many=3, issuer=test_issuer):
+            badgeclass.issue(recipient_id='new.recipient@email.test')
+            badgeclass.issue(recipient_id='second.recipient@email.test')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(test_issuer.cached_badgeinstances())), 6)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(test_issuer.get_badgeinstances(
+                revoked=False, recipient_identifier='new.recipient@email.test'))), 3)
+
+    @unittest.skipUnless(connection.vendor in ('sqlite', 'mysql', 'postgresql'), "EXPLAIN syntax varies by database")
+    def test_issuer_badgeinstances_query_plan(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        table = test_badgeclass.badgeinstances.model._meta.db_table
+        badgeclass_table = test_badgeclass._meta.db_table
+
+        # before: the issuer list went through each of the issuer's badgeclasses
+        plan = self._query_plan(BadgeInstance.objects.filter(badgeclass__issuer=test_issuer, revoked=False))
+        self.assertIn(badgeclass_table, plan)
+
+        # after: it filters by issuer and revoked in a single index search, without the badgeclass table
+        issuer_index = self._index_on(table, ['issuer_id', 'revoked'])
+        self.assertIsNotNone(issuer_index)
+        plan = self._query_plan(test_issuer.get_badgeinstances(revoked=False))
+        self.assertIn(issuer_index, plan)
+        self.assertNotIn(badgeclass_table, plan)
+
+        # the badgeclass list and recipient_count() filter by badgeclass and revoked
+        badgeclass_index = self._index_on(table, ['badgeclass_id', 'revoked'])
+        self.assertIsNotNone(badgeclass_index)
+        plan = self._query_plan(test_badgeclass.badgeinstances.filter(revoked=False))
+        self.assertIn(badgeclass_index, plan)
+
+    def test_conditional_get_issuer(self):
+        test_user = self.setup_user(authenticate=True)
+        test_issuer = self.setup_issuer(owner=test_user)
+        other_user = self.setup_user(authenticate=False)
+        url = '/v2/issuers/{}'.format(test_issuer.entity_id)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # staff changes don't bump updated_at, so there's no Last-Modified to revalidate on
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        # v1 responses include related object counts and aren't revalidated
+        response = self.client.get('/v1/issuer/issuers/{}'.format(test_issuer.entity_id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+        # staff changes don't bump the issuer's entity_version, but change its etag
+        response = self.client.post('/v1/issuer/issuers/{}/staff'.format(test_issuer.entity_id), {
+            'action': 'add',
+            'email': other_user.primary_email
+        })
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['result'][0]['staff']), 2)
@@ -5,13 +5,14 @@ import io
 import json
 
 import responses
+from django.db import transaction
 from django.urls import reverse
 from openbadges.verifier.openbadges_context import OPENBADGES_CONTEXT_V1_URI, OPENBADGES_CONTEXT_V2_URI, \
     OPENBADGES_CONTEXT_V2_DICT
 from openbadges_bakery import unbake
 
 from backpack.tests import setup_resources, setup_basic_1_0
-from issuer.models import Issuer, BadgeInstance
+from issuer.models import Issuer, BadgeInstance, BadgeInstanceEvidence
 from issuer.utils import CURRENT_OBI_VERSION, OBI_VERSION_CONTEXT_IRIS, UNVERSIONED_BAKED_VERSION
 from mainsite.models import BadgrApp
 from mainsite.tests import BadgrTestCase, SetupIssuerHelper
@@ -203,6 +204,48 @@ class PublicAPITests(SetupIssuerHelper, BadgrTestCase):
                     include_extra=True
                 )
 
+    def test_deferred_baking(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+
+        with self.settings(BADGR_DEFER_ASSERTION_BAKING=True):
+            assertion = test_badgeclass.issue(recipient_id='new.recipient@email.test')
+        self.assertFalse(assertion.image)
+
+        # the bake task ran once the assertion was committed
+        self.assertTrue(BadgeInstance.objects.get(pk=assertion.pk).image)
+        self.assertTrue(BadgeInstance.cached.get(entity_id=assertion.entity_id).image)
+
+        response = self.client.get('/public/assertions/{}/image'.format(assertion.entity_id), follow=True)
+        self.verify_baked_image_response(assertion, response, obi_version=UNVERSIONED_BAKED_VERSION)
+
+        with self.settings(BADGR_DEFER_ASSERTION_BAKING=True), transaction.atomic():
+            (assertion, error), = BadgeInstance.objects.bulk_issue(test_badgeclass, [
+                dict(recipient_identifier='bulk.recipient@email.test', notify=False)])
+            # not baked until the outer transaction commits
+            self.assertFalse(BadgeInstance.objects.get(pk=assertion.pk).image)
+        self.assertTrue(BadgeInstance.objects.get(pk=assertion.pk).image)
+
+    def test_get_assertion_image_before_baking(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        assertion = test_badgeclass.issue(recipient_id='new.recipient@email.test')
+
+        # simulate a bake task that hasn't run yet
+        BadgeInstance.objects.filter(pk=assertion.pk).update(image='')
+        BadgeInstance.objects.get(pk=assertion.pk).publish()
+
+        with self.settings(BADGR_BAKE_ON_DEMAND=False):
+            response = self.client.get('/public/assertions/{}/image'.format(assertion.entity_id), follow=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].endswith(test_badgeclass.image.url))
+
+        response = self.client.get('/public/assertions/{}/image'.format(assertion.entity_id), follow=True)
+        self.verify_baked_image_response(assertion, response, obi_version=UNVERSIONED_BAKED_VERSION)
+        self.assertTrue(BadgeInstance.objects.get(pk=assertion.pk).image)
+
     def test_cache_updated_on_issuer_update(self):
         original_badgeclass_name = 'Original Badgeclass Name'
         new_badgeclass_name = 'new badgeclass name'
@@ -222,3 +265,74 @@ class PublicAPITests(SetupIssuerHelper, BadgrTestCase):
         response = self.client.get('/public/assertions/{}?expand=badge'.format(assertion.entity_id), Accept='application/json')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data.get('badge', {}).get('name', None), new_badgeclass_name)
+
+    def test_conditional_get_assertion_json(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        assertion = test_badgeclass.issue(recipient_id='new.recipient@email.test')
+        url = '/public/assertions/{}?expand=badge'.format(assertion.entity_id)
+
+        response = self.client.get(url, Accept='application/json')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get('/public/assertions/{}'.format(assertion.entity_id), Accept='application/json')
+        self.assertNotEqual(response['ETag'], etag)
+
+        get_json = BadgeInstance.__dict__['get_json']
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("revalidation should not render the assertion")
+        BadgeInstance.get_json = _fail
+        try:
+            with self.assertNumQueries(0):
+                response = self.client.get(url, Accept='application/json', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+
+            response = self.client.get(url, Accept='application/json', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+        finally:
+            BadgeInstance.get_json = get_json
+
+        # the expanded badgeclass changing changes the etag
+        test_badgeclass.name = 'new badgeclass name'
+        test_badgeclass.save()
+        response = self.client.get(url, Accept='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['badge']['name'], 'new badgeclass name')
+
+    def test_rendered_json_is_cached(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        assertion = test_badgeclass.issue(recipient_id='new.recipient@email.test', evidence=[{'evidence_url': 'http://example.com/evidence/1'}])
+        url = '/public/assertions/{}?expand=badge&expand=unknown'.format(assertion.entity_id)
+
+        response = self.client.get(url, Accept='application/json')
+        self.assertEqual(response.status_code, 200)
+        content, content_type = response.content, response['Content-Type']
+
+        get_json = BadgeInstance.__dict__['get_json']
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("cached responses should not be rendered")
+        BadgeInstance.get_json = _fail
+        try:
+            with self.assertNumQueries(0):
+                response = self.client.get('/public/assertions/{}?expand=badge'.format(assertion.entity_id),
+                                           Accept='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, content)
+            self.assertEqual(response['Content-Type'], content_type)
+            self.assertTrue(response.has_header('ETag'))
+        finally:
+            BadgeInstance.get_json = get_json
+
+        # adding evidence doesn't bump the assertion's entity_version, but publishing it drops the cached response
+        BadgeInstanceEvidence.objects.create(badgeinstance=assertion, evidence_url='http://example.com/evidence/2')
+        response = self.client.get(url, Accept='application/json')
+        self.assertEqual(len(json.loads(response.content)['evidence']), 2)
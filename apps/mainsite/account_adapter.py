@@ -21,12 +21,18 @@ from mainsite.utils import OriginSetting
 class BadgrAccountAdapter(DefaultAccountAdapter):
 
     def send_mail(self, template_prefix, email, context):
+        msg = self.build_mail(template_prefix, email, context)
+        msg.send()
+
+    def build_mail(self, template_prefix, email, context):
+        """
+        Render the message send_mail() would send, so callers can send many over a single connection.
+        """
         context['STATIC_URL'] = getattr(settings, 'STATIC_URL')
         context['HTTP_ORIGIN'] = getattr(settings, 'HTTP_ORIGIN')
         context['unsubscribe_url'] = getattr(settings, 'HTTP_ORIGIN') + EmailBlacklist.generate_email_signature(email)
 
-        msg = self.render_mail(template_prefix, email, context)
-        msg.send()
+        return self.render_mail(template_prefix, email, context)
 
     def is_open_for_signup(self, request):
         return getattr(settings, 'OPEN_FOR_SIGNUP', True)
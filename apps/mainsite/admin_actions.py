@@ -10,6 +10,8 @@ from django.template.response import TemplateResponse
 from django.utils.encoding import force_text
 from django.utils.translation import ugettext_lazy, ugettext as _
 
+from mainsite.publish import publish_batch
+
 
 def delete_selected(modeladmin, request, queryset):
     """
@@ -37,10 +39,12 @@ def delete_selected(modeladmin, request, queryset):
             raise PermissionDenied
         n = queryset.count()
         if n:
-            for obj in queryset:
-                obj_display = force_text(obj)
-                modeladmin.log_deletion(request, obj, obj_display)
-                obj.delete()
+            # objects often share parents, publish each of them once
+            with publish_batch():
+                for obj in queryset:
+                    obj_display = force_text(obj)
+                    modeladmin.log_deletion(request, obj, obj_display)
+                    obj.delete()
             modeladmin.message_user(request, _("Successfully deleted %(count)d %(items)s.") % {
                 "count": n, "items": model_ngettext(modeladmin.opts, n)
             }, messages.SUCCESS)
@@ -0,0 +1,49 @@
+# encoding: utf-8
+"""
+Request scoped identity map for cached model lookups.
+
+Serializing a list looks up the same few issuers, badgeclasses and users once per item through
+Model.cached.get(), each time fetching and unpickling a new copy from the cache. While an identity map is active
+(for the duration of a request, see mainsite.middleware.IdentityMapMiddleware), mainsite.managers.CacheModelManager
+keeps the object it loads for each lookup and returns that same instance to later lookups in the request.
+
+The map is emptied whenever a CacheModel is saved, deleted or published, so later lookups see the change.
+"""
+from __future__ import unicode_literals
+
+import threading
+
+import cachemodel
+from django.db.models.signals import post_delete, post_save
+
+_local = threading.local()
+
+
+def get_identity_map():
+    """
+    Return the active identity map for this thread (a dict of cache key -> object), or None.
+    """
+    return getattr(_local, 'identity_map', None)
+
+
+def activate_identity_map():
+    _local.identity_map = {}
+
+
+def deactivate_identity_map():
+    _local.identity_map = None
+
+
+def clear_identity_map():
+    identity_map = get_identity_map()
+    if identity_map:
+        identity_map.clear()
+
+
+def _clear_on_change(sender, **kwargs):
+    if issubclass(sender, cachemodel.CacheModel):
+        clear_identity_map()
+
+
+post_save.connect(_clear_on_change, dispatch_uid='mainsite.identity_map.post_save')
+post_delete.connect(_clear_on_change, dispatch_uid='mainsite.identity_map.post_delete')
@@ -0,0 +1,29 @@
+# encoding: utf-8
+from __future__ import unicode_literals
+
+import timeit
+
+from cryptography.fernet import Fernet
+from django.core.management import BaseCommand
+
+from mainsite.pagination import EncryptedCursorPagination, SignedCursorPagination
+
+
+class Command(BaseCommand):
+    help = "Time encoding and decoding a pagination cursor with Fernet encryption vs. an HMAC signature"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        cursor = str('2147483647:')
+
+        encrypted = EncryptedCursorPagination()
+        encrypted.crypto = Fernet(Fernet.generate_key())
+        encrypted.encrypt = True
+
+        for name, paginator in (('encrypted', encrypted), ('signed', SignedCursorPagination())):
+            duration = min(timeit.repeat(lambda: paginator._decode_cursor(paginator._encode_cursor(cursor)),
+                                         number=iterations, repeat=3))
+            self.stdout.write("{}: {:.1f}us per cursor round trip".format(name, duration * 1000000 / iterations))
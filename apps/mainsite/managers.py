@@ -1,12 +1,31 @@
 # Created by wiggins@concentricsky.com on 4/18/16.
 import cachemodel
+from cachemodel.utils import generate_cache_key
 from django.conf import settings
 from django.core.urlresolvers import resolve, Resolver404
 
+from mainsite.identity_map import get_identity_map
 from mainsite.utils import OriginSetting
 
 
-class SlugOrJsonIdCacheModelManager(cachemodel.CacheModelManager):
+class CacheModelManager(cachemodel.CacheModelManager):
+    """
+    A CacheModelManager whose get() returns the instance this request already looked up, if any.
+    See mainsite.identity_map.
+    """
+    def get(self, **kwargs):
+        identity_map = get_identity_map()
+        if identity_map is None:
+            return super(CacheModelManager, self).get(**kwargs)
+
+        key = generate_cache_key([self.model.__name__, "get"], **kwargs)
+        obj = identity_map.get(key)
+        if obj is None:
+            obj = identity_map[key] = super(CacheModelManager, self).get(**kwargs)
+        return obj
+
+
+class SlugOrJsonIdCacheModelManager(CacheModelManager):
     def __init__(self, slug_kwarg_name='slug', slug_field_name='slug'):
         super(SlugOrJsonIdCacheModelManager, self).__init__()
         self.slug_kwarg_name = slug_kwarg_name
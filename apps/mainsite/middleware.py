@@ -1,5 +1,6 @@
 from django import http
 from mainsite import settings
+from mainsite.identity_map import activate_identity_map, deactivate_identity_map
 
 
 class MaintenanceMiddleware(object):
@@ -22,3 +23,13 @@ class TrailingSlashMiddleware(object):
             if request.path != '/' and request.path[-1] == '/':
                 return http.HttpResponsePermanentRedirect(request.path[:-1])
         return None
+
+
+class IdentityMapMiddleware(object):
+    """Scope the identity map of cached model lookups (see mainsite.identity_map) to each request"""
+    def process_request(self, request):
+        activate_identity_map()
+
+    def process_response(self, request, response):
+        deactivate_identity_map()
+        return response
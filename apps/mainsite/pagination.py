@@ -1,12 +1,18 @@
+import datetime
+import json
 from collections import OrderedDict
 
 import more_itertools
 
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
 
 from django.conf import settings
-from django.db import transaction
+from django.core import signing
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections, transaction
+from django.db.models import Q, QuerySet
 
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import BasePagination
 from rest_framework.response import Response
 from rest_framework.utils.urls import replace_query_param
@@ -128,11 +134,26 @@ class EncryptedCursorPagination(BasePagination):
 
     # Model field to use for ordering.  Must be unique, not null, and monotonically increasing.
     #
-    # TODO: Add support for non-unique keys.  This should be possible by adding support for ordering by multiple fields.
-    # For example, ordering = ('non_unique_field', 'pk') would fully disambiguate records. Would require  compound index
-    # on those fields for efficient queries.
+    # May also be a tuple of not null fields of the model that are unique together, eg. ('-issued_on', '-pk') to order
+    # by a non-unique field and disambiguate on pk. A field prefixed with '-' is ordered descending. Efficient queries
+    # need a compound index on those fields.
     ordering = 'pk'
 
+    # When every field of a composite ordering has the same direction, compare keys with a row value predicate,
+    # eg. (issued_on, id) < (%s, %s), which the database can answer with a single index range scan. Mixed directions,
+    # and backends that don't range-scan row values (mysql), expand the comparison to (a > x) OR (a = x AND b > y).
+    row_value_comparison = True
+
+    # Infer hasPrevious (or hasNext, when paging backwards) from the cursor instead of querying for it, as a cursor is
+    # only handed out by a page with elements on its far side. Saves a query per page, though a page reports a previous
+    # page even if every element before it has been deleted since.
+    infer_from_cursor = False
+
+    # Sign cursors with an HMAC of settings.SECRET_KEY instead of encrypting them. Much cheaper than Fernet, for
+    # orderings whose key values needn't be hidden from clients. Takes precedence over encryption.
+    sign = False
+    signing_salt = 'mainsite.pagination'
+
     pagination_secret_key = getattr(settings, 'PAGINATION_SECRET_KEY', None)
 
     if pagination_secret_key is not None:
@@ -157,11 +178,88 @@ class EncryptedCursorPagination(BasePagination):
 
         raise ValueError('Malformed cursor')
 
+    def _get_ordering(self):
+        """
+        Return the ordering as a list of (field_name, descending) tuples.
+        """
+        ordering = (self.ordering,) if isinstance(self.ordering, basestring) else self.ordering
+        return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+    def _is_composite(self):
+        return not isinstance(self.ordering, basestring)
+
     def _get_elem_key(self, elem):
         """
         Get ordering key for given element.
         """
-        return str(getattr(elem, self.ordering))
+        if not self._is_composite():
+            return str(getattr(elem, self.ordering))
+        return json.dumps([_key_value(getattr(elem, field)) for field, descending in self._get_ordering()],
+                          separators=(',', ':'))
+
+    def _parse_key(self, key):
+        if not self._is_composite():
+            return [key]
+        try:
+            values = json.loads(key)
+        except ValueError:
+            raise ValueError('Malformed cursor')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ValueError('Malformed cursor')
+        return values
+
+    def _order_queryset(self, queryset, reverse=False):
+        return queryset.order_by(*[
+            ('-' if descending != reverse else '') + field for field, descending in self._get_ordering()
+        ])
+
+    def _filter_queryset(self, queryset, key, after, inclusive=False):
+        """
+        Filter queryset to the elements after (or before) key in the paginator's ordering.
+        """
+        values = self._parse_key(key)
+        ordering = self._get_ordering()
+
+        if not self._is_composite():
+            field, descending = ordering[0]
+            lookup = 'gt' if after != descending else 'lt'
+            return queryset.filter(**{'{}__{}{}'.format(field, lookup, 'e' if inclusive else ''): values[0]})
+
+        directions = set(descending for field, descending in ordering)
+        if self.row_value_comparison and len(directions) == 1 and _supports_row_values(queryset):
+            return self._filter_queryset_by_row_value(
+                queryset, values, greater=(after != directions.pop()), inclusive=inclusive)
+
+        # (a, b) > (x, y) is a > x OR (a = x AND b > y)
+        expr = None
+        for i, (field, descending) in enumerate(ordering):
+            lookup = 'gt' if after != descending else 'lt'
+            if inclusive and i == len(ordering) - 1:
+                lookup += 'e'
+            term = Q(**{'{}__{}'.format(field, lookup): values[i]})
+            for prefix_field, prefix_value in zip(ordering[:i], values[:i]):
+                term &= Q(**{prefix_field[0]: prefix_value})
+            expr = term if expr is None else expr | term
+        return queryset.filter(expr)
+
+    def _filter_queryset_by_row_value(self, queryset, values, greater, inclusive=False):
+        """
+        Filter queryset with a single comparison of the ordering columns to values, eg. (a, b) > (x, y).
+        """
+        opts = queryset.model._meta
+        connection = connections[queryset.db]
+        quote_name = connection.ops.quote_name
+
+        columns = []
+        params = []
+        for (name, descending), value in zip(self._get_ordering(), values):
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+            columns.append('{}.{}'.format(quote_name(opts.db_table), quote_name(field.column)))
+            params.append(field.get_db_prep_value(field.to_python(value), connection))
+
+        operator = ('>' if greater else '<') + ('=' if inclusive else '')
+        where = '({}) {} ({})'.format(', '.join(columns), operator, ', '.join(['%s'] * len(params)))
+        return queryset.extra(where=[where], params=params)
 
     def _get_page_cursors(self, page):
         """
@@ -186,6 +284,27 @@ class EncryptedCursorPagination(BasePagination):
         else:
             return decrypted
 
+    def _decode_cursor(self, cursor):
+        if cursor is None:
+            return cursor
+        if self.sign:
+            try:
+                return signing.Signer(salt=self.signing_salt).unsign(cursor)
+            except signing.BadSignature:
+                raise ValueError('Malformed cursor')
+        if self.encrypt:
+            return self._decrypt_cursor(cursor)
+        return cursor
+
+    def _encode_cursor(self, cursor):
+        if cursor is None:
+            return cursor
+        if self.sign:
+            return signing.Signer(salt=self.signing_salt).sign(cursor)
+        if self.encrypt:
+            return self._encrypt_cursor(cursor)
+        return cursor
+
     def _build_url(self, request, cursor):
         if cursor is None:
             return None
@@ -215,50 +334,64 @@ class EncryptedCursorPagination(BasePagination):
         """
         Given a queryset and request, return a page as a list.
         """
-        cursor = request.query_params.get(self.cursor_query_param, None)
-
-        if self.encrypt:
-            cursor = self._decrypt_cursor(cursor)
-
-        lower_limit, upper_limit = self._get_cursor_limits(cursor)
-
-        assert not (lower_limit and upper_limit), "Invalid state"
+        # the cursor came from the client, reject one that can't be decrypted or doesn't hold a key of the ordering
+        try:
+            cursor = self._decode_cursor(request.query_params.get(self.cursor_query_param, None))
+            lower_limit, upper_limit = self._get_cursor_limits(cursor)
+
+            assert not (lower_limit and upper_limit), "Invalid state"
+
+            if lower_limit is not None:
+                page_queryset = self._order_queryset(self._filter_queryset(queryset, lower_limit, after=True))
+                edge_queryset = self._order_queryset(
+                    self._filter_queryset(queryset, lower_limit, after=False, inclusive=True), reverse=True)
+            elif upper_limit is not None:
+                page_queryset = self._order_queryset(
+                    self._filter_queryset(queryset, upper_limit, after=False), reverse=True)
+                edge_queryset = self._order_queryset(
+                    self._filter_queryset(queryset, upper_limit, after=True, inclusive=True))
+        except (ValueError, InvalidToken, DjangoValidationError):
+            raise ValidationError({self.cursor_query_param: ["Invalid cursor"]})
 
         if lower_limit is not None:
-            with transaction.atomic():
-                # Select up page_size + 1 elements in forward order to populate page and hasNext
-                padded_page = queryset.filter(**{self.ordering + '__gt': lower_limit}) \
-                                      .order_by(self.ordering)[:self.page_size + 1]
-                # Select element for hasPrevious
-                prev_elem = queryset.filter(**{self.ordering + '__lte': lower_limit}) \
-                                    .order_by('-' + self.ordering) \
-                                    .first()
+            # Select up page_size + 1 elements in forward order to populate page and hasNext
+            padded_page = page_queryset[:self.page_size + 1]
+            if self.infer_from_cursor:
+                # the cursor was the nextCursor of the page before this one
+                padded_page = list(padded_page)
+                prev_elem = True
+            else:
+                with transaction.atomic():
+                    padded_page = list(padded_page)
+                    # Select element for hasPrevious
+                    prev_elem = edge_queryset.first()
 
             page, next_elem = self._partition_padded_page(padded_page)
         elif upper_limit is not None:
-            with transaction.atomic():
-                # Select up page_size + 1 elements in reverse order to populate page and hasPrevious
-                padded_page = queryset.filter(**{self.ordering + '__lt': upper_limit}) \
-                                      .order_by('-' + self.ordering)[:self.page_size + 1]
-                # Select element for hasNext
-                next_elem = queryset.filter(**{self.ordering + '__gte': upper_limit}) \
-                                    .order_by(self.ordering) \
-                                    .first()
+            # Select up page_size + 1 elements in reverse order to populate page and hasPrevious
+            padded_page = page_queryset[:self.page_size + 1]
+            if self.infer_from_cursor:
+                # the cursor was the previousCursor of the page after this one
+                padded_page = list(padded_page)
+                next_elem = True
+            else:
+                with transaction.atomic():
+                    padded_page = list(padded_page)
+                    # Select element for hasNext
+                    next_elem = edge_queryset.first()
 
             page, prev_elem = self._partition_padded_page(padded_page)
             page = list(reversed(page))
         else:
             # Select up page_size + 1 elements in forward order to populate page and hasNext
-            padded_page = queryset.order_by(self.ordering)[:self.page_size + 1]
+            padded_page = self._order_queryset(queryset)[:self.page_size + 1]
             prev_elem = None  # Special case--hasPrevious is always False
 
             page, next_elem = self._partition_padded_page(padded_page)
 
         prev_cursor, next_cursor = self._get_page_cursors(page)
-
-        if self.encrypt:
-            prev_cursor = self._encrypt_cursor(prev_cursor)
-            next_cursor = self._encrypt_cursor(next_cursor)
+        prev_cursor = self._encode_cursor(prev_cursor)
+        next_cursor = self._encode_cursor(next_cursor)
 
         self.prev_link = self._build_url(request, prev_cursor)
         self.next_link = self._build_url(request, next_cursor)
@@ -289,3 +422,28 @@ class EncryptedCursorPagination(BasePagination):
             ('previousCursor', self.prev_cursor if self.has_prev else None),
         ])
 
+
+class SignedCursorPagination(EncryptedCursorPagination):
+    """
+    Cheaper cursor pagination for orderings whose key values needn't be confidential, eg. sequence numbers.
+    Cursors are signed rather than encrypted, and each page is a single query.
+    """
+    sign = True
+    infer_from_cursor = True
+
+
+def _supports_row_values(queryset):
+    if not isinstance(queryset, QuerySet):
+        return False
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite':
+        # row values were added in sqlite 3.15
+        return connection.Database.sqlite_version_info >= (3, 15, 0)
+    # mysql accepts row values but doesn't use them for index range scans
+    return connection.vendor == 'postgresql'
+
+
+def _key_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
@@ -0,0 +1,117 @@
+# encoding: utf-8
+"""
+Load the cached relations of many model instances at once.
+
+Each cached_* property or cached_method of an instance does its own cache.get(), and its own query on a miss, so
+serializing a list of N assertions costs a few times N round trips. prefetch_cached() collects the cache keys those
+lookups would use for every instance and relation, reads them with one cache.get_many(), loads the misses with one
+id__in query per relation (caching them for next time), and stores the results on the instances.
+
+A model lists the relations that can be prefetched in its cached_relations, mapping each cached_* name to the model
+field it follows: a ForeignKey for properties that return Model.cached.get(pk=...), or a reverse ForeignKey for
+cached_methods that return all of the related objects. Properties read the prefetched value with get_prefetched(),
+and cached_methods are decorated with @prefetched.
+"""
+from __future__ import unicode_literals
+
+from functools import wraps
+
+from cachemodel import CACHE_FOREVER_TIMEOUT
+from cachemodel.utils import generate_cache_key
+from django.core.cache import cache
+
+from mainsite.identity_map import get_identity_map
+
+PREFETCHED_ATTR = '_prefetched_cached'
+
+
+def get_prefetched(instance, name, default=None):
+    """
+    Return the value prefetch_cached() stored for name on instance, or default.
+    """
+    return instance.__dict__.get(PREFETCHED_ATTR, {}).get(name, default)
+
+
+def prefetched(method):
+    """
+    Decorator for a cached_method without arguments, to return the value prefetch_cached() stored on the instance
+    instead of reading the cache.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        values = self.__dict__.get(PREFETCHED_ATTR, {})
+        if not args and not kwargs and method.__name__ in values:
+            return values[method.__name__]
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+class PrefetchCachedMixin(object):
+    """
+    Leaves the values stored by prefetch_cached() out when the instance is pickled, so they aren't published to the
+    cache along with it.
+    """
+    def __reduce__(self):
+        unpickle, args, data = super(PrefetchCachedMixin, self).__reduce__()
+        data = {k: v for k, v in data.items() if k != PREFETCHED_ATTR}
+        return unpickle, args, data
+
+
+def prefetch_cached(instances, *names):
+    """
+    Load the cached relations names of instances (all of one model) in bulk, see the module docstring.
+    Returns instances as a list.
+    """
+    instances = list(instances)
+    if not instances or not names:
+        return instances
+
+    model = type(instances[0])
+    relations = [(name, model._meta.get_field(model.cached_relations[name])) for name in names]
+
+    # cache key of each (name, instance) pair
+    keys = {}
+    for name, field in relations:
+        for instance in instances:
+            if field.many_to_one:
+                related_pk = getattr(instance, field.attname)
+                if related_pk is not None:
+                    keys[(name, instance.pk)] = generate_cache_key([field.related_model.__name__, 'get'], pk=related_pk)
+            else:
+                keys[(name, instance.pk)] = generate_cache_key([model.__name__, name, instance.pk])
+
+    found = cache.get_many(set(keys.values()))
+
+    loaded = {}
+    for name, field in relations:
+        missing = set(k for (n, pk), k in keys.items() if n == name and k not in found)
+        if not missing:
+            continue
+        if field.many_to_one:
+            missing_pks = set(getattr(i, field.attname) for i in instances if keys.get((name, i.pk)) in missing)
+            for related_pk, obj in field.related_model.objects.in_bulk(missing_pks).items():
+                loaded[generate_cache_key([field.related_model.__name__, 'get'], pk=related_pk)] = obj
+        else:
+            missing_pks = set(i.pk for i in instances if keys[(name, i.pk)] in missing)
+            items_by_pk = {pk: [] for pk in missing_pks}
+            queryset = field.related_model.objects.filter(**{field.field.attname + '__in': missing_pks})
+            for item in queryset.order_by('pk'):
+                items_by_pk[getattr(item, field.field.attname)].append(item)
+            for pk, items in items_by_pk.items():
+                loaded[generate_cache_key([model.__name__, name, pk])] = items
+    if loaded:
+        cache.set_many(loaded, CACHE_FOREVER_TIMEOUT)
+        found.update(loaded)
+
+    identity_map = get_identity_map()
+    for instance in instances:
+        values = instance.__dict__.setdefault(PREFETCHED_ATTR, {})
+        for name, field in relations:
+            key = keys.get((name, instance.pk))
+            if key not in found:
+                continue
+            if identity_map is not None and field.many_to_one:
+                # share one instance of each related object with the rest of the request
+                found[key] = identity_map.setdefault(key, found[key])
+            values[name] = found[key]
+    return instances
@@ -0,0 +1,158 @@
+# encoding: utf-8
+"""
+Coalesce CacheModel.publish() cascades.
+
+Saving a model publishes it, and most models publish their parents too (BadgeInstance -> BadgeClass -> Issuer ->
+each staff BadgeUser, ...). Code that saves many related objects in a loop would republish the same parents
+over and over. Inside a publish_batch() block those publishes are recorded instead, and each distinct object
+is published exactly once when the outermost block exits:
+
+    with publish_batch():
+        for tag in tags:
+            badgeclass.badgeclasstag_set.create(name=tag)
+
+Only publish() methods decorated with @coalesce_publish are deferred. Caches are stale until the batch
+flushes, so don't render responses from cached_* accessors inside a batch.
+"""
+from __future__ import unicode_literals
+
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from mainsite.identity_map import clear_identity_map
+
+
+class PublishBatch(object):
+    def __init__(self):
+        self.depth = 0
+        self.pending = OrderedDict()
+        self.callbacks = []
+        self.published = set()
+        self.publishing = None
+
+    @staticmethod
+    def key_for(obj):
+        return obj._meta.concrete_model._meta.label, obj.pk
+
+    def defer(self, obj):
+        """
+        Record obj to be published when the batch is flushed.
+        Returns False if obj is the object currently being flushed, so its publish() should run now.
+        """
+        key = self.key_for(obj)
+        if key == self.publishing:
+            return False
+        if key not in self.published:
+            # keep the most recently saved copy of each object
+            self.pending.pop(key, None)
+            self.pending[key] = obj
+        return True
+
+    def flush(self):
+        """
+        Publish every pending object once. Cascades from those publishes are deferred onto the same batch,
+        and published in turn unless that object has already been published by this flush.
+        Callbacks registered with after_publish() run once everything pending has been published.
+        """
+        try:
+            while self.pending or self.callbacks:
+                while self.pending:
+                    key, obj = self.pending.popitem(last=False)
+                    self.published.add(key)
+                    if obj.pk is None:
+                        # deleted since it was deferred
+                        continue
+                    self.publishing = key
+                    obj.publish()
+                self.publishing = None
+                if self.callbacks:
+                    self.callbacks.pop(0)()
+        finally:
+            self.pending.clear()
+            self.published.clear()
+            self.callbacks = []
+            self.publishing = None
+
+
+_local = threading.local()
+
+
+def get_publish_batch():
+    """
+    Return the active PublishBatch for this thread, or None if publishes are not being coalesced.
+    """
+    batch = getattr(_local, 'batch', None)
+    if batch is not None and batch.depth > 0:
+        return batch
+    return None
+
+
+def refresh_pending(obj):
+    """
+    If a copy of obj is waiting to be published by the active batch, publish obj instead.
+    For code that writes to the cache directly and would otherwise be overwritten by a stale copy at flush.
+    """
+    batch = get_publish_batch()
+    if batch is not None:
+        key = batch.key_for(obj)
+        if key in batch.pending:
+            batch.pending[key] = obj
+
+
+def after_publish(func):
+    """
+    Call func once the active batch has published everything, or right away if there is no active batch.
+    For work that reads from the cache, such as recomputing derived data after a save.
+    """
+    batch = get_publish_batch()
+    if batch is None:
+        func()
+    else:
+        batch.callbacks.append(func)
+
+
+class publish_batch(object):
+    """
+    Context manager (or decorator) that coalesces publishes until the outermost block exits.
+    Nested blocks join the enclosing batch.
+    """
+    def __enter__(self):
+        batch = getattr(_local, 'batch', None)
+        if batch is None:
+            batch = _local.batch = PublishBatch()
+        batch.depth += 1
+        return batch
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        batch = _local.batch
+        if batch.depth > 1:
+            batch.depth -= 1
+            return
+        try:
+            # publish even if the block raised, as the uncoalesced publishes would have run already.
+            # the batch stays active while flushing so cascades are coalesced too
+            batch.flush()
+        finally:
+            batch.depth = 0
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with publish_batch():
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def coalesce_publish(publish):
+    """
+    Decorate a CacheModel.publish() so it is deferred while a publish_batch() is active.
+    """
+    @wraps(publish)
+    def wrapper(self, *args, **kwargs):
+        batch = get_publish_batch()
+        if batch is not None and batch.defer(self):
+            return
+        clear_identity_map()
+        return publish(self, *args, **kwargs)
+    return wrapper
@@ -1,5 +1,4 @@
 from backports import csv
-import StringIO
 
 from rest_framework import renderers
 
@@ -34,9 +33,22 @@ class CSVDictRenderer(renderers.BaseRenderer):
             fieldnames = data['fieldnames']
             rows = data['rowdicts']
 
-        buff = StringIO.StringIO()
-        writer = csv.DictWriter(buff, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+        return b''.join(self.render_rows(fieldnames, rows))
 
-        return buff.getvalue().encode(self.charset)
+    def render_rows(self, fieldnames, rowdicts):
+        """
+        Generate the rendered csv one row at a time, eg. for a StreamingHttpResponse.
+        rowdicts may be any iterable, and is only read as the rows are consumed.
+        """
+        writer = csv.DictWriter(_Echo(), fieldnames=fieldnames)
+        yield writer.writerow(dict(zip(fieldnames, fieldnames))).encode(self.charset)
+        for row in rowdicts:
+            yield writer.writerow(row).encode(self.charset)
+
+
+class _Echo(object):
+    """
+    A file-like object whose write() returns what was written, so a csv writer returns each row it renders.
+    """
+    def write(self, value):
+        return value
@@ -0,0 +1,44 @@
+# encoding: utf-8
+"""
+Cache the rendered bytes of responses to the public json endpoints.
+
+Every rendering of one entity is stored in a single cache entry, keyed by the entity, holding each variant (view,
+OBI version, expands, ...) the entity has been rendered as, along with the ETag it was rendered at. A rendering is
+only served while the ETag it was stored with matches the current one, and the entity's publish() drops the entry,
+which covers changes to related objects that don't bump entity_version (evidence, alignments, ...).
+"""
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _cache_key(obj):
+    return 'rendered_responses_{}_{}'.format(obj._meta.label, obj.entity_id)
+
+
+def get_rendered_response(obj, variant, etag):
+    """
+    Returns the (content_type, content) that obj was rendered as for variant at etag, or None.
+    """
+    entry = cache.get(_cache_key(obj))
+    if entry is None or variant not in entry:
+        return None
+    stored_etag, content_type, content = entry[variant]
+    if stored_etag != etag:
+        return None
+    return content_type, content
+
+
+def set_rendered_response(obj, variant, etag, content_type, content):
+    if len(content) > getattr(settings, 'BADGR_RENDERED_RESPONSE_CACHE_MAX_SIZE', 256*1024):
+        return
+    key = _cache_key(obj)
+    entry = cache.get(key) or {}
+    entry[variant] = (etag, content_type, content)
+    cache.set(key, entry, getattr(settings, 'BADGR_RENDERED_RESPONSE_CACHE_TIMEOUT', 60*60*24))
+
+
+def invalidate_rendered_responses(obj):
+    if obj.entity_id is not None:
+        cache.delete(_cache_key(obj))
@@ -176,6 +176,9 @@ class OriginalJsonSerializerMixin(serializers.Serializer):
         if hasattr(instance, 'get_filtered_json'):
             # properties in original_json not natively supported
             extra_properties = instance.get_filtered_json()
+            allows = getattr(self, 'sparse_fieldset_allows', None)
+            if extra_properties and allows is not None:
+                extra_properties = {k: v for k, v in extra_properties.items() if allows(k)}
             if extra_properties and len(extra_properties) > 0:
                 representation.update(extra_properties)
 
@@ -183,9 +186,10 @@ class OriginalJsonSerializerMixin(serializers.Serializer):
 
 
 class CursorPaginatedListSerializer(serializers.ListSerializer):
+    pagination_class = EncryptedCursorPagination
 
     def __init__(self, queryset, request, *args, **kwargs):
-        self.paginator = EncryptedCursorPagination()
+        self.paginator = self.pagination_class()
         self.page = self.paginator.paginate_queryset(queryset, request)
         super(CursorPaginatedListSerializer, self).__init__(data=self.page, *args, **kwargs)
 
@@ -159,6 +159,8 @@ class CachingTestCase(TransactionTestCase):
     def setUp(self):
         # scramble the cache key each time
         cache.key_prefix = "test{}".format(str(time.time()))
+        # and start empty, so entries left by earlier tests don't get this test's entries culled
+        cache.clear()
 
 
 @override_settings(
@@ -3,6 +3,7 @@ import urllib
 import urlparse
 import warnings
 
+import cachemodel
 import os
 from allauth.account.models import EmailConfirmation
 from django.core import mail
@@ -11,9 +12,13 @@ from django.core.management import call_command
 from django.test import override_settings, TransactionTestCase
 
 from badgeuser.models import BadgeUser, CachedEmailAddress
+from issuer.models import BadgeClass, BadgeInstance, Issuer
 from mainsite.models import BadgrApp
 from mainsite import TOP_DIR
-from mainsite.tests.base import BadgrTestCase
+from mainsite.identity_map import activate_identity_map, deactivate_identity_map, get_identity_map
+from mainsite.prefetch import PREFETCHED_ATTR, prefetch_cached
+from mainsite.publish import publish_batch
+from mainsite.tests.base import BadgrTestCase, SetupIssuerHelper
 
 
 class TestCacheSettings(TransactionTestCase):
@@ -140,3 +145,120 @@ class TestEmailCleanupCommand(BadgrTestCase):
         self.assertTrue(email_record.primary)
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(BadgeUser.objects.count(), 1)
+
+
+class TestPublishBatch(SetupIssuerHelper, BadgrTestCase):
+    def _count_issuer_publishes(self):
+        published = []
+        original_publish_by = Issuer.publish_by
+
+        def publish_by(issuer, *fields):
+            if fields == ('pk',):
+                published.append(issuer.pk)
+            return original_publish_by(issuer, *fields)
+
+        Issuer.publish_by = publish_by
+        self.addCleanup(setattr, Issuer, 'publish_by', original_publish_by)
+        return published
+
+    def test_related_items_publish_parents_once(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+
+        published = self._count_issuer_publishes()
+        test_badgeclass.tag_items = ['first', 'second', 'third']
+        self.assertEqual(published, [test_issuer.pk])
+
+        cached_badgeclass = BadgeClass.cached.get(pk=test_badgeclass.pk)
+        self.assertEqual(sorted(t.name for t in cached_badgeclass.cached_tags()), ['first', 'second', 'third'])
+
+    def test_nested_batches_publish_when_outermost_exits(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        self.assertEqual(len(test_badgeclass.cached_tags()), 0)
+
+        published = self._count_issuer_publishes()
+        with publish_batch():
+            with publish_batch():
+                test_badgeclass.badgeclasstag_set.create(name='first')
+                test_badgeclass.badgeclasstag_set.create(name='second')
+            self.assertEqual(len(BadgeClass.cached.get(pk=test_badgeclass.pk).cached_tags()), 0)
+            self.assertEqual(published, [])
+
+        self.assertEqual(len(BadgeClass.cached.get(pk=test_badgeclass.pk).cached_tags()), 2)
+        self.assertEqual(published, [test_issuer.pk])
+
+
+class TestIdentityMap(SetupIssuerHelper, BadgrTestCase):
+    def test_lookups_share_instances_until_changed(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+
+        self.assertIsNot(Issuer.cached.get(pk=test_issuer.pk), Issuer.cached.get(pk=test_issuer.pk))
+
+        activate_identity_map()
+        self.addCleanup(deactivate_identity_map)
+        issuer = Issuer.cached.get(pk=test_issuer.pk)
+        self.assertIs(Issuer.cached.get(pk=test_issuer.pk), issuer)
+
+        test_issuer.name = 'Renamed Issuer'
+        test_issuer.save()
+        self.assertEqual(Issuer.cached.get(pk=test_issuer.pk).name, 'Renamed Issuer')
+
+        self.assertIs(Issuer.cached.get(pk=test_issuer.pk), Issuer.cached.get(pk=test_issuer.pk))
+        BadgeUser.cached.get(pk=test_user.pk).publish()
+        self.assertEqual(get_identity_map(), {})
+
+    def test_list_looks_up_creator_once(self):
+        test_user = self.setup_user(authenticate=True)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        for i in range(0, 5):
+            test_badgeclass.issue(recipient_id='recipient{}@email.test'.format(i), created_by=test_user)
+
+        lookups = []
+        original_get = cachemodel.CacheModelManager.__dict__['get']
+
+        def get(manager, **kwargs):
+            lookups.append((manager.model, kwargs))
+            return original_get(manager, **kwargs)
+        cachemodel.CacheModelManager.get = get
+        self.addCleanup(setattr, cachemodel.CacheModelManager, 'get', original_get)
+
+        response = self.client.get('/v2/badgeclasses/{}/assertions'.format(test_badgeclass.entity_id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['result']), 5)
+        self.assertEqual(lookups.count((BadgeUser, {'id': test_user.pk})), 1)
+        self.assertIsNone(get_identity_map())
+
+
+class TestPrefetchCached(SetupIssuerHelper, BadgrTestCase):
+    def test_prefetch_loads_relations_in_bulk(self):
+        test_user = self.setup_user(authenticate=False)
+        test_issuer = self.setup_issuer(owner=test_user)
+        test_badgeclass = self.setup_badgeclass(issuer=test_issuer)
+        for i in range(0, 3):
+            test_badgeclass.issue(recipient_id='recipient{}@email.test'.format(i),
+                                  evidence=[{'evidence_url': 'http://example.com/evidence{}'.format(i)}])
+        cache.clear()
+
+        relations = ('cached_badgeclass', 'cached_issuer', 'cached_evidence', 'cached_extensions')
+        assertions = list(BadgeInstance.objects.filter(badgeclass=test_badgeclass))
+        with self.assertNumQueries(4):
+            prefetch_cached(assertions, *relations)
+        with self.assertNumQueries(0):
+            for assertion in assertions:
+                self.assertEqual(assertion.cached_badgeclass.pk, test_badgeclass.pk)
+                self.assertEqual(assertion.cached_issuer.pk, test_issuer.pk)
+                self.assertEqual(len(assertion.cached_evidence()), 1)
+                self.assertEqual(len(assertion.cached_extensions()), 0)
+
+        # the misses were cached, and prefetched values aren't pickled with the instance
+        assertions[0].publish()
+        assertions = list(BadgeInstance.objects.filter(badgeclass=test_badgeclass))
+        with self.assertNumQueries(0):
+            prefetch_cached(assertions, *relations)
+        self.assertEqual(assertions[0].cached_evidence()[0].evidence_url, 'http://example.com/evidence0')
+        self.assertNotIn(PREFETCHED_ATTR, BadgeInstance.cached.get(pk=assertions[0].pk).__dict__)
@@ -1,12 +1,22 @@
 import json
+import StringIO
 
+import dateutil.parser
+from cryptography.fernet import Fernet
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
 from django_mock_queries.query import MockSet, MockModel
 
+from rest_framework.exceptions import ValidationError
 from rest_framework.renderers import JSONRenderer
 
-from mainsite.pagination import EncryptedCursorPagination
+from issuer.models import BadgeInstance
+from mainsite.models import EmailBlacklist
+from mainsite.pagination import EncryptedCursorPagination, SignedCursorPagination, _supports_row_values
+from mainsite.tests import BadgrTestCase, SetupIssuerHelper
 
 from rest_framework.test import APIRequestFactory
 from rest_framework.request import Request
@@ -63,13 +73,17 @@ class TestEncryptedCursorPagination(TransactionTestCase):
         next_link = 'http://testserver/?{}'.format(urlencode({'cursor': next_cursor})) if next_cursor is not None else next_cursor
         self.assertEqual(self.paginator.next_link, next_link)
 
-    def test_paginate_malformed_cursor_raises_value_error(self):
-        with self.assertRaises(ValueError):
+    def test_paginate_malformed_cursor_raises_validation_error(self):
+        with self.assertRaises(ValidationError):
             self.paginator.paginate_queryset(MockSet(), self._mock_get_request('/?cursor=foo'))
 
-        with self.assertRaises(ValueError):
+        with self.assertRaises(ValidationError):
             self.paginator.paginate_queryset(MockSet(), self._mock_get_request('/?cursor=foo:bar'))
 
+        with self.assertRaises(ValidationError) as context:
+            FernetCursorPagination().paginate_queryset(MockSet(), self._mock_get_request('/?cursor=foo:'))
+        self.assertIn('cursor', context.exception.detail)
+
     def test_paginate_disjoint(self):
         test_cases = [
             # url           input        output    has_prev  prev_cursor  has_next  next_cursor
@@ -170,4 +184,146 @@ class TestEncryptedCursorPagination(TransactionTestCase):
                                          "previousResults": "ddd",
                                          "hasPrevious": "eee",
                                          "previousCursor": "fff",
-                                         "results": "ggg"})
\ No newline at end of file
+                                         "results": "ggg"})
+
+
+class DecryptedCompositeCursorPagination(EncryptedCursorPagination):
+    ordering = ('-issued_on', '-pk')
+    encrypt = False
+    page_size = 3
+
+
+class TestCompositeCursorPagination(SetupIssuerHelper, BadgrTestCase):
+    request_factory = APIRequestFactory()
+
+    def _paginate(self, paginator_class, queryset, cursor=None):
+        paginator = paginator_class()
+        url = '/?{}'.format(urlencode({'cursor': cursor})) if cursor is not None else '/'
+        page = paginator.paginate_queryset(queryset, Request(self.request_factory.get(url)))
+        return paginator, [e.pk for e in page]
+
+    def test_row_value_and_expanded_predicates_page_alike(self):
+        test_user = self.setup_user(authenticate=False)
+        test_badgeclass = self.setup_badgeclass(issuer=self.setup_issuer(owner=test_user))
+        issued_on = [dateutil.parser.parse(d) for d in ('2017-01-01T00:00:00Z', '2017-06-01T12:30:00Z')]
+        for idx in range(8):
+            test_badgeclass.issue(recipient_id='recipient{}@example.com'.format(idx), issued_on=issued_on[idx % 2])
+
+        queryset = BadgeInstance.objects.filter(badgeclass=test_badgeclass)
+        expected = [a.pk for a in sorted(queryset, key=lambda a: (a.issued_on, a.pk), reverse=True)]
+
+        for row_value_comparison in (True, False):
+            paginator_class = type(str('Paginator'), (DecryptedCompositeCursorPagination,),
+                                   {'row_value_comparison': row_value_comparison})
+
+            # forward through every page
+            pks = []
+            cursor = None
+            with CaptureQueriesContext(connection) as queries:
+                while True:
+                    paginator, page = self._paginate(paginator_class, queryset, cursor)
+                    pks.extend(page)
+                    cursor = paginator.next_cursor
+                    if not paginator.has_next:
+                        break
+            self.assertEqual(pks, expected)
+            row_value_sql = '({table}.{issued_on}, {table}.{id}) <'.format(
+                table=connection.ops.quote_name('issuer_badgeinstance'),
+                issued_on=connection.ops.quote_name('issued_on'),
+                id=connection.ops.quote_name('id'))
+            self.assertEqual(any(row_value_sql in q['sql'] for q in queries.captured_queries),
+                             row_value_comparison and _supports_row_values(queryset))
+
+            # and back again from the last page
+            last_page = page
+            pks = []
+            cursor = paginator.prev_cursor
+            while paginator.has_prev:
+                paginator, page = self._paginate(paginator_class, queryset, cursor)
+                pks = page + pks
+                cursor = paginator.prev_cursor
+            self.assertEqual(pks, expected[:-len(last_page)])
+
+    def test_invalid_cursor_rejected(self):
+        test_user = self.setup_user(email='owner@example.com', authenticate=True)
+        test_badgeclass = self.setup_badgeclass(issuer=self.setup_issuer(owner=test_user))
+        test_badgeclass.issue(recipient_id='owner@example.com')
+
+        queryset = BadgeInstance.objects.filter(badgeclass=test_badgeclass)
+        for cursor in ('["not a date",1]:', '[1]:', 'not json:'):
+            with self.assertRaises(ValidationError):
+                self._paginate(DecryptedCompositeCursorPagination, queryset, cursor)
+
+        for url in ('/v2/badgeclasses/{}/assertions'.format(test_badgeclass.entity_id),
+                    '/v2/issuers/{}/assertions'.format(test_badgeclass.cached_issuer.entity_id),
+                    '/v2/backpack/assertions'):
+            response = self.client.get(url, {'cursor': 'tampered'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('cursor', json.dumps(response.data))
+
+
+class FernetCursorPagination(EncryptedCursorPagination):
+    crypto = Fernet(Fernet.generate_key())
+    encrypt = True
+    page_size = 10
+
+
+class SignedTestCursorPagination(SignedCursorPagination):
+    page_size = 10
+
+
+class TestSignedCursorPagination(TestCase):
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        EmailBlacklist.objects.bulk_create(
+            [EmailBlacklist(email='blacklisted{}@example.com'.format(idx)) for idx in range(95)])
+        self.queryset = EmailBlacklist.objects.all()
+
+    def _paginate(self, paginator_class, cursor=None):
+        paginator = paginator_class()
+        url = '/?{}'.format(urlencode({'cursor': cursor})) if cursor is not None else '/'
+        page = paginator.paginate_queryset(self.queryset, Request(self.request_factory.get(url)))
+        return paginator, [e.pk for e in page]
+
+    def _walk(self, paginator_class):
+        """
+        Page forward through every page then back again, returning the pks, pages and queries.
+        """
+        pks = []
+        has_previous = []
+        paginator = None
+        with CaptureQueriesContext(connection) as queries:
+            while paginator is None or paginator.has_next:
+                paginator, page = self._paginate(paginator_class, paginator.next_cursor if paginator else None)
+                pks.extend(page)
+                has_previous.append(paginator.has_prev)
+            while paginator.has_prev:
+                paginator, page = self._paginate(paginator_class, paginator.prev_cursor)
+                self.assertTrue(paginator.has_next)
+        return pks, has_previous, len(queries.captured_queries)
+
+    def test_signed_cursor_pagination_queries(self):
+        encrypted_pks, encrypted_has_previous, encrypted_queries = self._walk(FernetCursorPagination)
+        signed_pks, signed_has_previous, signed_queries = self._walk(SignedTestCursorPagination)
+
+        self.assertEqual(signed_pks, list(self.queryset.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(signed_pks, encrypted_pks)
+        self.assertEqual(signed_has_previous, encrypted_has_previous)
+
+        # 10 pages forward and 9 back: one query per page, instead of two (and a savepoint) per page after the first
+        self.assertEqual(signed_queries, 19)
+        self.assertGreaterEqual(encrypted_queries, 37)
+
+        # cursor encoding times are reported by ./manage.py benchmark_cursors, outside of the test run
+        out = StringIO.StringIO()
+        call_command('benchmark_cursors', iterations=1, stdout=out)
+        self.assertIn('signed', out.getvalue())
+
+    def test_tampered_signed_cursor_raises_validation_error(self):
+        paginator, page = self._paginate(SignedTestCursorPagination)
+        value, signature = paginator.next_cursor.rsplit(':', 1)
+        self.assertEqual(value, '{}:'.format(page[-1]))
+
+        with self.assertRaises(ValidationError):
+            self._paginate(SignedTestCursorPagination, '1:{}'.format(signature))
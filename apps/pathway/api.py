@@ -10,7 +10,7 @@ from mainsite.utils import ObjectView
 from pathway.models import Pathway, PathwayElement
 from pathway.serializers import PathwaySerializer, PathwayListSerializer, PathwayElementSerializer, \
     PathwayElementCompletionSerializer
-from recipient.models import RecipientGroup, RecipientProfile
+from recipient.models import RecipientGroup, RecipientProfile, RecipientPathwayCompletion
 
 
 class PathwayList(AbstractIssuerAPIEndpoint):
@@ -318,14 +318,10 @@ class PathwayElementDetail(PathwayElementAPIEndpoint):
         if issuer is None or pathway is None or element is None:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
-        def deactivate_tree(elem):
-            elem.is_active = False
-            elem.save()
-
-            for child in elem.cached_children():
-                deactivate_tree(child)
-
-        deactivate_tree(element)
+        # loaded fresh rather than from the cached element_tree, whose elements are shared
+        for node in pathway.iter_element_tree(pathway.build_element_tree(element)):
+            node['element'].is_active = False
+            node['element'].save()
         return Response(status=status.HTTP_200_OK)
 
 
@@ -376,11 +372,12 @@ class PathwayCompletionDetail(PathwayElementAPIEndpoint):
         for group in groups:
             recipients.extend([member.recipient_profile for member in group.cached_members()])
 
+        stored_completions = RecipientPathwayCompletion.objects.get_completions(pathway, recipients)
         recipient_completions = []
         for recipient in recipients:
             recipient_completions.append({
                 'recipient': recipient,
-                 'completions': recipient.cached_completions(pathway)
+                'completions': stored_completions[recipient.pk]
             })
 
         serializer = PathwayElementCompletionSerializer(ObjectView({
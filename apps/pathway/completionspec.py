@@ -1,4 +1,6 @@
 # Created by wiggins@concentricsky.com on 4/1/16.
+import copy
+import itertools
 import json
 from collections import OrderedDict
 
@@ -64,6 +66,7 @@ class ElementJunctionCompletionRequirementSpec(CompletionRequirementSpec):
 
     def check_completions(self, tree, instances):
         completions = []
+        instances = earned_badge_index(instances)
 
         def _completion_base(node):
             completion = {
@@ -125,14 +128,9 @@ class BadgeJunctionCompletionRequirementSpec(CompletionRequirementSpec):
         self.badges = set(json_obj.get('badges'))
 
     def check_completion(self, completion, instances=()):
-        completion['completedBadges'] = []
-        for i in instances:
-            if i.cached_badgeclass.json['id'] in self.badges:
-                completion['completedBadges'].append({
-                    '@id': i.cached_badgeclass.jsonld_id,
-                    'slug': i.cached_badgeclass.entity_id,
-                    'assertion': i.jsonld_id,
-                })
+        completion['completedBadges'] = [
+            dict(earned) for earned in earned_badge_index(instances) if earned['@id'] in self.badges
+        ]
         completion['completedRequirementCount'] = len(completion['completedBadges'])
 
         if self.junction_type == CompletionRequirementSpecFactory.JUNCTION_TYPE_DISJUNCTION:
@@ -202,3 +200,203 @@ class CompletionRequirementSpecFactory(object):
                         required_number=junction_required)
         spec.handle_json(json_obj)
         return spec
+
+
+class CompiledCompletionRequirements(object):
+    """
+    The completion requirements of a pathway's element tree, flattened into a list of nodes in the order
+    ElementJunctionCompletionRequirementSpec.check_completions() evaluates them. Badges and nodes are mapped to bit
+    positions, so evaluating a recipient is one pass over the nodes with integer bit operations.
+
+    evaluate() returns the same completion reports as RecipientProfile.cached_completions() always has.
+    """
+    NODE_UNCHECKED = 0
+    NODE_BADGE_JUNCTION = 1
+    NODE_ELEMENT_JUNCTION = 2
+
+    def __init__(self):
+        self.badge_bits = {}
+        self.nodes = []
+        self.root_children = None
+
+    @classmethod
+    def compile(cls, tree):
+        """
+        :param tree: a tree as returned by Pathway.build_element_tree()
+        """
+        compiled = cls()
+        root_spec = CompletionRequirementSpecFactory.parse_element(tree['element'])
+        if not root_spec:
+            # if there is no completionspec, infer one of elementjunction of all children elements
+            root_spec = ElementJunctionCompletionRequirementSpec(
+                junction_type=CompletionRequirementSpecFactory.JUNCTION_TYPE_CONJUNCTION,
+                required_number=len(tree['children']),
+                elements=(c['element'].jsonld_id for c in tree['children'].itervalues()))
+
+        if root_spec.completion_type == CompletionRequirementSpecFactory.BADGE_JUNCTION:
+            compiled._compile_node(tree, root_spec, {})
+            compiled.root_children = _element_references(tree)['children']
+        elif root_spec.completion_type == CompletionRequirementSpecFactory.ELEMENT_JUNCTION:
+            compiled._compile_node(tree, root_spec, {})
+        return compiled
+
+    def _badge_bit(self, badge_id):
+        if badge_id not in self.badge_bits:
+            self.badge_bits[badge_id] = len(self.badge_bits)
+        return self.badge_bits[badge_id]
+
+    def _compile_node(self, node, spec, node_index):
+        element = node['element']
+        compiled_node = {
+            'element': {
+                '@id': element.jsonld_id,
+                'slug': element.slug,
+            },
+            'completion_badge': None,
+            'type': self.NODE_UNCHECKED,
+        }
+        if element.completion_badgeclass:
+            compiled_node['completion_badge'] = {
+                '@id': element.completion_badgeclass.jsonld_id,
+                'slug': element.completion_badgeclass.entity_id,
+            }
+
+        if spec is not None and spec.completion_type == CompletionRequirementSpecFactory.ELEMENT_JUNCTION:
+            for element_id in spec.elements:
+                child = node['children'].get(element_id, None)
+                if child:
+                    self._compile_node(child, _parse_element_spec(child), node_index)
+            # optional children
+            for element_id in set(node['children'].keys()) - set(spec.elements):
+                self._compile_node(node['children'][element_id], _parse_element_spec(node['children'][element_id]), node_index)
+
+            # only elements evaluated before this one can count towards it
+            compiled_node.update({
+                'type': self.NODE_ELEMENT_JUNCTION,
+                'elements': [(element_id, node_index.get(element_id)) for element_id in spec.elements],
+                'required_number': spec.required_number,
+            })
+        elif spec is not None and spec.completion_type == CompletionRequirementSpecFactory.BADGE_JUNCTION:
+            bits = sorted(self._badge_bit(badge_id) for badge_id in spec.badges)
+            compiled_node.update({
+                'type': self.NODE_BADGE_JUNCTION,
+                'bits': bits,
+                'mask': sum(1 << bit for bit in bits),
+                'junction_type': spec.junction_type,
+                'required_number': spec.required_number,
+            })
+
+        node_index[element.jsonld_id] = len(self.nodes)
+        self.nodes.append(compiled_node)
+
+    def evaluate(self, instances):
+        """
+        Returns the completion reports of a recipient who has earned instances.
+
+        :param instances: BadgeInstances, or their entries from earned_badge_index()
+        """
+        earned = 0
+        earned_by_bit = {}
+        for position, earned_badge in enumerate(earned_badge_index(instances)):
+            bit = self.badge_bits.get(earned_badge['@id'], None)
+            if bit is None:
+                continue
+            earned |= 1 << bit
+            earned_by_bit.setdefault(bit, []).append((position, dict(earned_badge)))
+
+        completed = 0
+        completions = []
+        for position, node in enumerate(self.nodes):
+            completion = {
+                'element': dict(node['element']),
+                'completed': False,
+            }
+            if node['completion_badge']:
+                completion['completionBadge'] = dict(node['completion_badge'])
+
+            if node['type'] == self.NODE_ELEMENT_JUNCTION:
+                completion['completedElements'] = [
+                    {'@id': element_id} for element_id, index in node['elements']
+                    if index is not None and completed >> index & 1]
+                completion['completedRequirementCount'] = len(completion['completedElements'])
+                if completion['completedRequirementCount'] >= node['required_number']:
+                    completion['completed'] = True
+
+            elif node['type'] == self.NODE_BADGE_JUNCTION:
+                matched = earned & node['mask']
+                completed_badges = sorted(itertools.chain.from_iterable(
+                    earned_by_bit[bit] for bit in node['bits'] if matched >> bit & 1))
+                completion['completedBadges'] = [badge for idx, badge in completed_badges]
+                completion['completedRequirementCount'] = len(completed_badges)
+                if node['junction_type'] == CompletionRequirementSpecFactory.JUNCTION_TYPE_DISJUNCTION:
+                    if completion['completedRequirementCount'] >= node['required_number']:
+                        completion['completed'] = True
+                elif node['junction_type'] == CompletionRequirementSpecFactory.JUNCTION_TYPE_CONJUNCTION:
+                    if matched == node['mask']:
+                        completion['completed'] = True
+
+            if completion['completed']:
+                completed |= 1 << position
+            completions.append(completion)
+
+        if self.root_children is not None:
+            completions[-1]['children'] = copy.deepcopy(self.root_children)
+        return completions
+
+    def evaluate_batch(self, instances_by_recipient):
+        """
+        Evaluate many recipients at once.
+
+        :param instances_by_recipient: dict of recipient -> list of earned BadgeInstances or earned_badge_index() entries
+        :return: dict of recipient -> completion reports
+        """
+        return {recipient: self.evaluate(instances) for recipient, instances in instances_by_recipient.items()}
+
+
+def earned_badge_index(instances):
+    """
+    Returns the jsonld references completion checks match on for each of instances, in order:
+        [{'@id': badgeclass jsonld id, 'slug': badgeclass entity_id, 'assertion': assertion jsonld id}, ...]
+
+    Entries that are already references are passed through, so an index can be built once and reused.
+    """
+    return [i if isinstance(i, dict) else _earned_badge(i, i.cached_badgeclass) for i in instances]
+
+
+def earned_badge_index_for_recipients(recipient_identifiers):
+    """
+    Returns a dict of recipient_identifier -> earned_badge_index() of their unrevoked assertions, in one query.
+    """
+    from issuer.models import BadgeInstance
+
+    index = {recipient_identifier: [] for recipient_identifier in recipient_identifiers}
+    queryset = BadgeInstance.objects.filter(
+        revoked=False,
+        recipient_identifier__in=index.keys()
+    ).select_related('badgeclass').order_by('pk')
+    for instance in queryset:
+        index[instance.recipient_identifier].append(_earned_badge(instance, instance.badgeclass))
+    return index
+
+
+def _earned_badge(instance, badgeclass):
+    return {
+        '@id': badgeclass.jsonld_id,
+        'slug': badgeclass.entity_id,
+        'assertion': instance.jsonld_id,
+    }
+
+
+def _parse_element_spec(node):
+    if node['element'].completion_requirements:
+        return CompletionRequirementSpecFactory.parse_obj(node['element'].completion_requirements)
+
+
+def _element_references(node):
+    return {
+        'element': {
+            '@id': node['element'].jsonld_id,
+            'slug': node['element'].slug,
+        },
+        'children': {k: _element_references(child) for k, child in node.get('children', {}).items()}
+    }
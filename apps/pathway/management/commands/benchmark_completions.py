@@ -0,0 +1,50 @@
+# encoding: utf-8
+from __future__ import unicode_literals
+
+import timeit
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from issuer.models import BadgeInstance
+from pathway.completionspec import CompletionRequirementSpecFactory
+from pathway.models import Pathway
+from recipient.models import RecipientProfile
+
+
+class Command(BaseCommand):
+    help = "Time a pathway's completion check for a recipient, compiled requirements vs. walking the completion specs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('pathway_slug')
+        parser.add_argument('recipient_identifier')
+        parser.add_argument('--iterations', type=int, default=100)
+
+    def handle(self, *args, **options):
+        try:
+            pathway = Pathway.cached.get(slug=options['pathway_slug'])
+        except Pathway.DoesNotExist:
+            raise CommandError("No pathway {}".format(options['pathway_slug']))
+        profile, _ = RecipientProfile.cached.get_or_create(recipient_identifier=options['recipient_identifier'])
+        iterations = options['iterations']
+
+        tree = pathway.build_element_tree()
+        spec = CompletionRequirementSpecFactory.parse_element(tree['element'])
+        instances = list(BadgeInstance.objects.filter(recipient_identifier=profile.recipient_identifier, revoked=False))
+
+        def check_spec():
+            return spec.check_completions(tree, instances)
+
+        def check_compiled():
+            return profile.cached_completions(pathway)
+
+        if check_spec() != check_compiled():
+            raise CommandError("Compiled completions don't match the completion specs")
+
+        for name, check in (('completion specs', check_spec), ('compiled', check_compiled)):
+            # both are warmed by the comparison above
+            with CaptureQueriesContext(connection) as queries:
+                duration = timeit.timeit(check, number=iterations)
+            self.stdout.write("{}: {:.3f}ms per check, {} queries over {} checks".format(
+                name, duration * 1000 / iterations, len(queries), iterations))
@@ -1,4 +1,5 @@
 # Created by wiggins@concentricsky.com on 3/30/16.
+import time
 import uuid
 
 import cachemodel
@@ -6,14 +7,17 @@ import basic_models
 import itertools
 from autoslug import AutoSlugField
 from basic_models.models import IsActive, CreatedUpdatedAt, CreatedUpdatedBy
+from cachemodel import CACHE_FOREVER_TIMEOUT
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse, resolve, Resolver404
-from django.db import models
+from django.db import models, transaction
 from jsonfield import JSONField
 
 from issuer.models import BadgeClass, Issuer
 from mainsite.managers import SlugOrJsonIdCacheModelManager
+from mainsite.publish import after_publish, coalesce_publish
 from mainsite.utils import OriginSetting
 
 
@@ -28,6 +32,7 @@ class Pathway(cachemodel.CacheModel, IsActive):
     def __unicode__(self):
         return self.jsonld_id
 
+    @coalesce_publish
     def publish(self):
         super(Pathway, self).publish()
         self.publish_by('slug')
@@ -76,11 +81,7 @@ class Pathway(cachemodel.CacheModel, IsActive):
         return self.recipient_groups.all()
 
     def cached_badgeclasses(self):
-        # memoized to improve tree iteration performance
-        if not hasattr(self, '_cached_badgeclasses'):
-            badgeclasses = [[eb.cached_badgeclass for eb in e.cached_badges()] for e in self.cached_elements()]
-            self._cached_badgeclasses = list(itertools.chain.from_iterable(badgeclasses))
-        return self._cached_badgeclasses
+        return list(itertools.chain.from_iterable(node['badgeclasses'] for node in self.iter_element_tree()))
 
 
     def populate_slug(self):
@@ -90,54 +91,169 @@ class Pathway(cachemodel.CacheModel, IsActive):
         name_hint = kwargs.pop('name_hint', None)
         if name_hint:
             self.name_hint = name_hint
-        return super(Pathway, self).save(*args, **kwargs)
+        is_new = self.pk is None
+        ret = super(Pathway, self).save(*args, **kwargs)
+        if is_new:
+            # don't pick up a version, and the data cached with it, left behind by a deleted pathway with this pk
+            cache.set(self._version_key(), int(time.time() * 1000), CACHE_FOREVER_TIMEOUT)
+        else:
+            after_publish(self.bump_version)
+        return ret
+
+    def _version_key(self):
+        return "pathway_version_{}".format(self.pk)
+
+    @property
+    def version(self):
+        """
+        A number that changes whenever this pathway or one of its elements is saved,
+        for keying data derived from the element tree.
+        """
+        version = cache.get(self._version_key())
+        if version is None:
+            # start from the time so a version lost from the cache is never reused
+            cache.add(self._version_key(), int(time.time() * 1000), CACHE_FOREVER_TIMEOUT)
+            version = cache.get(self._version_key())
+        return version
+
+    def bump_version(self):
+        try:
+            cache.incr(self._version_key())
+        except ValueError:
+            cache.set(self._version_key(), int(time.time() * 1000), CACHE_FOREVER_TIMEOUT)
+
+    def __reduce__(self):
+        # don't publish data memoized by _versioned() along with the pathway
+        unpickle, args, data = super(Pathway, self).__reduce__()
+        data = {k: v for k, v in data.items() if k != '_versioned_memo'}
+        return unpickle, args, data
+
+    def _versioned(self, name, build):
+        """
+        Returns build(), cached for the current version of this pathway.
+        """
+        version = self.version
+        memo = self.__dict__.setdefault('_versioned_memo', {})
+        if name in memo and memo[name][0] == version:
+            return memo[name][1]
+
+        key = "pathway_{}_{}_{}".format(name, self.pk, version)
+        value = cache.get(key)
+        if value is None:
+            value = build()
+            cache.set(key, value, getattr(settings, 'BADGR_PATHWAY_COMPILED_REQUIREMENTS_TIMEOUT', 60*60*24))
+        memo[name] = (version, value)
+        return value
+
+    @property
+    def badgeclass_index(self):
+        """
+        A dict of jsonld id -> entity_id of the badgeclasses aligned to this pathway's elements, cached per version.
+        """
+        def _build():
+            index = {}
+            for node in self.iter_element_tree():
+                for badgeclass in node['badgeclasses']:
+                    index[badgeclass.jsonld_id] = badgeclass.entity_id
+            return index
+        return self._versioned('badgeclass_index', _build)
+
+    @property
+    def compiled_requirements(self):
+        """
+        The CompiledCompletionRequirements of this pathway, cached per version.
+        """
+        from pathway.completionspec import CompiledCompletionRequirements
+        return self._versioned('compiled_requirements', lambda: CompiledCompletionRequirements.compile(self.element_tree))
 
     @property
     def element_tree(self):
-        # memoized to improve tree iteration performance
-        if not hasattr(self, '_element_tree'):
-            self._element_tree = self.build_element_tree()
-        return self._element_tree
+        """
+        The tree of build_element_tree(), cached per version. It is shared, so don't modify it.
+        """
+        return self._versioned('element_tree', self.build_element_tree)
+
+    def iter_element_tree(self, node=None):
+        """
+        Yields every node of element_tree, parents before their children.
+        """
+        if node is None:
+            node = self.element_tree
+        yield node
+        for child in node['children'].itervalues():
+            for descendant in self.iter_element_tree(child):
+                yield descendant
 
     def build_element_tree(self, tree_root_element=None):
         """
         Returns a python dict-based structure of nodes and their children
         of a pathway from the tree_root_element down.
 
+        All active elements and their badgeclasses are loaded with two queries, and the nodes are immutable.
+
         :param tree_root_element: PathwayElement
         :return:
         {
             'element': PathwayElement::tree_root_element,
+            'badgeclasses': (BadgeClass, ...),
             'children': {
                 'element_jsonld_id': {
                     'element': PathwayElement,
+                    'badgeclasses': (),
                     'children': {}
                 }
             }
         }
         """
-        if tree_root_element is None:
-            tree_root_element = self.cached_root_element
-
-        index = {}
-        for element in self.cached_elements():
-            index[element.jsonld_id] = element
-
-        tree = {
-            'element': tree_root_element,
-        }
-
-        def _build(parent, node):
-            node['children'] = {}
-            for child in node['element'].cached_children():
-                new_node = {
-                    'element': child,
-                }
-                _build(node, new_node)
-                node['children'][new_node['element'].jsonld_id] = new_node
-
-        _build(None, tree)
-        return tree
+        root_element_id = tree_root_element.pk if tree_root_element is not None else self.root_element_id
+
+        elements = self.pathwayelement_set.filter(is_active=True).select_related('completion_badgeclass')
+        badgeclasses = {}
+        for element_badge in PathwayElementBadge.objects.filter(
+                pathway=self, element__is_active=True).select_related('badgeclass'):
+            badgeclasses.setdefault(element_badge.element_id, []).append(element_badge.badgeclass)
+
+        # compute each element's jsonld_id from the pathway and issuer loaded once
+        issuer_slug = self.cached_issuer.entity_id
+        children = {}
+        root_element = tree_root_element
+        for element in elements:
+            element._jsonld_id = OriginSetting.HTTP+PathwayElement.PathwayElementUrl.format(
+                issuer_slug=issuer_slug,
+                pathway_slug=self.slug,
+                element_slug=element.slug)
+            if element.pk == root_element_id:
+                root_element = element
+            children.setdefault(element.parent_element_id, []).append(element)
+
+        if root_element is None:
+            root_element = self.cached_root_element
+
+        def _build(element, ancestors):
+            # guard against cycles in parent_element
+            ancestors = ancestors | {element.pk}
+            return ElementTreeNode(
+                element=element,
+                badgeclasses=tuple(badgeclasses.get(element.pk, ())),
+                children=ElementTreeNode(
+                    (child.jsonld_id, _build(child, ancestors))
+                    for child in children.get(element.pk, []) if child.pk not in ancestors
+                )
+            )
+        return _build(root_element, frozenset())
+
+
+class ElementTreeNode(dict):
+    """
+    A dict that can't be modified, for the nodes of Pathway.element_tree, which are shared through the cache.
+    """
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("ElementTreeNode does not support item assignment")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
 
 
 class PathwayElement(cachemodel.CacheModel, CreatedUpdatedAt, CreatedUpdatedBy, IsActive):
@@ -166,8 +282,10 @@ class PathwayElement(cachemodel.CacheModel, CreatedUpdatedAt, CreatedUpdatedBy,
         ret = super(PathwayElement, self).save(*args, **kwargs)
         if self.completion_requirements and update_badges:
             self._update_badges_from_completion_requirements()
+        self._schedule_pathway_refresh()
         return ret
 
+    @coalesce_publish
     def publish(self):
         super(PathwayElement, self).publish()
         self.publish_by('slug')
@@ -182,12 +300,31 @@ class PathwayElement(cachemodel.CacheModel, CreatedUpdatedAt, CreatedUpdatedBy,
         pathway.publish()
         if parent_element:
             parent_element.publish()
+        self._schedule_pathway_refresh()
         return ret
 
+    def _schedule_pathway_refresh(self):
+        # stored recipient completions are recomputed from the cached element tree once it has been published
+        from pathway.tasks import schedule_pathway_refresh
+        pathway = self.cached_pathway
+        after_publish(pathway.bump_version)
+        after_publish(lambda: transaction.on_commit(lambda: schedule_pathway_refresh(pathway.pk)))
+
     @cachemodel.cached_method(auto_publish=True)
     def cached_children(self):
         return self.pathwayelement_set.filter(is_active=True)
 
+    def element_tree_children(self):
+        """
+        The active children of this element, read from its pathway's element_tree instead of cached_children() so a
+        render doesn't look up the tree one element at a time.
+        """
+        for node in self.cached_pathway.iter_element_tree():
+            if node['element'].pk == self.pk:
+                return sorted((child['element'] for child in node['children'].itervalues()),
+                              key=lambda e: (e.ordering, e.pk))
+        return self.cached_children()
+
     @cachemodel.cached_method(auto_publish=True)
     def cached_badges(self):
         return self.pathwayelementbadge_set.all()
@@ -286,11 +423,13 @@ class PathwayElementBadge(cachemodel.CacheModel):
     class Meta:
         ordering = ('ordering',)
 
+    @coalesce_publish
     def publish(self):
         super(PathwayElementBadge, self).publish()
         self.publish_by('element', 'badgeclass')
         self.element.publish()
         self.badgeclass.publish()
+        after_publish(self.element.cached_pathway.bump_version)
 
     def delete(self, *args, **kwargs):
         element = self.element
@@ -299,6 +438,7 @@ class PathwayElementBadge(cachemodel.CacheModel):
         self.publish_delete('element', 'badgeclass')
         element.publish()
         badgeclass.publish()
+        after_publish(element.cached_pathway.bump_version)
         return ret
 
     @property
@@ -146,7 +146,7 @@ class PathwayElementSerializer(LinkedDataEntitySerializer):
         representation['alignmentUrl'] = instance.get_alignment_url()
 
         representation['children'] = [
-            child.jsonld_id for child in instance.cached_children()
+            child.jsonld_id for child in instance.element_tree_children()
         ]
 
         if include_requirements and instance.completion_requirements:
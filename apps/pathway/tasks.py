@@ -1,9 +1,10 @@
 # Created by notto@concentricsky and wiggins@concentricsky.com on 5/25/16.
-import itertools
+import hashlib
 from celery.utils.log import get_task_logger
 from django.conf import settings
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import models
 
 import badgrlog
 from mainsite.celery import app
@@ -15,72 +16,214 @@ badgrLogger = badgrlog.BadgrLogger()
 
 @app.task(bind=True)
 def award_badges_for_pathway_completion(self, badgeinstance_pk):
-    from issuer.models import BadgeInstance, BadgeClass
+    """
+    Schedule a completion evaluation of every pathway that badgeinstance's badgeclass is part of.
+    """
+    from issuer.models import BadgeInstance
 
-    lock_key = "_task_lock_completion_trigger_{}".format(badgeinstance_pk)
-    awards = []
-    completions = []
+    try:
+        badgeinstance = BadgeInstance.cached.get(pk=badgeinstance_pk)
+    except BadgeInstance.DoesNotExist:
+        return {'status': 'error', 'error': 'BadgeInstance {} not found'.format(badgeinstance_pk)}
 
-    if _acquire_lock(lock_key, self.request.id):
-        try:
-            # lock acquired
+    if not badgeinstance.cached_recipient_profile:
+        return {'status': 'error', 'awards': [], 'error': 'RecipientProfile not found.'}
 
-            try:
-                badgeinstance = BadgeInstance.cached.get(pk=badgeinstance_pk)
-            except BadgeInstance.DoesNotExist:
-                return {'status': 'error', 'error': 'BadgeInstance {} not found'.format(badgeinstance_pk)}
-
-            badgeclass = badgeinstance.cached_badgeclass
-
-            recipient_profile = badgeinstance.cached_recipient_profile
-            if not recipient_profile:
-                return {'status': 'error', 'awards': [], 'error': 'RecipientProfile not found.'}
-
-            completable_elements = badgeclass.cached_pathway_elements()
-            pathways = set([ce.cached_pathway for ce in completable_elements])
-            if not pathways:
-                return {'status': 'done', 'awards': awards}
-
-            completions = list(itertools.chain.from_iterable([recipient_profile.cached_completions(p) for p in pathways]))
-            for completion in completions:
-                completion_badgeclass = None
-                if 'element' in completion and hasattr(completion['element'], 'completion_badgeclass'):
-                    completion_badgeclass = completion['element'].completion_badgeclass
-                elif 'completionBadge' in completion:
-                    try:
-                        completion_badgeclass = BadgeClass.cached.get(entity_id=completion.get('completionBadge').get('slug'))
-                    except BadgeClass.DoesNotExist:
-                        # got an erroneous badgeclass for a completionBadge
-                        pass
-                    
-                if completion_badgeclass:
-                    try:
-                        awarded_badge = BadgeInstance.objects.get(
-                            recipient_identifier=recipient_profile.recipient_identifier,
-                            badgeclass=completion_badgeclass)
-                        # badge was already awarded
-                    except BadgeInstance.DoesNotExist:
-                        # need to award badge
-                        awarded_badge = completion_badgeclass.issue(
-                            recipient_profile.recipient_identifier,
-                            notify=getattr(settings, 'ISSUER_NOTIFY_DEFAULT', True),
-                            created_by=None
-                        )
-                    awards.append(awarded_badge)
-
-        finally:
-            _release_lock(lock_key)
+    pathway_pks = schedule_badgeclass_pathway_completions(badgeinstance.cached_badgeclass,
+                                                          [badgeinstance.recipient_identifier])
+    return {
+        'status': 'scheduled',
+        'pathways': sorted(pathway_pks)
+    }
+
+
+def schedule_pathway_completion(recipient_identifier, pathway_pk):
+    """
+    Evaluate recipient_identifier's completion of a pathway settings.BADGR_PATHWAY_COMPLETION_DEBOUNCE seconds
+    from now. If an evaluation is already waiting for the same recipient and pathway this does nothing,
+    so a burst of issuances results in one evaluation.
+
+    Returns True if a new evaluation was scheduled.
+    """
+    debounce = getattr(settings, 'BADGR_PATHWAY_COMPLETION_DEBOUNCE', 10)
+    pending_key = _completion_pending_key(recipient_identifier, pathway_pk)
+    if not cache.add(pending_key, True, debounce + 60*5):
+        return False
+
+    try:
+        evaluate_pathway_completion.apply_async(kwargs=dict(
+            recipient_identifier=recipient_identifier,
+            pathway_pk=pathway_pk
+        ), countdown=debounce)
+    except Exception:
+        cache.delete(pending_key)
+        raise
+    return True
+
+
+def schedule_badgeclass_pathway_completions(badgeclass, recipient_identifiers):
+    """
+    Schedule a completion evaluation for each recipient in every pathway that badgeclass is part of,
+    eg. after assertions of badgeclass have been issued or revoked. Returns the pks of those pathways.
+    """
+    pathway_pks = set(element.pathway_id for element in badgeclass.cached_pathway_elements())
+    for recipient_identifier in set(recipient_identifiers):
+        for pathway_pk in pathway_pks:
+            schedule_pathway_completion(recipient_identifier, pathway_pk)
+    return pathway_pks
 
+
+@app.task(bind=True)
+def evaluate_pathway_completion(self, recipient_identifier, pathway_pk):
+    from pathway.models import Pathway
+    from recipient.models import RecipientPathwayCompletion
+
+    # assertions issued from here on need another evaluation
+    cache.delete(_completion_pending_key(recipient_identifier, pathway_pk))
+
+    lock_key = "_task_lock_pathway_completion_{}_{}".format(pathway_pk, _recipient_hash(recipient_identifier))
+    if not _acquire_lock(lock_key, self.request.id):
+        if not self.request.is_eager:
+            # evaluate again once the running evaluation is done, it may have missed the newest assertions
+            schedule_pathway_completion(recipient_identifier, pathway_pk)
         return {
-            'status': 'done',
-            'awards': awards
+            'locked': True,
+            'resume': _lock_resume(lock_key)
         }
+
+    try:
+        try:
+            pathway = Pathway.cached.get(pk=pathway_pk)
+        except Pathway.DoesNotExist:
+            return {'status': 'error', 'error': 'Pathway {} not found'.format(pathway_pk)}
+
+        recipient_profile = _get_recipient_profile(recipient_identifier)
+        if not recipient_profile:
+            return {'status': 'error', 'awards': [], 'error': 'RecipientProfile not found.'}
+
+        completions = recipient_profile.cached_completions(pathway)
+        RecipientPathwayCompletion.objects.update_completions(recipient_profile, pathway, completions)
+        awards = _award_completion_badges(recipient_profile, completions)
+    finally:
+        _release_lock(lock_key)
+
+    return {
+        'status': 'done',
+        'awards': awards
+    }
+
+
+def schedule_pathway_refresh(pathway_pk):
+    """
+    Recompute the stored completions of every recipient in a pathway after its elements have changed.
+    Debounced like schedule_pathway_completion, so editing many elements results in one refresh.
+    """
+    debounce = getattr(settings, 'BADGR_PATHWAY_COMPLETION_DEBOUNCE', 10)
+    pending_key = _refresh_pending_key(pathway_pk)
+    if not cache.add(pending_key, True, debounce + 60*5):
+        return False
+
+    try:
+        refresh_pathway_completions.apply_async(kwargs=dict(pathway_pk=pathway_pk), countdown=debounce)
+    except Exception:
+        cache.delete(pending_key)
+        raise
+    return True
+
+
+@app.task(bind=True)
+def refresh_pathway_completions(self, pathway_pk):
+    from pathway.completionspec import earned_badge_index_for_recipients
+    from pathway.models import Pathway
+    from recipient.models import RecipientPathwayCompletion, RecipientProfile
+
+    cache.delete(_refresh_pending_key(pathway_pk))
+
+    try:
+        pathway = Pathway.objects.get(pk=pathway_pk)
+    except Pathway.DoesNotExist:
+        return {'status': 'error', 'error': 'Pathway {} not found'.format(pathway_pk)}
+
+    recipient_profiles = list(RecipientProfile.objects.filter(
+        models.Q(recipientpathwaycompletion__pathway=pathway) |
+        models.Q(recipientgroup__pathways=pathway)
+    ).distinct())
+
+    # evaluate every recipient against the compiled requirements, with their assertions fetched in one query
+    badgeclasses = pathway.badgeclass_index
+    earned_by_recipient = {
+        recipient_identifier: [e for e in earned if e['@id'] in badgeclasses]
+        for recipient_identifier, earned in earned_badge_index_for_recipients(
+            [r.recipient_identifier for r in recipient_profiles]).items()
+    }
+    completions = pathway.compiled_requirements.evaluate_batch(earned_by_recipient)
+
+    refreshed = []
+    for recipient_profile in recipient_profiles:
+        RecipientPathwayCompletion.objects.update_completions(
+            recipient_profile, pathway, completions[recipient_profile.recipient_identifier])
+        refreshed.append(recipient_profile.pk)
+
     return {
-        'locked': True,
-        'resume': _lock_resume(lock_key)
+        'status': 'done',
+        'refreshed': refreshed
     }
 
 
+def _award_completion_badges(recipient_profile, completions):
+    from issuer.models import BadgeInstance, BadgeClass
+
+    awards = []
+    for completion in completions:
+        completion_badgeclass = None
+        if 'element' in completion and hasattr(completion['element'], 'completion_badgeclass'):
+            completion_badgeclass = completion['element'].completion_badgeclass
+        elif 'completionBadge' in completion:
+            try:
+                completion_badgeclass = BadgeClass.cached.get(entity_id=completion.get('completionBadge').get('slug'))
+            except BadgeClass.DoesNotExist:
+                # got an erroneous badgeclass for a completionBadge
+                pass
+
+        if completion_badgeclass:
+            try:
+                awarded_badge = BadgeInstance.objects.get(
+                    recipient_identifier=recipient_profile.recipient_identifier,
+                    badgeclass=completion_badgeclass)
+                # badge was already awarded
+            except BadgeInstance.DoesNotExist:
+                # need to award badge
+                awarded_badge = completion_badgeclass.issue(
+                    recipient_profile.recipient_identifier,
+                    notify=getattr(settings, 'ISSUER_NOTIFY_DEFAULT', True),
+                    created_by=None
+                )
+            awards.append(awarded_badge)
+    return awards
+
+
+def _get_recipient_profile(recipient_identifier):
+    from recipient.models import RecipientProfile
+    try:
+        return RecipientProfile.cached.get(recipient_identifier=recipient_identifier)
+    except RecipientProfile.MultipleObjectsReturned:
+        return RecipientProfile.objects.filter(recipient_identifier=recipient_identifier).first()
+    except RecipientProfile.DoesNotExist:
+        return None
+
+
+def _recipient_hash(recipient_identifier):
+    return hashlib.md5(recipient_identifier.encode('utf-8')).hexdigest()
+
+
+def _completion_pending_key(recipient_identifier, pathway_pk):
+    return "_pathway_completion_pending_{}_{}".format(pathway_pk, _recipient_hash(recipient_identifier))
+
+
+def _refresh_pending_key(pathway_pk):
+    return "_pathway_refresh_pending_{}".format(pathway_pk)
+
+
 @app.task()
 def resave_all_elements():
     from pathway.models import PathwayElement
@@ -2,8 +2,10 @@
 import json
 
 import os
+import StringIO
 from django.contrib.auth.models import Permission
 from django.core.cache import cache
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.test import override_settings
 from mainsite import TOP_DIR
@@ -15,9 +17,10 @@ from issuer.serializers_v1 import BadgeInstanceSerializerV1
 from mainsite.tests.base import BadgrTestCase, SetupIssuerHelper
 from mainsite.utils import OriginSetting
 from pathway.completionspec import CompletionRequirementSpecFactory
-from pathway.models import PathwayElement
+from pathway.models import Pathway, PathwayElement, PathwayElementBadge
 from pathway.serializers import PathwaySerializer, PathwayElementSerializer
-from recipient.models import RecipientProfile, RecipientGroupMembership, RecipientGroup
+from pathway.tasks import evaluate_pathway_completion, schedule_pathway_completion, _completion_pending_key
+from recipient.models import RecipientProfile, RecipientGroupMembership, RecipientGroup, RecipientPathwayCompletion
 
 
 class PathwayApiTests(SetupIssuerHelper, BadgrTestCase):
@@ -243,6 +246,7 @@ class PathwayApiTests(SetupIssuerHelper, BadgrTestCase):
 )
 class PathwayCompletionTests(SetupIssuerHelper, BadgrTestCase):
     def setUp(self):
+        cache.clear()
         self.test_user, _ = BadgeUser.objects.get_or_create(email='test@example.com')
         self.test_user.user_permissions.add(Permission.objects.get(codename="add_issuer"))
         CachedEmailAddress.objects.get_or_create(user=self.test_user, email='test@example.com', verified=True, primary=True)
@@ -469,6 +473,215 @@ class PathwayCompletionTests(SetupIssuerHelper, BadgrTestCase):
         except BadgeInstance.DoesNotExist:
             self.fail("Completion Badge was not awarded")
 
+    def test_completion_state_stored_per_element(self):
+        pathway = self.build_pathway(creator=self.test_user)
+        recipient = 'testrecipient2@example.com'
+        profile, _ = RecipientProfile.cached.get_or_create(recipient_identifier=recipient)
+
+        badge_instance = self.test_badgeclass.issue(recipient, created_by=self.test_user)
+        stored = RecipientPathwayCompletion.objects.filter(recipient_profile=profile, pathway=pathway)
+        self.assertEqual(stored.count(), 4)
+        self.assertEqual(stored.filter(completed=True).count(), 4)
+        self.assertTrue(stored.get(pathway_element=pathway.root_element).completed)
+
+        with self.assertNumQueries(0):
+            completions = RecipientPathwayCompletion.objects.get_completions(pathway, [profile])[profile.pk]
+        self.assertEqual(completions[-1]['element']['slug'], pathway.root_element.slug)
+        self.assertTrue(completions[-1]['completed'])
+
+        badge_instance.revoke('revoked for testing')
+        self.assertEqual(stored.count(), 4)
+        self.assertEqual(stored.filter(completed=True).count(), 0)
+        self.assertFalse(profile.stored_completions(pathway)[-1]['completed'])
+
+    def test_completion_state_refreshed_on_delete(self):
+        pathway = self.build_pathway(creator=self.test_user)
+        recipient = 'testrecipient2@example.com'
+        profile, _ = RecipientProfile.cached.get_or_create(recipient_identifier=recipient)
+
+        badge_instance = self.test_badgeclass.issue(recipient, created_by=self.test_user)
+        self.assertTrue(profile.stored_completions(pathway)[-1]['completed'])
+
+        badge_instance.delete()
+        stored = RecipientPathwayCompletion.objects.filter(recipient_profile=profile, pathway=pathway)
+        self.assertEqual(stored.filter(completed=True).count(), 0)
+        self.assertFalse(profile.stored_completions(pathway)[-1]['completed'])
+
+        self.client.force_authenticate(user=self.test_user)
+        response = self.client.get(reverse('pathway_completion_detail', kwargs={
+            'issuer_slug': self.test_issuer.entity_id,
+            'pathway_slug': pathway.slug,
+            'element_slug': pathway.root_element.slug
+        }) + '?recipient%5B%5D={}'.format(profile.entity_id))
+        self.assertEqual(response.status_code, 200)
+        completions = response.data['recipientCompletions'][0]['completions']
+        self.assertNotIn(True, [c['completed'] for c in completions])
+
+    def test_completion_evaluation_coalesced_per_recipient(self):
+        pathway = self.build_pathway(creator=self.test_user)
+        completed_badgeclass = self.setup_badgeclass(issuer=self.test_issuer)
+        pathway.root_element.completion_badgeclass = completed_badgeclass
+        pathway.root_element.save()
+
+        recipient = 'testrecipient2@example.com'
+        RecipientProfile.cached.get_or_create(recipient_identifier=recipient)
+
+        # an evaluation is already waiting for this recipient, issuing doesn't schedule another
+        cache.set(_completion_pending_key(recipient, pathway.pk), True)
+        self.assertFalse(schedule_pathway_completion(recipient, pathway.pk))
+        BadgeInstance.objects.bulk_issue(self.test_badgeclass, [
+            dict(recipient_identifier=recipient),
+            dict(recipient_identifier=recipient),
+        ])
+        self.assertFalse(BadgeInstance.objects.filter(badgeclass=completed_badgeclass).exists())
+
+        result = evaluate_pathway_completion.delay(recipient_identifier=recipient, pathway_pk=pathway.pk).get()
+        self.assertEqual(result['status'], 'done')
+        self.assertEqual(BadgeInstance.objects.filter(
+            badgeclass=completed_badgeclass, recipient_identifier=recipient).count(), 1)
+        self.assertIsNone(cache.get(_completion_pending_key(recipient, pathway.pk)))
+
+    def test_element_tree_loaded_in_two_queries(self):
+        pathway = self.build_pathway(creator=self.test_user)
+        pathway = Pathway.cached.get(pk=pathway.pk)
+        pathway.cached_issuer
+
+        with self.assertNumQueries(2):
+            tree = pathway.build_element_tree()
+        self.assertEqual(tree['element'].pk, pathway.root_element_id)
+        self.assertEqual(len(tree['children']), 3)
+        for element_id, child in tree['children'].items():
+            self.assertEqual(child['element'].jsonld_id, element_id)
+            self.assertEqual([b.pk for b in child['badgeclasses']], [self.test_badgeclass.pk])
+        with self.assertRaises(TypeError):
+            tree['children'].pop(tree['children'].keys()[0])
+
+        # cached per pathway version
+        pathway.element_tree
+        with self.assertNumQueries(0):
+            self.assertEqual(len(list(Pathway.cached.get(pk=pathway.pk).iter_element_tree())), 4)
+            self.assertEqual(Pathway.cached.get(pk=pathway.pk).cached_badgeclasses(), [self.test_badgeclass] * 3)
+
+        self.create_element(pathway, {
+            'name': 'Fourth Element', 'description': 'Element numero cuatro', 'parent': pathway.slug
+        }, creator=self.test_user)
+        self.assertEqual(len(list(Pathway.cached.get(pk=pathway.pk).iter_element_tree())), 5)
+
+    def test_element_json_reads_children_from_element_tree(self):
+        pathway = self.build_pathway(creator=self.test_user)
+        first_element = sorted(pathway.cached_root_element.cached_children(), key=lambda e: e.pk)[0]
+        grandchild = self.create_element(pathway, {
+            'name': 'Grandchild Element', 'description': 'Below the first element', 'parent': first_element.slug
+        }, creator=self.test_user)
+        expected = [e.jsonld_id for e in pathway.cached_root_element.cached_children()]
+
+        def _cached_children(*args, **kwargs):
+            self.fail("PathwayElement.cached_children() called while rendering")
+        original_cached_children = PathwayElement.__dict__['cached_children']
+        PathwayElement.cached_children = _cached_children
+        self.addCleanup(setattr, PathwayElement, 'cached_children', original_cached_children)
+
+        response = self.client.get('/public/pathways/{}/{}'.format(pathway.slug, pathway.cached_root_element.slug),
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['children'], expected)
+
+        # deleting an element deactivates its subtree
+        self.client.force_authenticate(user=self.test_user)
+        response = self.client.delete(reverse('pathway_element_detail', kwargs={
+            'issuer_slug': self.test_issuer.entity_id,
+            'pathway_slug': pathway.slug,
+            'element_slug': first_element.slug,
+        }))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(PathwayElement.objects.get(pk=first_element.pk).is_active)
+        self.assertFalse(PathwayElement.objects.get(pk=grandchild.pk).is_active)
+        self.assertEqual(len(list(Pathway.cached.get(pk=pathway.pk).iter_element_tree())), 3)
+
+    def test_compiled_requirements_match_completion_specs(self):
+        pathway = self.build_pathway(creator=self.test_user)
+        recipient = 'testrecipient2@example.com'
+        self.test_badgeclass.issue(recipient, created_by=self.test_user)
+        instances = list(BadgeInstance.objects.filter(recipient_identifier=recipient))
+
+        tree = pathway.build_element_tree()
+        completion_spec = CompletionRequirementSpecFactory.parse_element(tree['element'])
+        expected = completion_spec.check_completions(tree, instances)
+
+        compiled = pathway.compiled_requirements
+        self.assertEqual(compiled.evaluate(instances), expected)
+        self.assertEqual(compiled.evaluate_batch({recipient: instances, 'nobody@example.com': []})[recipient], expected)
+        self.assertIs(pathway.compiled_requirements, compiled)
+
+        # saving an element bumps the pathway version and the requirements are compiled again
+        version = pathway.version
+        pathway.root_element.completion_requirements = None
+        pathway.root_element.save()
+        self.assertNotEqual(pathway.version, version)
+        self.assertIsNot(pathway.compiled_requirements, compiled)
+        self.assertEqual(len(pathway.compiled_requirements.evaluate(instances)), 4)
+
+    def test_completion_check_large_pathway(self):
+        pathway = self.create_pathway(creator=self.test_user)
+        badgeclasses = [self.test_badgeclass] + list(self.setup_badgeclasses(how_many=3, issuer=self.test_issuer))
+
+        elements = PathwayElement.objects.bulk_create([PathwayElement(
+            pathway=pathway,
+            parent_element=pathway.root_element,
+            slug='benchmark-element-{}'.format(i),
+            name='Benchmark Element {}'.format(i),
+            description='Element {} of many'.format(i),
+            ordering=i,
+            created_by=self.test_user,
+            updated_by=self.test_user,
+            completion_requirements=CompletionRequirementSpecFactory.parse_obj({
+                "@type": "BadgeJunction",
+                "junctionConfig": {"@type": "Disjunction", "requiredNumber": 1},
+                "badges": [badgeclasses[i % len(badgeclasses)].jsonld_id],
+            }).serialize()
+        ) for i in range(240)])
+        elements = list(PathwayElement.objects.filter(pathway=pathway, parent_element=pathway.root_element))
+        PathwayElementBadge.objects.bulk_create([
+            PathwayElementBadge(pathway=pathway, element=e, badgeclass=badgeclasses[i % len(badgeclasses)])
+            for i, e in enumerate(sorted(elements, key=lambda e: e.ordering))
+        ])
+        pathway.root_element.completion_requirements = CompletionRequirementSpecFactory.parse_obj({
+            "@type": "ElementJunction",
+            "junctionConfig": {"@type": "Disjunction", "requiredNumber": 100},
+            "elements": [e.jsonld_id for e in elements],
+        }).serialize()
+        pathway.root_element.save()
+
+        recipient = 'testrecipient2@example.com'
+        profile, _ = RecipientProfile.cached.get_or_create(recipient_identifier=recipient)
+        for badgeclass in badgeclasses[:2]:
+            badgeclass.issue(recipient, created_by=self.test_user)
+        instances = list(BadgeInstance.objects.filter(recipient_identifier=recipient))
+
+        # completion checks match on the jsonld id index and never build badgeclass json
+        def _get_json(*args, **kwargs):
+            self.fail("BadgeClass.get_json() called during completion check")
+        original_get_json = BadgeClass.get_json
+        BadgeClass.get_json = _get_json
+        self.addCleanup(setattr, BadgeClass, 'get_json', original_get_json)
+
+        tree = pathway.build_element_tree()
+        with self.assertNumQueries(0):
+            expected = CompletionRequirementSpecFactory.parse_element(tree['element']).check_completions(tree, instances)
+
+        profile.cached_completions(pathway)
+        with self.assertNumQueries(0):
+            completions = profile.cached_completions(pathway)
+
+        self.assertEqual(len(completions), 241)
+        self.assertEqual(completions, expected)
+        self.assertEqual(len([c for c in completions if c['completed']]), 121)
+
+        # timings are reported by ./manage.py benchmark_completions, outside of the test run
+        out = StringIO.StringIO()
+        call_command('benchmark_completions', pathway.slug, recipient, iterations=1, stdout=out)
+        self.assertIn('compiled', out.getvalue())
+
     def test_cannot_delete_required_badgeclass(self):
         pathway = self.build_single_element_pathway(creator=self.test_user)
 
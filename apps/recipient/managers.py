@@ -0,0 +1,92 @@
+# encoding: utf-8
+from __future__ import unicode_literals
+
+from cachemodel import CACHE_FOREVER_TIMEOUT
+from django.core.cache import cache
+from django.db import models, transaction
+
+
+class RecipientPathwayCompletionManager(models.Manager):
+    """
+    Reads and writes the materialized completion state of recipients in pathways.
+    The completions of one (recipient_profile, pathway) are stored as one row per pathway element, in the same order
+    RecipientProfile.cached_completions() reports them, and are cached together as a list.
+    """
+
+    @staticmethod
+    def cache_key(recipient_profile_pk, pathway_pk):
+        return "recipient_pathway_completions_{}_{}".format(recipient_profile_pk, pathway_pk)
+
+    def update_completions(self, recipient_profile, pathway, completions=None):
+        """
+        Store the completion state of recipient_profile in pathway, computing it if completions are not given.
+        Returns the stored list of completion reports.
+        """
+        if completions is None:
+            completions = recipient_profile.cached_completions(pathway)
+        completions = [_scrub_completion(c) for c in completions]
+
+        element_pks = {e.slug: e.pk for e in pathway.cached_elements()}
+        rows = []
+        for position, completion in enumerate(completions):
+            pathway_element_id = element_pks.get(completion.get('element', {}).get('slug'))
+            if pathway_element_id is None:
+                continue
+            rows.append(self.model(
+                recipient_profile=recipient_profile,
+                pathway=pathway,
+                pathway_element_id=pathway_element_id,
+                position=position,
+                completed=completion.get('completed', False),
+                completion=completion
+            ))
+
+        with transaction.atomic():
+            self.filter(recipient_profile=recipient_profile, pathway=pathway).delete()
+            self.bulk_create(rows)
+
+        completions = [row.completion for row in rows]
+        cache.set(self.cache_key(recipient_profile.pk, pathway.pk), completions, CACHE_FOREVER_TIMEOUT)
+        return completions
+
+    def get_completions(self, pathway, recipient_profiles):
+        """
+        Returns a dict of recipient_profile.pk -> list of completion reports for pathway, read from the cache or
+        from the table with a single query. Recipients that have never been evaluated are evaluated now.
+        """
+        keys = {self.cache_key(r.pk, pathway.pk): r for r in recipient_profiles}
+        completions = {keys[key].pk: value for key, value in cache.get_many(keys.keys()).items()}
+
+        missing = [r for r in recipient_profiles if r.pk not in completions]
+        if missing:
+            found = {}
+            queryset = self.filter(pathway=pathway, recipient_profile__in=missing).order_by('recipient_profile_id', 'position')
+            for row in queryset:
+                found.setdefault(row.recipient_profile_id, []).append(row.completion)
+            cache.set_many({self.cache_key(pk, pathway.pk): value for pk, value in found.items()}, CACHE_FOREVER_TIMEOUT)
+            completions.update(found)
+
+            for recipient_profile in missing:
+                if recipient_profile.pk not in completions:
+                    completions[recipient_profile.pk] = self.update_completions(recipient_profile, pathway)
+
+        return completions
+
+
+def _scrub_completion(completion):
+    """
+    Replace PathwayElements in a completion report with the jsonld references the completion API reports.
+    """
+    from pathway.models import PathwayElement
+
+    def _walk(node):
+        node = dict(node)
+        if isinstance(node.get('element', None), PathwayElement):
+            node['element'] = {
+                '@id': node['element'].jsonld_id,
+                'slug': node['element'].slug
+            }
+        if 'children' in node:
+            node['children'] = {k: _walk(child) for k, child in node['children'].items()}
+        return node
+    return _walk(completion)
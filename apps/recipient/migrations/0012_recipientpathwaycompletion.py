@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 04:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pathway', '0008_auto_20170711_1326'),
+        ('recipient', '0011_auto_20171025_1020'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipientPathwayCompletion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('completed', models.BooleanField(default=False)),
+                ('completion', jsonfield.fields.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pathway', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pathway.Pathway')),
+                ('pathway_element', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pathway.PathwayElement')),
+                ('recipient_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipient.RecipientProfile')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='recipientpathwaycompletion',
+            unique_together=set([('recipient_profile', 'pathway_element')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='recipientpathwaycompletion',
+            index_together=set([('pathway', 'recipient_profile', 'position')]),
+        ),
+    ]
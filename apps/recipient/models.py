@@ -4,12 +4,15 @@ import cachemodel
 from basic_models.models import CreatedUpdatedAt, IsActive, CreatedUpdatedBy
 from django.core.urlresolvers import reverse
 from django.db import models, transaction
+from jsonfield import JSONField
 
 from entity.models import BaseVersionedEntity
 from issuer.models import BadgeInstance, BaseAuditedModel, Issuer
 from mainsite.managers import SlugOrJsonIdCacheModelManager
+from mainsite.publish import coalesce_publish
 from mainsite.utils import OriginSetting
-from pathway.completionspec import CompletionRequirementSpecFactory, ElementJunctionCompletionRequirementSpec
+from pathway.completionspec import earned_badge_index_for_recipients
+from recipient.managers import RecipientPathwayCompletionManager
 
 
 class RecipientProfile(BaseVersionedEntity, CreatedUpdatedAt, CreatedUpdatedBy, IsActive):
@@ -33,29 +36,15 @@ class RecipientProfile(BaseVersionedEntity, CreatedUpdatedAt, CreatedUpdatedBy,
         return u'mailto:{}'.format(self.recipient_identifier)
 
     def cached_completions(self, pathway):
-        # get recipients instances that are aligned to this pathway
-        badgeclasses = pathway.cached_badgeclasses()
-        instances = filter(lambda i: not i.revoked and i.cached_badgeclass in badgeclasses, self.cached_badge_instances())
-
-        # recurse the tree to build completions
-        tree = pathway.element_tree
-        completion_spec = CompletionRequirementSpecFactory.parse_element(tree['element'])
-
-        if not completion_spec:
-            # if there is no completionspec, infer one of elementjunction of all children elements
-            completion_spec = ElementJunctionCompletionRequirementSpec(
-                junction_type=CompletionRequirementSpecFactory.JUNCTION_TYPE_CONJUNCTION,
-                required_number=len(tree['children']),
-                elements=(c['element'].jsonld_id for c in tree['children'].itervalues()))
-            tree['element'].completion_requirements = completion_spec.serialize()
-
-        if completion_spec.completion_type == CompletionRequirementSpecFactory.BADGE_JUNCTION:
-            return [completion_spec.check_completion(tree, instances)]
-        elif completion_spec.completion_type == CompletionRequirementSpecFactory.ELEMENT_JUNCTION:
-            return completion_spec.check_completions(tree, instances)
-        else:
-            # unsupported completion_type
-            return []
+        badgeclasses = pathway.badgeclass_index
+        earned = [e for e in self.cached_earned_badges() if e['@id'] in badgeclasses]
+        return pathway.compiled_requirements.evaluate(earned)
+
+    def stored_completions(self, pathway):
+        """
+        The completions of cached_completions(pathway) as of the last time they were stored.
+        """
+        return RecipientPathwayCompletion.objects.get_completions(pathway, [self])[self.pk]
 
     @cachemodel.cached_method(auto_publish=True)
     def cached_group_memberships(self):
@@ -65,6 +54,13 @@ class RecipientProfile(BaseVersionedEntity, CreatedUpdatedAt, CreatedUpdatedBy,
     def cached_badge_instances(self):
         return BadgeInstance.objects.filter(revoked=False, recipient_identifier=self.recipient_identifier)
 
+    @cachemodel.cached_method(auto_publish=True)
+    def cached_earned_badges(self):
+        """
+        The jsonld references of this recipient's unrevoked assertions and their badgeclasses, see earned_badge_index()
+        """
+        return earned_badge_index_for_recipients([self.recipient_identifier])[self.recipient_identifier]
+
 
 class RecipientGroup(BaseAuditedModel, BaseVersionedEntity, IsActive):
     issuer = models.ForeignKey('issuer.Issuer')
@@ -81,6 +77,7 @@ class RecipientGroup(BaseAuditedModel, BaseVersionedEntity, IsActive):
     def __unicode__(self):
         return self.name
 
+    @coalesce_publish
     def publish(self):
         super(RecipientGroup, self).publish()
         self.issuer.publish()
@@ -173,6 +170,7 @@ class RecipientGroupMembership(BaseVersionedEntity):
     def recipient_identifier(self):
         return self.cached_recipient_profile.recipient_identifier
 
+    @coalesce_publish
     def publish(self):
         super(RecipientGroupMembership, self).publish()
         self.recipient_group.publish()
@@ -189,4 +187,24 @@ class RecipientGroupMembership(BaseVersionedEntity):
 
     @property
     def jsonld_id(self):
-        return self.recipient_profile.jsonld_id
\ No newline at end of file
+        return self.recipient_profile.jsonld_id
+
+
+class RecipientPathwayCompletion(models.Model):
+    """
+    Materialized completion state of a recipient for one element of a pathway.
+    Rows are replaced for a (recipient_profile, pathway) whenever pathway.tasks.evaluate_pathway_completion runs.
+    """
+    recipient_profile = models.ForeignKey('recipient.RecipientProfile')
+    pathway = models.ForeignKey('pathway.Pathway')
+    pathway_element = models.ForeignKey('pathway.PathwayElement')
+    position = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    completion = JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipientPathwayCompletionManager()
+
+    class Meta:
+        unique_together = ('recipient_profile', 'pathway_element')
+        index_together = ('pathway', 'recipient_profile', 'position')